@@ -1,5 +1,5 @@
 from django.contrib import admin # type: ignore
-from .models import Alert, UserProfile
+from .models import Alert, Job, Notification, Subscription, UserProfile
 
 @admin.register(Alert)
 class AlertAdmin(admin.ModelAdmin):
@@ -13,4 +13,25 @@ class AlertAdmin(admin.ModelAdmin):
 class UserProfileAdmin(admin.ModelAdmin):
     list_display = ['user', 'alerts_reported', 'reputation_points', 'created_at']
     search_fields = ['user__username', 'user__email']
-    readonly_fields = ['created_at']
\ No newline at end of file
+    readonly_fields = ['created_at']
+
+@admin.register(Subscription)
+class SubscriptionAdmin(admin.ModelAdmin):
+    list_display = ['__str__', 'user', 'radius_meters', 'is_active', 'created_at']
+    list_filter = ['is_active']
+    search_fields = ['name', 'user__username']
+    readonly_fields = ['created_at', 'updated_at']
+
+@admin.register(Notification)
+class NotificationAdmin(admin.ModelAdmin):
+    list_display = ['user', 'alert', 'created_at', 'read_at']
+    search_fields = ['user__username', 'alert__title']
+    raw_id_fields = ['alert', 'subscription']
+    readonly_fields = ['created_at']
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ['name', 'status', 'attempts', 'run_after', 'locked_by', 'finished_at']
+    list_filter = ['status', 'name']
+    search_fields = ['key']
+    readonly_fields = ['created_at', 'locked_at', 'finished_at', 'last_error']
@@ -0,0 +1,206 @@
+"""
+Native async versions of the hot read endpoints: alert list, detail,
+nearby, comments and categories. Under ASGI they don't tie up a worker
+thread per request; database reads go through the async ORM and cache
+lookups through the async cache API.
+
+GET requests run the same DRF view instances as the sync routes
+(authentication, permissions, negotiation, pagination, serializers and the
+shared response cache), so responses are identical. Every other method on
+these URLs is handed to the sync view. Mounted by backend.async_urls.
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.http import Http404
+from django.urls import re_path
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from .cache import aget_or_build, conditional_response
+from .categories import get_all_categories
+from .models import AlertReaction
+from .pagination import CommentCursorPagination
+from .serializers import AlertCommentSerializer, AlertSerializer
+from .urls import router
+from .views import categories_list
+
+
+def _router_view(name):
+    return next(pattern.callback for pattern in router.urls if pattern.name == name)
+
+
+def _may_query_to_authenticate(request):
+    # Token lookups that miss the token cache and session loads hit the
+    # database; anonymous requests carry neither
+    return 'Authorization' in request.headers or settings.SESSION_COOKIE_NAME in request.COOKIES
+
+
+def async_read(sync_view):
+    """
+    Serves GET with the decorated coroutine, called as handler(view, request,
+    **kwargs) with a view set up the way `sync_view` would, and hands every
+    other method to `sync_view`.
+    """
+    def decorator(handler):
+        async def dispatch(request, *args, **kwargs):
+            if request.method != 'GET':
+                return await sync_to_async(sync_view)(request, *args, **kwargs)
+
+            view = sync_view.cls(**sync_view.initkwargs)
+            actions = getattr(sync_view, 'actions', None)
+            if actions:
+                view.action_map = actions
+            view.args = args
+            view.kwargs = kwargs
+            request = view.initialize_request(request, *args, **kwargs)
+            view.request = request
+            view.headers = view.default_response_headers
+            try:
+                if _may_query_to_authenticate(request):
+                    await sync_to_async(view.initial)(request, *args, **kwargs)
+                else:
+                    view.initial(request, *args, **kwargs)
+                response = await handler(view, request, **kwargs)
+            except Exception as exc:
+                response = view.handle_exception(exc)
+
+            response = view.finalize_response(request, response, *args, **kwargs)
+            if isinstance(request.accepted_renderer, JSONRenderer):
+                return response.render()
+            # The browsable API renders forms from the database
+            return await sync_to_async(response.render)()
+
+        dispatch.__name__ = handler.__name__
+        dispatch.__doc__ = handler.__doc__
+        return csrf_exempt(dispatch)
+    return decorator
+
+
+async def aget_object(view):
+    """GenericAPIView.get_object() on the async ORM"""
+    queryset = view.filter_queryset(view.get_queryset())
+    lookup_url_kwarg = view.lookup_url_kwarg or view.lookup_field
+    try:
+        obj = await queryset.aget(**{view.lookup_field: view.kwargs[lookup_url_kwarg]})
+    except (queryset.model.DoesNotExist, TypeError, ValueError, ValidationError):
+        raise Http404(f'No {queryset.model._meta.object_name} matches the given query.')
+    view.check_object_permissions(view.request, obj)
+    return obj
+
+
+async def aget_user_reactions(view, alert_ids):
+    """AlertViewSet.get_user_reactions() on the async ORM"""
+    request = view.request
+    if not request.user.is_authenticated or not alert_ids:
+        return {}
+    if not AlertSerializer.is_rendered(request, 'user_reaction'):
+        return {}
+    reactions = AlertReaction.objects.filter(
+        user=request.user,
+        alert_id__in=alert_ids
+    ).values_list('alert_id', 'reaction_type')
+    return {alert_id: reaction_type async for alert_id, reaction_type in reactions}
+
+
+async def aget_shared_body(view, scope, build):
+    """AlertViewSet.get_shared_body() with an async `build`"""
+    if not view.can_share_body():
+        return None
+
+    async def build_shared():
+        view.building_shared_body = True
+        try:
+            return await build()
+        finally:
+            view.building_shared_body = False
+
+    return await aget_or_build(view.request, scope, build_shared)
+
+
+async def awith_user_reactions(view, items):
+    """AlertViewSet.with_user_reactions() on the async ORM"""
+    if not view.request.user.is_authenticated or not AlertSerializer.is_rendered(view.request, 'user_reaction'):
+        return
+    reactions = await aget_user_reactions(view, [item['id'] for item in items])
+    for item in items:
+        item['user_reaction'] = reactions.get(item['id'])
+
+
+async def apaginate(paginator, queryset, request, view):
+    # DRF's cursor paginator evaluates the page itself; run it the way the
+    # async ORM runs queries, in the thread-sensitive executor
+    return await sync_to_async(paginator.paginate_queryset)(queryset, request, view=view)
+
+
+@async_read(_router_view('alert-list'))
+async def alert_list(view, request):
+    async def build():
+        page = await apaginate(view.paginator, view.filter_queryset(view.get_queryset()), request, view)
+        return view.get_paginated_response(view.get_serializer(page, many=True).data).data
+
+    data = await aget_shared_body(view, 'alerts-list', build)
+    if data is None:
+        page = await apaginate(view.paginator, view.filter_queryset(view.get_queryset()), request, view)
+        context = {**view.get_serializer_context(), 'user_reactions': await aget_user_reactions(view, [alert.id for alert in page])}
+        return view.get_paginated_response(view.get_serializer(page, many=True, context=context).data)
+    await awith_user_reactions(view, data['results'] if 'results' in data else data)
+    return conditional_response(request, data)
+
+
+@async_read(_router_view('alert-detail'))
+async def alert_detail(view, request, pk):
+    async def build():
+        return view.get_serializer(await aget_object(view)).data
+
+    data = await aget_shared_body(view, 'alerts-detail', build)
+    if data is None:
+        alert = await aget_object(view)
+        context = {**view.get_serializer_context(), 'user_reactions': await aget_user_reactions(view, [alert.id])}
+        return Response(view.get_serializer(alert, context=context).data)
+    await awith_user_reactions(view, [data])
+    return conditional_response(request, data)
+
+
+@async_read(_router_view('alert-nearby'))
+async def alert_nearby(view, request):
+    params = view.parse_nearby_params(request.query_params)
+    if isinstance(params, Response):
+        return params
+    lat, lng, radius, limit = params
+
+    candidates = [row async for row in view.nearby_candidates(lat, lng, radius)]
+    ordered_ids, distances = view.rank_nearby(candidates, lat, lng, radius, limit)
+    alerts_by_id = await view.get_queryset().ain_bulk(ordered_ids)
+    alerts = [alerts_by_id[alert_id] for alert_id in ordered_ids if alert_id in alerts_by_id]
+    context = {**view.get_serializer_context(), 'user_reactions': await aget_user_reactions(view, ordered_ids)}
+    return Response(view.nearby_data(view.get_serializer(alerts, many=True, context=context), distances))
+
+
+@async_read(_router_view('alert-comments'))
+async def alert_comments(view, request, pk):
+    alert = await aget_object(view)
+    paginator = CommentCursorPagination()
+    page = await apaginate(paginator, alert.comments.select_related('user__profile'), request, view)
+    return paginator.get_paginated_response(AlertCommentSerializer(page, many=True).data)
+
+
+@async_read(categories_list)
+async def categories(view, request):
+    async def build():
+        return get_all_categories()
+
+    return conditional_response(request, await aget_or_build(request, 'categories', build, versioned=False))
+
+
+# Same paths and names as the router routes they shadow. Alert ids are
+# numeric here so the other list actions (search, changes, export...) fall
+# through to the sync routes instead of matching the detail pattern.
+urlpatterns = [
+    re_path(r'^alerts/$', alert_list, name='alert-list'),
+    re_path(r'^alerts/nearby/$', alert_nearby, name='alert-nearby'),
+    re_path(r'^alerts/(?P<pk>[0-9]+)/$', alert_detail, name='alert-detail'),
+    re_path(r'^alerts/(?P<pk>[0-9]+)/comments/$', alert_comments, name='alert-comments'),
+    re_path(r'^categories/$', categories, name='categories-list'),
+]
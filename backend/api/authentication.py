@@ -0,0 +1,109 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+
+class LocalTokenCache:
+    """Thread-safe in-process LRU of token key -> (user, token), with a TTL"""
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl, max_entries):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def delete_user(self, user_id):
+        with self._lock:
+            for key in [key for key, (_, (user, _)) in self._entries.items() if user.pk == user_id]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+local_token_cache = LocalTokenCache()
+
+
+def _shared_cache():
+    alias = getattr(settings, 'TOKEN_CACHE_SHARED', None)
+    return caches[alias] if alias else None
+
+
+def _shared_key(key):
+    return f'auth-token:{key}'
+
+
+def invalidate_token(key):
+    """Drops a token from both cache tiers; its next use hits the database"""
+    local_token_cache.delete(key)
+    shared = _shared_cache()
+    if shared is not None:
+        shared.delete(_shared_key(key))
+
+
+def invalidate_user_tokens(user_id):
+    """Drops every cached token of a user, e.g. after a password change"""
+    local_token_cache.delete_user(user_id)
+    shared = _shared_cache()
+    if shared is not None:
+        shared.delete_many([_shared_key(key) for key in Token.objects.filter(user_id=user_id).values_list('key', flat=True)])
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication that remembers valid tokens for TOKEN_CACHE_TTL
+    seconds, so authenticated requests skip the Token/User query.
+
+    Tokens are kept in a bounded in-process LRU and, when TOKEN_CACHE_SHARED
+    names a cache alias, in that cache too so other processes can reuse
+    them. Logout, password and user changes invalidate entries through the
+    signals in api.models; entries held by other processes' LRUs expire
+    within the TTL.
+    """
+
+    def authenticate_credentials(self, key):
+        ttl = getattr(settings, 'TOKEN_CACHE_TTL', 60)
+        max_entries = getattr(settings, 'TOKEN_CACHE_MAX_ENTRIES', 10000)
+
+        cached = local_token_cache.get(key)
+        if cached is None:
+            shared = _shared_cache()
+            if shared is not None:
+                cached = shared.get(_shared_key(key))
+            if cached is None:
+                cached = super().authenticate_credentials(key)
+                if shared is not None:
+                    shared.set(_shared_key(key), cached, ttl)
+            local_token_cache.set(key, cached, ttl, max_entries)
+
+        # Each request gets its own copies; views may modify request.user
+        user, token = cached
+        return copy.copy(user), copy.copy(token)
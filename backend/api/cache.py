@@ -0,0 +1,141 @@
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from rest_framework import status
+from rest_framework.response import Response
+
+# Bumped on every write that can change an alert payload; part of every
+# alert response key, so bumping it invalidates them all at once
+GENERATION_KEY = 'alerts:generation'
+# Bumped only when alerts are added, removed, moved or change category or
+# status; versions the map cluster tiles, which don't show counters
+LOCATIONS_KEY = 'alerts:locations'
+
+
+def get_response_cache():
+    return caches[getattr(settings, 'ALERT_RESPONSE_CACHE', 'default')]
+
+
+def _fresh_generation():
+    # Time based, so a generation key lost to eviction never restarts at a
+    # value whose cached responses are still around
+    return time.time_ns() // 1000
+
+
+def get_generation(generation_key=GENERATION_KEY):
+    cache = get_response_cache()
+    generation = cache.get(generation_key)
+    if generation is None:
+        cache.add(generation_key, _fresh_generation(), timeout=None)
+        generation = cache.get(generation_key)
+    return generation
+
+
+async def aget_generation(generation_key=GENERATION_KEY):
+    cache = get_response_cache()
+    generation = await cache.aget(generation_key)
+    if generation is None:
+        await cache.aadd(generation_key, _fresh_generation(), timeout=None)
+        generation = await cache.aget(generation_key)
+    return generation
+
+
+def _bump_generation(*generation_keys):
+    cache = get_response_cache()
+    for generation_key in generation_keys:
+        try:
+            cache.incr(generation_key)
+        except ValueError:
+            cache.add(generation_key, _fresh_generation(), timeout=None)
+
+
+def invalidate_alert_responses(locations=False):
+    """
+    Drops every cached alert response, and the map cluster tiles too when
+    `locations` is set. Bumps right away so this process reads its own
+    writes, and again after commit so a response cached from pre-commit data
+    in the meantime doesn't survive.
+    """
+    generation_keys = (GENERATION_KEY, LOCATIONS_KEY) if locations else (GENERATION_KEY,)
+    _bump_generation(*generation_keys)
+    transaction.on_commit(lambda: _bump_generation(*generation_keys))
+
+
+def _format_key(scope, parts, generation):
+    digest = hashlib.md5(json.dumps(parts).encode()).hexdigest()
+    return f'response:{scope}:{generation}:{digest}'
+
+
+def make_cache_key(scope, parts, versioned=True, generation_key=GENERATION_KEY):
+    """Key for `scope` from JSON-serializable parts; versioned keys die with the generation"""
+    return _format_key(scope, parts, get_generation(generation_key) if versioned else 0)
+
+
+def _request_parts(request):
+    # Host and scheme matter because pagination links are absolute
+    params = sorted(
+        (key, value)
+        for key in request.query_params
+        for value in request.query_params.getlist(key)
+    )
+    return [request.get_host(), request.is_secure(), request.path, params]
+
+
+def build_cache_key(request, scope, versioned=True):
+    """Key from endpoint scope, host, path and sorted query params"""
+    return make_cache_key(scope, _request_parts(request), versioned)
+
+
+def get_or_build(request, scope, build, versioned=True, timeout=DEFAULT_TIMEOUT, key=None):
+    """
+    Returns the cached shared body for this request, building and storing it
+    on a miss. `key` overrides the request-derived key (e.g. per map tile).
+    Bodies live for the cache's TIMEOUT by default: a generation bump made by
+    another process never reaches a local memory cache, so that bounds how
+    stale they get.
+    """
+    cache = get_response_cache()
+    if key is None:
+        key = build_cache_key(request, scope, versioned)
+    data = cache.get(key)
+    if data is None:
+        data = build()
+        cache.set(key, data, timeout)
+    return data
+
+
+async def aget_or_build(request, scope, build, versioned=True, timeout=DEFAULT_TIMEOUT):
+    """get_or_build() for async views; `build` is a coroutine function"""
+    cache = get_response_cache()
+    generation = await aget_generation() if versioned else 0
+    key = _format_key(scope, _request_parts(request), generation)
+    data = await cache.aget(key)
+    if data is None:
+        data = await build()
+        await cache.aset(key, data, timeout)
+    return data
+
+
+def compute_etag(data):
+    payload = json.dumps(data, cls=DjangoJSONEncoder, sort_keys=True, separators=(',', ':'))
+    return '"%s"' % hashlib.md5(payload.encode()).hexdigest()
+
+
+def conditional_response(request, data):
+    """Response with an ETag; 304 Not Modified when If-None-Match matches"""
+    etag = compute_etag(data)
+    if_none_match = request.headers.get('If-None-Match', '')
+    if etag in [tag.strip() for tag in if_none_match.split(',')] or if_none_match.strip() == '*':
+        response = Response(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        response = Response(data)
+    response['ETag'] = etag
+    # Bodies differ per user once user_reaction is layered on
+    response['Vary'] = 'Authorization, Cookie'
+    return response
@@ -1,63 +1,79 @@
+from datetime import timedelta
+
+# Hours an alert stays active before the expiry sweeper (api.expiry) marks
+# it as expired; each category can override it with 'ttl_hours'
+DEFAULT_TTL_HOURS = 24
+
 ALERT_CATEGORIES = {
     'traffic_accident': {
         'name': 'Accidente de tráfico',
         'description': 'Colisiones vehiculares, choques, volcamientos',
         'icon': 'car_crash',
-        'color': '#DC2626'
+        'color': '#DC2626',
+        'ttl_hours': 6
     },
     'road_closure': {
         'name': 'Cierre de vía',
         'description': 'Vías cerradas temporalmente por construcción o eventos',
         'icon': 'remove_road',
-        'color': '#EA580C'
+        'color': '#EA580C',
+        'ttl_hours': 48
     },
     'traffic_jam': {
         'name': 'Congestión vehicular',
         'description': 'Tráfico lento o detenido',
         'icon': 'traffic_jam',
-        'color': '#F59E0B'
+        'color': '#F59E0B',
+        'ttl_hours': 2
     },
     'road_hazard': {
         'name': 'Peligro en la vía',
         'description': 'Obstáculos, baches, derrumbes, objetos en la vía',
         'icon': 'warning',
-        'color': '#EAB308'
+        'color': '#EAB308',
+        'ttl_hours': 72
     },
     'flooding': {
         'name': 'Inundación',
         'description': 'Vías inundadas o con acumulación de agua',
         'icon': 'flood',
-        'color': '#06B6D4'
+        'color': '#06B6D4',
+        'ttl_hours': 24
     },
     'construction': {
         'name': 'Obra en construcción',
         'description': 'Trabajos de construcción o mantenimiento vial',
         'icon': 'construction',
-        'color': '#6B7280'
+        'color': '#6B7280',
+        'ttl_hours': 720
     },
     'police': {
         'name': 'Presencia policial',
         'description': 'Controles policiales, retenes',
         'icon': 'local_police',
-        'color': '#3B82F6'
+        'color': '#3B82F6',
+        'ttl_hours': 4
     },
     'emergency': {
         'name': 'Emergencia',
         'description': 'Ambulancias, bomberos, situaciones de emergencia',
         'icon': 'e911_emergency',
-        'color': '#EF4444'
+        'color': '#EF4444',
+        'ttl_hours': 6
     },
     'public_event': {
         'name': 'Evento público',
         'description': 'Manifestaciones, eventos deportivos, conciertos',
         'icon': 'event',
-        'color': '#8B5CF6'
+        'color': '#8B5CF6',
+        'ttl_hours': 12
     },
     'other': {
         'name': 'Otro',
         'description': 'Otras situaciones no categorizadas',
         'icon': 'other_admissions',
-        'color': '#64748B'
+        'color': '#64748B',
+        'ttl_hours': 24
     }
 }
 
@@ -68,6 +84,13 @@ def get_category(key):
     """
     return ALERT_CATEGORIES.get(key)
 
+def get_category_ttl(key):
+    """
+    Get how long alerts of a category stay active, as a timedelta.
+    """
+    category = ALERT_CATEGORIES.get(key) or {}
+    return timedelta(hours=category.get('ttl_hours', DEFAULT_TTL_HOURS))
+
 def get_all_categories():
     """
     Get all categories as a list with their keys included.
@@ -85,4 +108,15 @@ def validate_category(key):
     """
     Check if a category key exists.
     """
-    return key in ALERT_CATEGORIES
\ No newline at end of file
+    return key in ALERT_CATEGORIES
+
+def parse_categories(value):
+    """
+    Parses a comma separated string or list of category keys.
+    Returns None when absent.
+    """
+    if not value:
+        return None
+    if isinstance(value, str):
+        value = value.split(',')
+    return {key.strip() for key in value if key.strip()}
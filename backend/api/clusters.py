@@ -0,0 +1,103 @@
+import math
+
+from django.db.models import Count, F, Sum
+from django.db.models.functions import Floor
+
+# At this zoom and above individual alerts are returned instead of clusters
+CLUSTER_MAX_ZOOM = 16
+# Cluster cells per tile side (a 256px tile gets 64px cells)
+CELLS_PER_TILE = 4
+# Upper bound on tiles aggregated for a single viewport request
+MAX_TILES = 64
+
+
+def tile_size(zoom):
+    """Side of a grid tile in degrees; tiles halve at each zoom level"""
+    return 360.0 / (2 ** zoom)
+
+
+def tiles_for_bbox(bbox, zoom):
+    """
+    Returns the (x, y) grid tiles covering bbox (south, west, north, east).
+    Longitudes past the antimeridian wrap to the tiles on the other side.
+    """
+    south, west, north, east = bbox
+    if east < west:
+        east += 360.0
+    size = tile_size(zoom)
+    columns = 2 ** zoom
+    rows = max(1, math.ceil(180.0 / size))
+
+    min_x = math.floor((west + 180.0) / size)
+    max_x = math.floor((min(east, west + 360.0) + 180.0) / size)
+    min_y = max(0, math.floor((south + 90.0) / size))
+    max_y = min(rows - 1, math.floor((north + 90.0) / size))
+
+    tiles = []
+    seen = set()
+    for x in range(min_x, max_x + 1):
+        for y in range(min_y, max_y + 1):
+            tile = (x % columns, y)
+            if tile not in seen:
+                seen.add(tile)
+                tiles.append(tile)
+    return tiles
+
+
+def tile_bounds(zoom, x, y):
+    """(south, west, north, east) of a grid tile"""
+    size = tile_size(zoom)
+    west = x * size - 180.0
+    south = y * size - 90.0
+    return south, west, min(south + size, 90.0), west + size
+
+
+def tile_clusters(queryset, zoom, x, y):
+    """
+    Aggregates the alerts of one tile into grid cells with a single
+    GROUP BY query over the (status, latitude, longitude) index. Each
+    cluster has its count, counts per category, centroid and cell bounds.
+    """
+    south, west, north, east = tile_bounds(zoom, x, y)
+    cell = tile_size(zoom) / CELLS_PER_TILE
+
+    # Half-open ranges so alerts on a tile edge are counted once
+    rows = queryset.filter(
+        latitude__gte=south, latitude__lt=north,
+        longitude__gte=west, longitude__lt=east,
+    ).annotate(
+        cell_x=Floor((F('longitude') - west) / cell),
+        cell_y=Floor((F('latitude') - south) / cell),
+    ).values('cell_x', 'cell_y', 'category').annotate(
+        count=Count('id'),
+        latitude_sum=Sum('latitude'),
+        longitude_sum=Sum('longitude'),
+    ).order_by()
+
+    cells = {}
+    for row in rows:
+        # Clamp float rounding at the tile's far edges
+        key = (
+            min(max(int(row['cell_x']), 0), CELLS_PER_TILE - 1),
+            min(max(int(row['cell_y']), 0), CELLS_PER_TILE - 1),
+        )
+        cluster = cells.setdefault(key, {
+            'count': 0, 'categories': {}, 'latitude_sum': 0.0, 'longitude_sum': 0.0,
+        })
+        cluster['count'] += row['count']
+        cluster['categories'][row['category']] = cluster['categories'].get(row['category'], 0) + row['count']
+        cluster['latitude_sum'] += row['latitude_sum']
+        cluster['longitude_sum'] += row['longitude_sum']
+
+    clusters = []
+    for (cell_x, cell_y), cluster in sorted(cells.items()):
+        cell_south = south + cell_y * cell
+        cell_west = west + cell_x * cell
+        clusters.append({
+            'latitude': cluster['latitude_sum'] / cluster['count'],
+            'longitude': cluster['longitude_sum'] / cluster['count'],
+            'count': cluster['count'],
+            'categories': cluster['categories'],
+            'bounds': [cell_south, cell_west, cell_south + cell, cell_west + cell],
+        })
+    return clusters
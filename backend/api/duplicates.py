@@ -0,0 +1,168 @@
+import math
+import threading
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .geo import EARTH_RADIUS_KM, bbox_q, bounding_box, haversine_km
+
+DEFAULT_DUPLICATE_SETTINGS = {
+    'MODE': 'link',
+    'RADIUS_METERS': 150,
+    'WINDOW_MINUTES': 30,
+}
+DUPLICATE_MODES = ('merge', 'link', 'off')
+# How often (seconds) the index picks up alerts created by other processes
+SYNC_INTERVAL = 5
+
+
+def get_duplicate_settings():
+    options = {**DEFAULT_DUPLICATE_SETTINGS, **getattr(settings, 'ALERT_DUPLICATES', {})}
+    if options['MODE'] not in DUPLICATE_MODES:
+        raise ValueError(f"ALERT_DUPLICATES['MODE'] must be one of {', '.join(DUPLICATE_MODES)}")
+    return options
+
+
+class DuplicateIndex:
+    """
+    In-memory grid of the recent active alerts that new reports can be
+    duplicates of, per category. Cells are `radius_km` on a side, so a
+    lookup reads a handful of cells instead of querying the database.
+
+    Kept in sync by the Alert signals in models.py for this process and by
+    sync(), which reads alerts other processes created since the last
+    watermark. Entries are only candidates: find_duplicate() re-checks them
+    against the database (in the same UPDATE that counts the confirmation,
+    when it counts one) and drops the stale ones.
+    """
+
+    def __init__(self, radius_km, window):
+        self.radius_km = radius_km
+        self.window = window
+        self.cell = math.degrees(radius_km / EARTH_RADIUS_KM)
+        self._lock = threading.Lock()
+        self._cells = defaultdict(dict)
+        self._keys = {}
+        self._watermark = None
+        self._synced_at = 0.0
+
+    def _key(self, category, lat, lng):
+        return category, math.floor(lat / self.cell), math.floor(lng / self.cell)
+
+    def add(self, alert_id, category, lat, lng, created_at):
+        key = self._key(category, lat, lng)
+        with self._lock:
+            previous = self._keys.pop(alert_id, None)
+            if previous is not None:
+                self._cells[previous].pop(alert_id, None)
+            self._cells[key][alert_id] = (lat, lng, created_at)
+            self._keys[alert_id] = key
+
+    def remove(self, alert_id):
+        with self._lock:
+            key = self._keys.pop(alert_id, None)
+            if key is not None:
+                cell = self._cells[key]
+                cell.pop(alert_id, None)
+                if not cell:
+                    del self._cells[key]
+
+    def __len__(self):
+        return len(self._keys)
+
+    def candidates(self, category, lat, lng, now):
+        """Ids of indexed alerts within the radius and window, closest first"""
+        cutoff = now - self.window
+        min_lat, max_lat, min_lng, max_lng = bounding_box(lat, lng, self.radius_km)
+        found, expired = [], []
+        with self._lock:
+            for row in range(math.floor(min_lat / self.cell), math.floor(max_lat / self.cell) + 1):
+                for col in range(math.floor(min_lng / self.cell), math.floor(max_lng / self.cell) + 1):
+                    for alert_id, (alert_lat, alert_lng, created_at) in self._cells.get((category, row, col), {}).items():
+                        if created_at < cutoff:
+                            expired.append(alert_id)
+                            continue
+                        distance = haversine_km(lat, lng, alert_lat, alert_lng)
+                        if distance <= self.radius_km:
+                            found.append((distance, alert_id))
+        for alert_id in expired:
+            self.remove(alert_id)
+        return [alert_id for _, alert_id in sorted(found)]
+
+    def sync(self, force=False):
+        """Adds alerts created since the last sync, at most every SYNC_INTERVAL seconds"""
+        from .models import Alert
+
+        if not force and time.monotonic() - self._synced_at < SYNC_INTERVAL:
+            return
+        self._synced_at = time.monotonic()
+        since = timezone.now() - self.window
+        if self._watermark is not None:
+            since = max(since, self._watermark)
+        recent = Alert.objects.filter(
+            created_at__gte=since, status='active', duplicate_of__isnull=True
+        ).values_list('id', 'category', 'latitude', 'longitude', 'created_at')
+        for alert_id, category, lat, lng, created_at in recent:
+            self.add(alert_id, category, lat, lng, created_at)
+            if self._watermark is None or created_at > self._watermark:
+                self._watermark = created_at
+
+    def find_duplicate(self, category, lat, lng, confirm=False):
+        """
+        The closest active alert of `category` reported within the radius and
+        window, None if there's none. With `confirm`, one more confirmation is
+        counted on it.
+        """
+        from .models import Alert
+
+        self.sync()
+        now = timezone.now()
+        for alert_id in self.candidates(category, lat, lng, now):
+            still_matches = Alert.objects.filter(
+                bbox_q(*bounding_box(lat, lng, self.radius_km)),
+                status='active', category=category, duplicate_of__isnull=True,
+                created_at__gte=now - self.window,
+            )
+            if confirm:
+                matched = Alert.confirm(alert_id, still_matches)
+            else:
+                matched = still_matches.filter(pk=alert_id).exists()
+            if matched:
+                return Alert.objects.get(pk=alert_id)
+            self.remove(alert_id)
+        return None
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_duplicate_index():
+    """The process-wide index for the current ALERT_DUPLICATES settings"""
+    global _index
+    options = get_duplicate_settings()
+    radius_km = options['RADIUS_METERS'] / 1000
+    window = timedelta(minutes=options['WINDOW_MINUTES'])
+    with _index_lock:
+        if _index is None or _index.radius_km != radius_km or _index.window != window:
+            _index = DuplicateIndex(radius_km, window)
+            _index.sync(force=True)
+        return _index
+
+
+def track_alert(alert):
+    """Adds or drops `alert` in the index after a save, if the index is in use"""
+    if _index is None:
+        return
+    if alert.status == 'active' and alert.duplicate_of_id is None:
+        _index.add(alert.pk, alert.category, alert.latitude, alert.longitude, alert.created_at)
+    else:
+        _index.remove(alert.pk)
+
+
+def forget_alert(alert_id):
+    if _index is not None:
+        _index.remove(alert_id)
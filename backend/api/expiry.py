@@ -0,0 +1,121 @@
+import logging
+import threading
+import time
+from collections import Counter
+
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .cache import invalidate_alert_responses
+from .categories import ALERT_CATEGORIES, get_category_ttl
+from .models import Alert
+from .realtime import publish_alert_event
+from .rollups import apply_rollup_deltas, rollup_key
+
+logger = logging.getLogger(__name__)
+
+# Rows expired per UPDATE; keeps each write transaction (and SQLite's write
+# lock) short while a large backlog drains
+EXPIRY_BATCH_SIZE = 500
+
+
+def _expire_batch(queryset, now, batch_size, publish):
+    """
+    Expires the oldest `batch_size` alerts of `queryset` with one UPDATE,
+    then publishes their events once the write transaction is over.
+    Returns (rows expired, candidates found, created_at of the oldest one).
+    """
+    candidates = list(
+        queryset.order_by('created_at', 'id').values_list('id', 'created_at')[:batch_size]
+    )
+    if not candidates:
+        return 0, 0, None
+
+    ids = [pk for pk, _ in candidates]
+    expired_ids = []
+    with transaction.atomic():
+        # Re-checks the status so alerts closed meanwhile stay resolved
+        expired = Alert.objects.filter(pk__in=ids, status='active').update(
+            status='expired',
+            updated_at=now,
+        )
+        # Move the rows this UPDATE expired from the active rollups; read
+        # after writing so the transaction never upgrades a read lock
+        if expired:
+            deltas = Counter()
+            moved = Alert.objects.filter(pk__in=ids, status='expired', updated_at=now).values_list(
+                'id', 'category', 'latitude', 'longitude', 'created_at'
+            )
+            for pk, *row in moved:
+                expired_ids.append(pk)
+                deltas[rollup_key(*row, 'active')] -= 1
+                deltas[rollup_key(*row, 'expired')] += 1
+            apply_rollup_deltas(deltas)
+        invalidate_alert_responses(locations=True)
+
+    # Outside the block: a rolled back batch publishes nothing, and building
+    # the events doesn't hold SQLite's write lock
+    if publish and expired_ids:
+        for alert in Alert.objects.filter(pk__in=expired_ids).select_related('user__profile'):
+            publish_alert_event('expired', alert)
+    return expired, len(candidates), candidates[0][1]
+
+
+def expire_stale_alerts(now=None, batch_size=EXPIRY_BATCH_SIZE, max_batches=None, publish=True):
+    """
+    Moves active alerts older than their category's TTL to 'expired'.
+
+    Works category by category in batches of `batch_size` rows, each one a
+    single set-based UPDATE, until nothing is left or `max_batches` is hit.
+    Returns {'expired', 'seconds', 'rows_per_second', 'lag_seconds'}, where
+    lag is how long past its TTL the most overdue alert was.
+    """
+    now = now or timezone.now()
+    started = time.monotonic()
+    expired = 0
+    batches = 0
+    lag = 0.0
+
+    # Categories no longer configured fall back to the default TTL
+    groups = [(Alert.objects.filter(category=key), get_category_ttl(key)) for key in ALERT_CATEGORIES]
+    groups.append((Alert.objects.exclude(category__in=list(ALERT_CATEGORIES)), get_category_ttl(None)))
+
+    for queryset, ttl in groups:
+        stale = queryset.filter(status='active', created_at__lt=now - ttl)
+        while max_batches is None or batches < max_batches:
+            count, found, oldest = _expire_batch(stale, now, batch_size, publish)
+            if not found:
+                break
+            batches += 1
+            expired += count
+            lag = max(lag, (now - (oldest + ttl)).total_seconds())
+            if found < batch_size:
+                break
+
+    seconds = time.monotonic() - started
+    return {
+        'expired': expired,
+        'seconds': seconds,
+        'rows_per_second': expired / seconds if seconds > 0 else 0.0,
+        'lag_seconds': lag,
+    }
+
+
+def run_expiry_loop(interval=60, stop_event=None, on_sweep=None, **options):
+    """
+    Sweeps every `interval` seconds until `stop_event` is set. Can run in
+    a management command or on a background thread of a long-lived process.
+    `on_sweep` receives each sweep's result.
+    """
+    stop_event = stop_event or threading.Event()
+    while not stop_event.is_set():
+        close_old_connections()
+        try:
+            result = expire_stale_alerts(**options)
+        except Exception:
+            logger.exception('Alert expiry sweep failed')
+        else:
+            if on_sweep:
+                on_sweep(result)
+        stop_event.wait(interval)
+    close_old_connections()
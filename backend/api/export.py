@@ -0,0 +1,66 @@
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import Alert
+
+# Rows fetched from the database cursor per round trip while streaming
+EXPORT_CHUNK_SIZE = 2000
+
+EXPORT_FIELDS = [
+    'id', 'user_id', 'title', 'description', 'category', 'status', 'latitude', 'longitude',
+    'image', 'likes_count', 'dislikes_count', 'comments_count', 'created_at', 'updated_at', 'closed_at',
+]
+
+_encoder = DjangoJSONEncoder(ensure_ascii=False, separators=(',', ':'))
+
+
+def export_rows(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yields plain dicts for every alert in `queryset`, in id order, reading
+    `chunk_size` rows at a time so memory doesn't grow with the result size.
+    """
+    storage = Alert._meta.get_field('image').storage
+    for row in queryset.order_by('id').values(*EXPORT_FIELDS).iterator(chunk_size=chunk_size):
+        if row['image']:
+            row['image'] = storage.url(row['image'])
+        yield row
+
+
+def _batched(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def ndjson_stream(rows, chunk_size=EXPORT_CHUNK_SIZE):
+    """One JSON object per line"""
+    for batch in _batched(rows, chunk_size):
+        yield ''.join(_encoder.encode(row) + '\n' for row in batch)
+
+
+def _feature(row):
+    properties = dict(row)
+    longitude = properties.pop('longitude')
+    latitude = properties.pop('latitude')
+    return {
+        'type': 'Feature',
+        'id': row['id'],
+        'geometry': {'type': 'Point', 'coordinates': [longitude, latitude]},
+        'properties': properties,
+    }
+
+
+def geojson_stream(rows, chunk_size=EXPORT_CHUNK_SIZE):
+    """A GeoJSON FeatureCollection of Point features, written incrementally"""
+    yield '{"type":"FeatureCollection","features":['
+    separator = ''
+    for batch in _batched(rows, chunk_size):
+        yield separator + ','.join(_encoder.encode(_feature(row)) for row in batch)
+        separator = ','
+    yield ']}\n'
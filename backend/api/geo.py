@@ -0,0 +1,236 @@
+import math
+from collections import defaultdict
+
+from django.db.models import Q
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """
+    Great-circle distance in kilometers between two points given in degrees.
+    """
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lng2 - lng1)
+    a = (
+        math.sin(d_phi / 2) ** 2 +
+        math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def bounding_box(lat, lng, radius_km):
+    """
+    Returns (min_lat, max_lat, min_lng, max_lng) enclosing the circle of
+    radius_km around (lat, lng). Every point within radius_km is inside the
+    box, so it can be used as an indexed prefilter before exact distances.
+    """
+    d_lat = math.degrees(radius_km / EARTH_RADIUS_KM)
+    min_lat = max(lat - d_lat, -90.0)
+    max_lat = min(lat + d_lat, 90.0)
+
+    # Near the poles the longitude span covers the whole circle
+    if min_lat <= -90.0 or max_lat >= 90.0:
+        return min_lat, max_lat, -180.0, 180.0
+
+    d_lng = math.degrees(
+        math.asin(min(1.0, math.sin(radius_km / EARTH_RADIUS_KM) / math.cos(math.radians(lat))))
+    )
+    return min_lat, max_lat, lng - d_lng, lng + d_lng
+
+
+def bbox_q(min_lat, max_lat, min_lng, max_lng, prefix=''):
+    """
+    Builds a Q filtering latitude/longitude columns to the given box.
+    Boxes crossing the antimeridian are split in two longitude ranges.
+    """
+    lat_field = f'{prefix}latitude'
+    lng_field = f'{prefix}longitude'
+    q = Q(**{f'{lat_field}__gte': min_lat, f'{lat_field}__lte': max_lat})
+
+    if min_lng < -180.0:
+        return q & (
+            Q(**{f'{lng_field}__gte': min_lng + 360.0}) |
+            Q(**{f'{lng_field}__lte': max_lng})
+        )
+    if max_lng > 180.0:
+        return q & (
+            Q(**{f'{lng_field}__gte': min_lng}) |
+            Q(**{f'{lng_field}__lte': max_lng - 360.0})
+        )
+    return q & Q(**{f'{lng_field}__gte': min_lng, f'{lng_field}__lte': max_lng})
+
+
+def parse_bbox(value):
+    """
+    Parses "south,west,north,east" into a tuple of floats.
+    Returns None when absent; raises ValueError when malformed.
+    """
+    if not value:
+        return None
+    if isinstance(value, str):
+        value = value.split(',')
+    south, west, north, east = (float(part) for part in value)
+    if south > north:
+        raise ValueError("south must not be greater than north")
+    return south, west, north, east
+
+
+def decode_polyline(encoded, precision=5):
+    """
+    Decodes an encoded polyline (Google's algorithm, as returned by most
+    routing APIs) into a list of (lat, lng). Raises ValueError when malformed.
+    """
+    factor = 10 ** precision
+    points = []
+    index = lat = lng = 0
+    length = len(encoded)
+    while index < length:
+        deltas = []
+        for _ in range(2):
+            shift = result = 0
+            while True:
+                if index >= length:
+                    raise ValueError("truncated polyline")
+                byte = ord(encoded[index]) - 63
+                index += 1
+                if not 0 <= byte < 64:
+                    raise ValueError("invalid polyline character")
+                result |= (byte & 0x1f) << shift
+                shift += 5
+                if byte < 0x20:
+                    break
+            deltas.append(~(result >> 1) if result & 1 else result >> 1)
+        lat += deltas[0]
+        lng += deltas[1]
+        points.append((lat / factor, lng / factor))
+    return points
+
+
+def parse_points(value):
+    """
+    Parses "lat,lng;lat,lng;..." or a list of [lat, lng] pairs into a list
+    of (lat, lng). Raises ValueError when malformed or out of range.
+    """
+    if isinstance(value, str):
+        value = [pair.split(',') for pair in value.split(';') if pair.strip()]
+    points = []
+    for pair in value:
+        lat, lng = (float(part) for part in pair)
+        if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+            raise ValueError("coordinates out of range")
+        points.append((lat, lng))
+    return points
+
+
+# Route segments per prefilter bounding box in RouteCorridor.bounding_boxes(),
+# and the most boxes returned; longer routes get longer chunks. Each box is
+# one index range scan, but also ORM work to build and compile.
+ROUTE_CHUNK_SEGMENTS = 32
+ROUTE_MAX_BOXES = 32
+
+
+class RouteCorridor:
+    """
+    The area within `width_km` of a route (a list of (lat, lng) vertices).
+
+    bounding_boxes() covers the corridor with one box per chunk of segments,
+    for an indexed lat/lng prefilter; locate() then measures exact
+    point-to-segment distances, checking only the segments registered in the
+    point's cell of a uniform grid.
+
+    Distances use a local equirectangular projection per segment, accurate
+    to well under a meter at corridor scale.
+    """
+
+    def __init__(self, points, width_km):
+        self.points = points
+        self.width_km = width_km
+        self.segments = []
+        position = 0.0
+        for (lat1, lng1), (lat2, lng2) in zip(points, points[1:]):
+            # km per degree of longitude at the segment's latitude
+            lng_scale = math.radians(EARTH_RADIUS_KM) * math.cos(math.radians((lat1 + lat2) / 2))
+            dx = (lng2 - lng1) * lng_scale
+            dy = (lat2 - lat1) * math.radians(EARTH_RADIUS_KM)
+            length = math.hypot(dx, dy)
+            self.segments.append((lat1, lng1, lng_scale, dx, dy, length, position))
+            position += length
+        self.length_km = position
+        # Padding that covers width_km anywhere on the route: the longitude
+        # span of width_km is widest at the latitude farthest from the equator
+        self.pad_lat = math.degrees(width_km / EARTH_RADIUS_KM)
+        self.pad_lng = bounding_box(max(abs(lat) for lat, _ in points), 0.0, width_km)[3]
+        self._build_grid()
+
+    def _build_grid(self):
+        # Each segment is registered in every cell its padded box touches, so
+        # a point only needs the segments of its own cell. Cells grow with
+        # the longest segment to bound how many cells one segment covers.
+        reference_lat = sum(lat for lat, _ in self.points) / len(self.points)
+        longest = max((segment[5] for segment in self.segments), default=0.0)
+        cell_km = max(2 * self.width_km, 0.25, longest / 8)
+        self.cell_lat = math.degrees(cell_km / EARTH_RADIUS_KM)
+        self.cell_lng = self.cell_lat / max(math.cos(math.radians(reference_lat)), 0.01)
+        floor = math.floor
+        cells = [
+            (
+                floor((lat - self.pad_lat) / self.cell_lat), floor((lat + self.pad_lat) / self.cell_lat),
+                floor((lng - self.pad_lng) / self.cell_lng), floor((lng + self.pad_lng) / self.cell_lng),
+            )
+            for lat, lng in self.points
+        ]
+        # Consecutive segments covering the same cells (most of them on
+        # densely sampled routes) are stored once, as a [start, end) run
+        self.grid = defaultdict(list)
+        runs = []
+        for index, (cells1, cells2) in enumerate(zip(cells, cells[1:])):
+            covered = (
+                min(cells1[0], cells2[0]), max(cells1[1], cells2[1]),
+                min(cells1[2], cells2[2]), max(cells1[3], cells2[3]),
+            )
+            if runs and runs[-1][2] == covered:
+                runs[-1][1] = index + 1
+            else:
+                runs.append([index, index + 1, covered])
+        for start, end, (min_row, max_row, min_col, max_col) in runs:
+            for row in range(min_row, max_row + 1):
+                for col in range(min_col, max_col + 1):
+                    self.grid[(row, col)].append((start, end))
+
+    def bounding_boxes(self, chunk_size=ROUTE_CHUNK_SEGMENTS):
+        """(min_lat, max_lat, min_lng, max_lng) per chunk of segments, padded by the width"""
+        boxes = []
+        chunk_size = max(chunk_size, math.ceil((len(self.points) - 1) / ROUTE_MAX_BOXES))
+        for start in range(0, len(self.points) - 1, chunk_size):
+            chunk = self.points[start:start + chunk_size + 1]
+            lats = [lat for lat, _ in chunk]
+            lngs = [lng for _, lng in chunk]
+            boxes.append((
+                max(min(lats) - self.pad_lat, -90.0), min(max(lats) + self.pad_lat, 90.0),
+                min(lngs) - self.pad_lng, max(lngs) + self.pad_lng,
+            ))
+        return boxes
+
+    def locate(self, lat, lng):
+        """
+        (distance_km, position_km) of the closest point of the route to
+        (lat, lng), position measured along the route from its start; None
+        when farther than the corridor width.
+        """
+        best = None
+        km_per_lat = math.radians(EARTH_RADIUS_KM)
+        cell = (math.floor(lat / self.cell_lat), math.floor(lng / self.cell_lng))
+        for start, end in self.grid.get(cell, ()):
+            for lat1, lng1, lng_scale, dx, dy, length, position in self.segments[start:end]:
+                px = (lng - lng1) * lng_scale
+                py = (lat - lat1) * km_per_lat
+                t = 0.0
+                if length:
+                    t = min(1.0, max(0.0, (px * dx + py * dy) / (length * length)))
+                distance = math.hypot(px - t * dx, py - t * dy)
+                if distance <= self.width_km and (best is None or distance < best[0]):
+                    best = (distance, position + t * length)
+        return best
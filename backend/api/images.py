@@ -0,0 +1,135 @@
+import os
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+# Longest side kept for the stored original
+MAX_DIMENSION = 1920
+# Widths of the generated thumbnails
+THUMBNAIL_WIDTHS = (160, 480, 960)
+JPEG_QUALITY = 85
+WEBP_QUALITY = 80
+
+
+def _replace(storage, name, content):
+    """Saves content under exactly `name`, replacing any previous file"""
+    if storage.exists(name):
+        storage.delete(name)
+    return storage.save(name, content)
+
+
+def _encode(image, image_format, **options):
+    buffer = BytesIO()
+    image.save(buffer, format=image_format, **options)
+    return ContentFile(buffer.getvalue())
+
+
+def _flatten(image):
+    """RGB copy for JPEG output, compositing transparency on white"""
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        rgba = image.convert('RGBA')
+        background = Image.new('RGB', rgba.size, (255, 255, 255))
+        background.paste(rgba, mask=rgba.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def process_image(field_file):
+    """
+    Normalizes an uploaded image in place and generates its thumbnails.
+
+    The stored file is rotated according to its EXIF orientation, stripped
+    of metadata (EXIF, GPS, ICC...) by re-encoding, and capped at
+    MAX_DIMENSION. PNG and WebP keep their format (and transparency), the
+    rest is stored as JPEG; when that doesn't match the extension the file
+    is renamed. Returns (name, {width: {'webp': name, 'jpeg': name}}) with
+    the storage names of the original and its thumbnails.
+    """
+    storage = field_file.storage
+    name = field_file.name
+
+    with storage.open(name, 'rb') as source:
+        image = Image.open(source)
+        # The decoded format is lost once the image is transposed or resized
+        source_format = image.format
+        image.load()
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail((MAX_DIMENSION, MAX_DIMENSION))
+
+    # Re-encode the original without metadata, keeping PNG/WebP transparency
+    if source_format == 'PNG':
+        content, extensions = _encode(image, 'PNG', optimize=True), ('.png',)
+    elif source_format == 'WEBP':
+        content, extensions = _encode(image, 'WEBP', quality=WEBP_QUALITY), ('.webp',)
+    else:
+        content = _encode(_flatten(image), 'JPEG', quality=JPEG_QUALITY, optimize=True)
+        extensions = ('.jpg', '.jpeg')
+    root, extension = os.path.splitext(name)
+    if extension.lower() in extensions:
+        _replace(storage, name, content)
+    else:
+        renamed = storage.save(root + extensions[0], content)
+        storage.delete(name)
+        name = renamed
+
+    directory, filename = os.path.split(name)
+    stem = os.path.splitext(filename)[0]
+    variants = {}
+    for width in THUMBNAIL_WIDTHS:
+        thumbnail = image.copy()
+        if thumbnail.width > width:
+            height = max(1, round(thumbnail.height * width / thumbnail.width))
+            thumbnail = thumbnail.resize((width, height), Image.LANCZOS)
+        base = os.path.join(directory, 'thumbs', f'{stem}_{width}')
+        variants[str(width)] = {
+            'webp': _replace(storage, f'{base}.webp', _encode(thumbnail, 'WEBP', quality=WEBP_QUALITY)),
+            'jpeg': _replace(storage, f'{base}.jpg', _encode(_flatten(thumbnail), 'JPEG', quality=JPEG_QUALITY, optimize=True)),
+        }
+    return name, variants
+
+
+def process_alert_image(alert_id):
+    """Background job (see api/jobs.py) run after an alert image is uploaded"""
+    from .cache import invalidate_alert_responses
+    from .models import Alert
+
+    alert = Alert.objects.filter(pk=alert_id).first()
+    if alert is None or not alert.image:
+        return
+    name, variants = process_image(alert.image)
+    # Only store the variants if the image wasn't replaced meanwhile
+    Alert.objects.filter(pk=alert_id, image=alert.image.name).update(
+        image=name,
+        image_variants=variants,
+        updated_at=timezone.now(),
+    )
+    invalidate_alert_responses()
+
+
+def process_avatar(profile_id):
+    """Background job (see api/jobs.py) run after an avatar is uploaded"""
+    from .cache import invalidate_alert_responses
+    from .models import UserProfile
+
+    profile = UserProfile.objects.filter(pk=profile_id).first()
+    if profile is None or not profile.avatar:
+        return
+    name, variants = process_image(profile.avatar)
+    UserProfile.objects.filter(pk=profile_id, avatar=profile.avatar.name).update(avatar=name, avatar_variants=variants)
+    invalidate_alert_responses()
+
+
+def thumbnail_urls(field_file, variants, request=None):
+    """Maps stored variant names to (absolute, when a request is given) URLs"""
+    if not variants:
+        return None
+    storage = field_file.storage
+    urls = {}
+    for width, formats in variants.items():
+        urls[width] = {}
+        for image_format, name in formats.items():
+            url = storage.url(name)
+            urls[width][image_format] = request.build_absolute_uri(url) if request else url
+    return urls
@@ -0,0 +1,159 @@
+"""
+Database-backed queue for the side effects of writes that don't have to
+finish before the response: image processing and subscriber notifications.
+
+Request handlers enqueue() a job, which is inserted once their transaction
+commits; `manage.py run_jobs` workers claim due jobs with a conditional
+UPDATE (so each job runs on one worker at a time), retry failures with
+exponential backoff and give up after `max_attempts`. With JOBS_EAGER the
+task runs right after the commit instead, in the same process, and a
+failure is only logged.
+"""
+import logging
+import random
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+# Job name -> dotted path of the task, called with the payload as kwargs
+JOB_TASKS = {
+    'process_alert_image': 'api.images.process_alert_image',
+    'process_avatar': 'api.images.process_avatar',
+    'notify_subscribers': 'api.subscriptions.notify_subscribers',
+}
+# Retry delays double from JOB_RETRY_BASE_SECONDS up to JOB_RETRY_MAX_SECONDS
+JOB_RETRY_BASE_SECONDS = 5
+JOB_RETRY_MAX_SECONDS = 3600
+# Running jobs not finished after this long are assumed lost with their worker
+JOB_TIMEOUT = timedelta(minutes=10)
+# Finished jobs (and their idempotency keys) are kept this long
+JOB_RETENTION = timedelta(days=7)
+
+
+def get_task(name):
+    return import_string(JOB_TASKS[name])
+
+
+def retry_delay(attempts):
+    """Seconds before retrying a job that failed for the `attempts`-th time"""
+    delay = min(JOB_RETRY_MAX_SECONDS, JOB_RETRY_BASE_SECONDS * 2 ** (attempts - 1))
+    # Jitter so jobs that failed together don't retry together
+    return delay * random.uniform(1.0, 1.25)
+
+
+def enqueue(name, payload=None, key=None, max_attempts=5):
+    """
+    Queues `name` to run with `payload` once the current transaction
+    commits. Nothing is queued if the transaction rolls back, or if a job
+    with the same idempotency `key` already exists.
+    """
+    from .models import Job
+
+    if name not in JOB_TASKS:
+        raise ValueError(f'Unknown job: {name}')
+    payload = payload or {}
+
+    def insert():
+        if getattr(settings, 'JOBS_EAGER', False):
+            try:
+                get_task(name)(**payload)
+            except Exception:
+                # The write already committed; don't turn it into a 500
+                logger.exception('Eager job %s failed', name)
+            return
+        Job.objects.bulk_create(
+            [Job(name=name, payload=payload, key=key, max_attempts=max_attempts)],
+            ignore_conflicts=key is not None,
+        )
+
+    transaction.on_commit(insert)
+
+
+def claim_job(worker_id):
+    """
+    Takes the oldest due job for `worker_id` and returns it, or None when
+    there's nothing to do. Also takes back running jobs past JOB_TIMEOUT.
+    """
+    from .models import Job
+
+    now = timezone.now()
+    # Separate queries so each one walks job_status_run_after_idx in order
+    for due in (Q(status='pending', run_after__lte=now), Q(status='running', locked_at__lt=now - JOB_TIMEOUT)):
+        candidates = Job.objects.filter(due).order_by('run_after', 'id').values_list('id', 'status', 'attempts')[:10]
+        for job_id, job_status, attempts in candidates:
+            # Only one worker's UPDATE still finds the job as it was read
+            claimed = Job.objects.filter(pk=job_id, status=job_status, attempts=attempts).update(
+                status='running', locked_by=worker_id, locked_at=now, attempts=F('attempts') + 1,
+            )
+            if claimed:
+                return Job.objects.get(pk=job_id)
+    return None
+
+
+def run_job(job):
+    """Runs a claimed job and records the outcome; returns whether it succeeded"""
+    from .models import Job
+
+    claim = Job.objects.filter(pk=job.pk, status='running', locked_by=job.locked_by, attempts=job.attempts)
+    try:
+        get_task(job.name)(**job.payload)
+    except Exception:
+        error = traceback.format_exc()
+        if job.attempts >= job.max_attempts:
+            logger.exception('Job %s(%s) failed for good after %s attempts', job.name, job.pk, job.attempts)
+            claim.update(status='failed', last_error=error, finished_at=timezone.now())
+        else:
+            logger.warning('Job %s(%s) failed, retrying', job.name, job.pk, exc_info=True)
+            claim.update(
+                status='pending', last_error=error,
+                run_after=timezone.now() + timedelta(seconds=retry_delay(job.attempts)),
+            )
+        return False
+    claim.update(status='done', finished_at=timezone.now())
+    return True
+
+
+def run_pending_jobs(worker_id='inline', limit=None):
+    """Runs due jobs one after another until none are left; returns how many ran"""
+    ran = 0
+    while limit is None or ran < limit:
+        job = claim_job(worker_id)
+        if job is None:
+            break
+        run_job(job)
+        ran += 1
+    return ran
+
+
+def work(worker_id, stop, poll_interval=1.0):
+    """Worker loop for run_jobs threads: runs due jobs until `stop` is set"""
+    while not stop.is_set():
+        close_old_connections()
+        try:
+            job = claim_job(worker_id)
+            if job is not None:
+                run_job(job)
+        except Exception:
+            # Lost the database for a moment (locked, restarting...)
+            logger.exception('Worker %s could not claim a job', worker_id)
+            job = None
+        if job is None:
+            stop.wait(poll_interval)
+    close_old_connections()
+
+
+def purge_finished_jobs():
+    """Deletes jobs that finished more than JOB_RETENTION ago"""
+    from .models import Job
+
+    deleted, _ = Job.objects.filter(
+        status__in=('done', 'failed'), finished_at__lt=timezone.now() - JOB_RETENTION
+    ).delete()
+    return deleted
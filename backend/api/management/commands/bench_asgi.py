@@ -0,0 +1,177 @@
+import asyncio
+import json
+import logging
+import random
+import time
+from urllib.parse import urlencode
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max, Min
+from django.test.utils import override_settings
+from rest_framework.authtoken.models import Token
+
+from api.models import Alert
+
+from .bench_endpoints import percentile
+
+ENDPOINTS = ['list', 'detail', 'nearby', 'comments', 'categories']
+URLCONFS = {'sync': 'backend.urls', 'async': 'backend.async_urls'}
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark bajo ASGI de los endpoints de lectura: mantiene N conexiones '
+        'concurrentes contra la aplicación ASGI y compara las vistas sync con las async'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--connections', default='10,50,200', help='Niveles de concurrencia separados por comas')
+        parser.add_argument('--requests', type=int, default=20, help='Peticiones por conexión')
+        parser.add_argument('--endpoints', default=','.join(ENDPOINTS))
+        parser.add_argument('--modes', default='sync,async')
+        parser.add_argument('--radius', type=float, default=5.0, help='Radio de nearby en km')
+        parser.add_argument('--output', help='Ruta del archivo JSON de resultados')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        endpoints = [name.strip() for name in options['endpoints'].split(',') if name.strip()]
+        modes = [name.strip() for name in options['modes'].split(',') if name.strip()]
+        unknown = (set(endpoints) - set(ENDPOINTS)) | (set(modes) - set(URLCONFS))
+        if unknown:
+            raise CommandError(f"Opciones desconocidas: {', '.join(sorted(unknown))}")
+        levels = [int(level) for level in options['connections'].split(',')]
+
+        rng = random.Random(options['seed'])
+        bounds = Alert.objects.aggregate(first=Min('id'), last=Max('id'))
+        sample = []
+        if bounds['first'] is not None:
+            id_range = range(bounds['first'], bounds['last'] + 1)
+            ids = rng.sample(id_range, min(len(id_range), 1000))
+            sample = list(Alert.objects.filter(pk__in=ids).values_list('id', 'latitude', 'longitude'))
+        if not sample:
+            raise CommandError('No hay alertas; genera datos con generate_city_data')
+        user = User.objects.filter(is_active=True).order_by('pk').first()
+        if user is None:
+            raise CommandError('No hay usuarios para las peticiones autenticadas')
+        token, _ = Token.objects.get_or_create(user=user)
+
+        # The test runner only allows 'testserver'; DEBUG only allows localhost
+        server_name = 'testserver' if 'testserver' in settings.ALLOWED_HOSTS else 'localhost'
+        # Imported here: it builds the Django ASGI handler on import
+        from backend.asgi import application
+
+        def make_request():
+            name = rng.choice(endpoints)
+            alert_id, latitude, longitude = rng.choice(sample)
+            headers = []
+            if name == 'list':
+                path, query = '/api/alerts/', {'page_size': 50}
+            elif name == 'detail':
+                path, query = f'/api/alerts/{alert_id}/', {}
+            elif name == 'nearby':
+                path, query = '/api/alerts/nearby/', {'lat': latitude, 'lng': longitude, 'radius': options['radius']}
+                headers.append((b'authorization', f'Token {token.key}'.encode()))
+            elif name == 'comments':
+                path, query = f'/api/alerts/{alert_id}/comments/', {}
+            else:
+                path, query = '/api/categories/', {}
+            return path, urlencode(query), headers
+
+        async def call(path, query_string, headers):
+            scope = {
+                'type': 'http',
+                'asgi': {'version': '3.0'},
+                'http_version': '1.1',
+                'method': 'GET',
+                'scheme': 'http',
+                'path': path,
+                'raw_path': path.encode(),
+                'query_string': query_string.encode(),
+                'root_path': '',
+                'headers': [(b'host', server_name.encode()), *headers],
+                'server': (server_name, 80),
+                'client': ('127.0.0.1', 0),
+            }
+            finished = asyncio.Event()
+            request_sent = False
+            status_code = None
+
+            async def receive():
+                nonlocal request_sent
+                if not request_sent:
+                    request_sent = True
+                    return {'type': 'http.request', 'body': b'', 'more_body': False}
+                # The connection stays open until the response is out
+                await finished.wait()
+                return {'type': 'http.disconnect'}
+
+            async def send(message):
+                nonlocal status_code
+                if message['type'] == 'http.response.start':
+                    status_code = message['status']
+                elif message['type'] == 'http.response.body' and not message.get('more_body'):
+                    finished.set()
+
+            await application(scope, receive, send)
+            return status_code
+
+        async def connection_loop(requests, latencies, errors):
+            for path, query_string, headers in requests:
+                started = time.perf_counter()
+                status_code = await call(path, query_string, headers)
+                latencies.append((time.perf_counter() - started) * 1000)
+                if status_code is None or status_code >= 400:
+                    errors.append(status_code)
+
+        async def run_level(connections):
+            plans = [[make_request() for _ in range(options['requests'])] for _ in range(connections)]
+            latencies, errors = [], []
+            started = time.perf_counter()
+            await asyncio.gather(*(connection_loop(plan, latencies, errors) for plan in plans))
+            return latencies, errors, time.perf_counter() - started
+
+        # Driven through async_to_sync, so sync views and async ORM calls run
+        # on this thread the way a server runs them on its one thread-sensitive
+        # executor
+        results = {}
+        request_logger = logging.getLogger('django.request')
+        previous_level = request_logger.level
+        request_logger.setLevel(logging.CRITICAL)
+        try:
+            for mode in modes:
+                results[mode] = {}
+                with override_settings(ROOT_URLCONF=URLCONFS[mode]):
+                    # Warm the response cache and the token cache
+                    async_to_sync(run_level)(1)
+                    for connections in levels:
+                        latencies, errors, elapsed = async_to_sync(run_level)(connections)
+                        latencies.sort()
+                        total = connections * options['requests']
+                        row = {
+                            'requests': total,
+                            'errors': len(errors),
+                            'p50_ms': round(percentile(latencies, 50), 3),
+                            'p95_ms': round(percentile(latencies, 95), 3),
+                            'p99_ms': round(percentile(latencies, 99), 3),
+                            'throughput_rps': round(total / elapsed, 1) if elapsed else 0.0,
+                        }
+                        results[mode][str(connections)] = row
+                        self.stdout.write(
+                            f"{mode:<5} {connections:>5} conexiones  p50 {row['p50_ms']:8.2f}ms  "
+                            f"p95 {row['p95_ms']:8.2f}ms  {row['throughput_rps']:8.1f} req/s  "
+                            f"{row['errors']} errores"
+                        )
+        finally:
+            request_logger.setLevel(previous_level)
+
+        if options['output']:
+            report = {
+                'options': {key: options[key] for key in ('connections', 'requests', 'endpoints', 'radius', 'seed')},
+                'results': results,
+            }
+            with open(options['output'], 'w') as output:
+                json.dump(report, output, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Resultados guardados en {options['output']}"))
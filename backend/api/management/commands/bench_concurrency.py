@@ -0,0 +1,156 @@
+import json
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections
+from rest_framework.test import APIClient
+
+from api.models import Alert
+
+from .bench_endpoints import percentile
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark de lecturas y escrituras concurrentes contra SQLite: ejecutar con '
+        'y sin WEYALERT_SQLITE_PROFILE=concurrent para comparar throughput y bloqueos'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=8)
+        parser.add_argument('--writers', type=int, default=4)
+        parser.add_argument('--seconds', type=float, default=10.0)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--output', help='Ruta del archivo JSON de resultados')
+        parser.add_argument('--keep', action='store_true', help='No borrar los datos generados')
+
+    def handle(self, *args, **options):
+        prefix = f'bench-rw-{int(time.time() * 1000)}'
+        owner = User.objects.create_user(f'{prefix}-owner')
+        writers = [User.objects.create_user(f'{prefix}-{i}') for i in range(options['writers'])]
+        seeded = Alert.objects.bulk_create([
+            Alert(
+                user=owner,
+                title=f'Benchmark {i}', description='Alerta de benchmark', category='traffic_jam',
+                latitude=19.4326 + (i % 20) * 0.002, longitude=-99.1332 + (i // 20) * 0.002,
+            )
+            for i in range(200)
+        ])
+        alert_ids = [alert.pk for alert in seeded]
+        connections.close_all()
+
+        # The test runner only allows 'testserver'; DEBUG only allows localhost
+        server_name = 'testserver' if 'testserver' in settings.ALLOWED_HOSTS else 'localhost'
+        stop = threading.Event()
+        lock = threading.Lock()
+        stats = {
+            'reads': 0, 'writes': 0, 'read_errors': 0, 'write_errors': 0, 'locked': 0,
+            'read_latencies': [], 'write_latencies': [],
+        }
+
+        def record(kind, started, ok, locked=False):
+            with lock:
+                stats[f'{kind}s' if ok else f'{kind}_errors'] += 1
+                stats['locked'] += locked
+                if ok:
+                    stats[f'{kind}_latencies'].append((time.perf_counter() - started) * 1000)
+
+        def read_loop(seed):
+            rng = random.Random(seed)
+            client = APIClient(SERVER_NAME=server_name)
+            try:
+                while not stop.is_set():
+                    started = time.perf_counter()
+                    try:
+                        if rng.random() < 0.5:
+                            response = client.get('/api/alerts/nearby/', {
+                                'lat': 19.4326 + rng.uniform(-0.02, 0.02),
+                                'lng': -99.1332 + rng.uniform(-0.02, 0.02),
+                                'radius': 2,
+                            })
+                        else:
+                            response = client.get(f'/api/alerts/{rng.choice(alert_ids)}/comments/')
+                        record('read', started, response.status_code == 200)
+                    except OperationalError:
+                        record('read', started, False, locked=True)
+            finally:
+                connections.close_all()
+
+        def write_loop(user, seed):
+            rng = random.Random(seed)
+            client = APIClient(SERVER_NAME=server_name)
+            client.force_authenticate(user)
+            try:
+                while not stop.is_set():
+                    started = time.perf_counter()
+                    try:
+                        if rng.random() < 0.8:
+                            response = client.post(f'/api/alerts/{rng.choice(alert_ids)}/react/', {
+                                'reaction_type': rng.choice(['like', 'dislike']),
+                            })
+                            ok = response.status_code == 200
+                        else:
+                            response = client.post('/api/alerts/', {
+                                'category': 'road_hazard', 'title': 'Bache', 'description': 'Benchmark',
+                                'latitude': 19.4326 + rng.uniform(-0.02, 0.02),
+                                'longitude': -99.1332 + rng.uniform(-0.02, 0.02),
+                            })
+                            ok = response.status_code == 201
+                        record('write', started, ok)
+                    except OperationalError:
+                        record('write', started, False, locked=True)
+            finally:
+                connections.close_all()
+
+        # Lock errors are counted; don't log each one as a 500
+        request_logger = logging.getLogger('django.request')
+        previous_level = request_logger.level
+        request_logger.setLevel(logging.CRITICAL)
+        rng = random.Random(options['seed'])
+        try:
+            with ThreadPoolExecutor(max_workers=options['readers'] + options['writers']) as executor:
+                futures = [executor.submit(read_loop, rng.random()) for _ in range(options['readers'])]
+                futures += [executor.submit(write_loop, user, rng.random()) for user in writers]
+                stop.wait(options['seconds'])
+                stop.set()
+                for future in futures:
+                    future.result()
+        finally:
+            request_logger.setLevel(previous_level)
+
+        elapsed = options['seconds']
+        read_latencies = sorted(stats['read_latencies'])
+        write_latencies = sorted(stats['write_latencies'])
+        journal_mode = connections['default'].cursor().execute('PRAGMA journal_mode').fetchone()[0]
+        report = {
+            'profile': getattr(settings, 'SQLITE_PROFILE', 'default'),
+            'journal_mode': journal_mode,
+            'readers': options['readers'],
+            'writers': options['writers'],
+            'seconds': elapsed,
+            'reads_per_second': round(stats['reads'] / elapsed, 1),
+            'writes_per_second': round(stats['writes'] / elapsed, 1),
+            'read_p95_ms': round(percentile(read_latencies, 95), 3),
+            'write_p95_ms': round(percentile(write_latencies, 95), 3),
+            'read_errors': stats['read_errors'],
+            'write_errors': stats['write_errors'],
+            'locked_errors': stats['locked'],
+        }
+        self.stdout.write(
+            f"perfil {report['profile']} ({journal_mode}): "
+            f"{report['reads_per_second']} lecturas/s (p95 {report['read_p95_ms']}ms), "
+            f"{report['writes_per_second']} escrituras/s (p95 {report['write_p95_ms']}ms), "
+            f"{report['locked_errors']} errores por bloqueo"
+        )
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(report, output, indent=2)
+
+        if not options['keep']:
+            User.objects.filter(username__startswith=prefix).delete()
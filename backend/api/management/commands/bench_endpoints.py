@@ -0,0 +1,145 @@
+import json
+import math
+import platform
+import random
+import time
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Max, Min
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from api.cache import get_response_cache
+from api.models import Alert
+
+ENDPOINTS = ['list', 'detail', 'nearby', 'react', 'comments', 'categories']
+
+
+def percentile(values, percent):
+    """Nearest-rank percentile of an already sorted list"""
+    if not values:
+        return 0.0
+    rank = max(1, math.ceil(percent / 100 * len(values)))
+    return values[rank - 1]
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark de los endpoints reales con el cliente de pruebas de Django: '
+        'latencia p50/p95/p99, consultas por petición y throughput, en JSON comparable'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Peticiones medidas por endpoint')
+        parser.add_argument('--warmup', type=int, default=10)
+        parser.add_argument('--endpoints', default=','.join(ENDPOINTS))
+        parser.add_argument('--cold', action='store_true', help='Vaciar la caché de respuestas antes de cada petición')
+        parser.add_argument('--radius', type=float, default=5.0, help='Radio de nearby en km')
+        parser.add_argument('--label', default='', help='Etiqueta guardada con los resultados')
+        parser.add_argument('--output', help='Ruta del archivo JSON de resultados')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        endpoints = [name.strip() for name in options['endpoints'].split(',') if name.strip()]
+        unknown = set(endpoints) - set(ENDPOINTS)
+        if unknown:
+            raise CommandError(f"Endpoints desconocidos: {', '.join(sorted(unknown))}")
+
+        rng = random.Random(options['seed'])
+        # Sample of real alerts to aim detail/nearby/react/comments at; random
+        # ids instead of ORDER BY RANDOM(), which sorts the whole table
+        bounds = Alert.objects.aggregate(first=Min('id'), last=Max('id'))
+        sample = []
+        if bounds['first'] is not None:
+            id_range = range(bounds['first'], bounds['last'] + 1)
+            ids = rng.sample(id_range, min(len(id_range), 1000))
+            sample = list(Alert.objects.filter(pk__in=ids).values_list('id', 'latitude', 'longitude'))
+        if not sample:
+            raise CommandError('No hay alertas; genera datos con generate_city_data')
+        user = User.objects.filter(is_active=True).order_by('pk').first()
+        if user is None:
+            raise CommandError('No hay usuarios para las peticiones autenticadas')
+
+        # The test runner only allows 'testserver'; DEBUG only allows localhost
+        server_name = 'testserver' if 'testserver' in settings.ALLOWED_HOSTS else 'localhost'
+        anonymous = APIClient(SERVER_NAME=server_name)
+        authenticated = APIClient(SERVER_NAME=server_name)
+        authenticated.force_authenticate(user)
+
+        def make_request(name):
+            alert_id, latitude, longitude = rng.choice(sample)
+            if name == 'list':
+                return anonymous.get('/api/alerts/', {'page_size': 50})
+            if name == 'detail':
+                return anonymous.get(f'/api/alerts/{alert_id}/')
+            if name == 'nearby':
+                return authenticated.get('/api/alerts/nearby/', {
+                    'lat': latitude, 'lng': longitude, 'radius': options['radius'],
+                })
+            if name == 'react':
+                return authenticated.post(f'/api/alerts/{alert_id}/react/', {
+                    'reaction_type': rng.choice(['like', 'dislike']),
+                })
+            if name == 'comments':
+                return anonymous.get(f'/api/alerts/{alert_id}/comments/')
+            return anonymous.get('/api/categories/')
+
+        results = {}
+        for name in endpoints:
+            for _ in range(options['warmup']):
+                make_request(name)
+
+            latencies, queries, errors = [], [], 0
+            started = time.perf_counter()
+            for _ in range(options['requests']):
+                if options['cold']:
+                    get_response_cache().clear()
+                with CaptureQueriesContext(connection) as captured:
+                    request_start = time.perf_counter()
+                    response = make_request(name)
+                    latencies.append((time.perf_counter() - request_start) * 1000)
+                queries.append(len(captured))
+                if response.status_code >= 400:
+                    errors += 1
+            elapsed = time.perf_counter() - started
+
+            latencies.sort()
+            results[name] = {
+                'requests': options['requests'],
+                'errors': errors,
+                'p50_ms': round(percentile(latencies, 50), 3),
+                'p95_ms': round(percentile(latencies, 95), 3),
+                'p99_ms': round(percentile(latencies, 99), 3),
+                'max_ms': round(latencies[-1], 3) if latencies else 0.0,
+                'queries_avg': round(sum(queries) / len(queries), 2) if queries else 0.0,
+                'queries_max': max(queries, default=0),
+                'throughput_rps': round(options['requests'] / elapsed, 1) if elapsed else 0.0,
+            }
+            row = results[name]
+            self.stdout.write(
+                f"{name:<11} p50 {row['p50_ms']:8.2f}ms  p95 {row['p95_ms']:8.2f}ms  "
+                f"p99 {row['p99_ms']:8.2f}ms  {row['queries_avg']:5.1f} consultas  "
+                f"{row['throughput_rps']:8.1f} req/s  {errors} errores"
+            )
+
+        report = {
+            'label': options['label'],
+            'timestamp': timezone.now().isoformat(),
+            'environment': {
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+                'alerts': Alert.objects.count(),
+            },
+            'options': {key: options[key] for key in ('requests', 'warmup', 'cold', 'radius', 'seed')},
+            'results': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(report, output, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Resultados guardados en {options['output']}"))
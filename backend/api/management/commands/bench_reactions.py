@@ -0,0 +1,110 @@
+import logging
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connections
+from rest_framework.test import APIClient
+
+from api.models import Alert, AlertReaction
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark de concurrencia: muchos hilos reaccionan a la misma alerta y '
+        'se verifica que los contadores finales sean exactos'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--reactions-per-user', type=int, default=5)
+        parser.add_argument('--max-retries', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--keep', action='store_true', help='No borrar los datos generados')
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        prefix = f'bench-react-{int(time.time() * 1000)}'
+
+        author = User.objects.create_user(f'{prefix}-author')
+        alert = Alert.objects.create(
+            user=author, title='Benchmark', description='Alerta de benchmark',
+            category='traffic_accident', latitude=19.4326, longitude=-99.1332,
+        )
+        users = User.objects.bulk_create([
+            User(username=f'{prefix}-{i}') for i in range(options['users'])
+        ])
+        plans = {
+            user.pk: [rng.choice(['like', 'dislike', 'remove']) for _ in range(options['reactions_per_user'])]
+            for user in users
+        }
+        retries = []
+        # The test runner only allows 'testserver'; DEBUG only allows localhost
+        server_name = 'testserver' if 'testserver' in settings.ALLOWED_HOSTS else 'localhost'
+
+        def react_as(user):
+            # Each user's reactions are sequential; different users run concurrently
+            client = APIClient(SERVER_NAME=server_name)
+            client.force_authenticate(user)
+            user_retries = 0
+            try:
+                for reaction_type in plans[user.pk]:
+                    for attempt in range(options['max_retries'] + 1):
+                        try:
+                            response = client.post(f'/api/alerts/{alert.pk}/react/', {'reaction_type': reaction_type})
+                            break
+                        except OperationalError:
+                            if attempt == options['max_retries']:
+                                raise
+                            user_retries += 1
+                            time.sleep(0.005 * (attempt + 1))
+                    if response.status_code != 200:
+                        raise CommandError(f'react devolvió {response.status_code}')
+            finally:
+                retries.append(user_retries)
+                connections.close_all()
+
+        total = options['users'] * options['reactions_per_user']
+        # Lock errors are expected and retried; don't log each one as a 500
+        request_logger = logging.getLogger('django.request')
+        previous_level = request_logger.level
+        request_logger.setLevel(logging.CRITICAL)
+        start = time.perf_counter()
+        try:
+            with ThreadPoolExecutor(max_workers=options['threads']) as executor:
+                for future in [executor.submit(react_as, user) for user in users]:
+                    future.result()
+        finally:
+            elapsed = time.perf_counter() - start
+            request_logger.setLevel(previous_level)
+
+        alert.refresh_from_db()
+        final = {user_id: plan[-1] for user_id, plan in plans.items()}
+        expected_likes = sum(1 for reaction in final.values() if reaction == 'like')
+        expected_dislikes = sum(1 for reaction in final.values() if reaction == 'dislike')
+        stored_likes = AlertReaction.objects.filter(alert=alert, reaction_type='like').count()
+        stored_dislikes = AlertReaction.objects.filter(alert=alert, reaction_type='dislike').count()
+
+        self.stdout.write(
+            f'{total} reacciones en {elapsed:.2f}s ({total / elapsed:.0f}/s) con '
+            f'{options["threads"]} hilos, {sum(retries)} reintentos por bloqueo'
+        )
+        self.stdout.write(
+            f'likes: {alert.likes_count} (esperado {expected_likes}), '
+            f'dislikes: {alert.dislikes_count} (esperado {expected_dislikes})'
+        )
+
+        exact = (
+            alert.likes_count == expected_likes == stored_likes and
+            alert.dislikes_count == expected_dislikes == stored_dislikes
+        )
+        if not options['keep']:
+            alert.delete()
+            User.objects.filter(username__startswith=prefix).delete()
+        if not exact:
+            raise CommandError('Los contadores finales no coinciden con las reacciones')
+        self.stdout.write(self.style.SUCCESS('Contadores exactos'))
@@ -0,0 +1,113 @@
+import json
+import math
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.categories import ALERT_CATEGORIES
+from api.geo import EARTH_RADIUS_KM
+from api.models import Subscription
+from api.subscriptions import SubscriptionIndex
+
+from .bench_endpoints import percentile
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark del emparejamiento de alertas con suscripciones: genera N '
+        'suscripciones sintéticas en memoria y mide la latencia del índice '
+        'espacial frente a recorrerlas todas'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--subscriptions', type=int, default=100000)
+        parser.add_argument('--alerts', type=int, default=5000, help='Alertas emparejadas con el índice')
+        parser.add_argument('--scan-alerts', type=int, default=50, help='Alertas emparejadas recorriendo todo')
+        parser.add_argument('--center', default='19.4326,-99.1332', help='lat,lng del centro de la ciudad')
+        parser.add_argument('--radius-km', type=float, default=25.0)
+        parser.add_argument('--output', help='Ruta del archivo JSON de resultados')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        try:
+            center_lat, center_lng = (float(value) for value in options['center'].split(','))
+        except ValueError:
+            raise CommandError('--center debe ser "lat,lng"')
+        radius_deg = math.degrees(options['radius_km'] / EARTH_RADIUS_KM)
+        lng_scale = 1 / math.cos(math.radians(center_lat))
+        categories = list(ALERT_CATEGORIES)
+
+        def random_point():
+            # Uniform over the city's disc
+            distance = radius_deg * math.sqrt(rng.random())
+            angle = rng.uniform(0, 2 * math.pi)
+            return center_lat + distance * math.sin(angle), center_lng + distance * math.cos(angle) * lng_scale
+
+        subscriptions = []
+        for pk in range(1, options['subscriptions'] + 1):
+            lat, lng = random_point()
+            # Half follow every category, the rest one to three
+            chosen = [] if rng.random() < 0.5 else rng.sample(categories, rng.randint(1, 3))
+            if rng.random() < 0.8:
+                subscription = Subscription(
+                    pk=pk, user_id=pk, latitude=lat, longitude=lng,
+                    radius_meters=rng.randint(200, 5000), categories=chosen,
+                )
+            else:
+                half_height, half_width = rng.uniform(0.005, 0.05), rng.uniform(0.005, 0.05) * lng_scale
+                subscription = Subscription(
+                    pk=pk, user_id=pk, south=lat - half_height, north=lat + half_height,
+                    west=lng - half_width, east=lng + half_width, categories=chosen,
+                )
+            subscriptions.append(subscription)
+
+        index = SubscriptionIndex()
+        started = time.perf_counter()
+        for subscription in subscriptions:
+            index.add(subscription)
+        build_seconds = time.perf_counter() - started
+        self.stdout.write(f'Índice de {len(index)} suscripciones construido en {build_seconds:.2f}s')
+
+        alerts = [(rng.choice(categories), *random_point()) for _ in range(options['alerts'])]
+        latencies, matched = [], []
+        for category, lat, lng in alerts:
+            started = time.perf_counter()
+            found = index.match(category, lat, lng)
+            latencies.append((time.perf_counter() - started) * 1000)
+            matched.append(len(found))
+
+        scan_latencies = []
+        for category, lat, lng in alerts[:options['scan_alerts']]:
+            started = time.perf_counter()
+            scanned = [subscription.pk for subscription in subscriptions if subscription.matches(category, lat, lng)]
+            scan_latencies.append((time.perf_counter() - started) * 1000)
+            if sorted(scanned) != sorted(index.match(category, lat, lng)):
+                raise CommandError(f'El índice y el recorrido difieren en ({lat}, {lng})')
+
+        results = {}
+        for name, values in (('index', latencies), ('scan', scan_latencies)):
+            values.sort()
+            results[name] = {
+                'alerts': len(values),
+                'p50_ms': round(percentile(values, 50), 4),
+                'p95_ms': round(percentile(values, 95), 4),
+                'p99_ms': round(percentile(values, 99), 4),
+            }
+            self.stdout.write(
+                f"{name:<6} {len(values):>6} alertas  p50 {results[name]['p50_ms']:9.4f}ms  "
+                f"p95 {results[name]['p95_ms']:9.4f}ms  p99 {results[name]['p99_ms']:9.4f}ms"
+            )
+        results['index']['avg_matches'] = round(sum(matched) / len(matched), 1) if matched else 0.0
+        results['index']['build_seconds'] = round(build_seconds, 3)
+        self.stdout.write(f"Suscripciones por alerta: {results['index']['avg_matches']} en promedio")
+
+        if options['output']:
+            report = {
+                'options': {key: options[key] for key in ('subscriptions', 'alerts', 'center', 'radius_km', 'seed')},
+                'results': results,
+            }
+            with open(options['output'], 'w') as output:
+                json.dump(report, output, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Resultados guardados en {options['output']}"))
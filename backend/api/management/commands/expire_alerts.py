@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from api.expiry import EXPIRY_BATCH_SIZE, expire_stale_alerts, run_expiry_loop
+
+
+class Command(BaseCommand):
+    help = 'Marca como expiradas las alertas activas que superaron el TTL de su categoría'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=EXPIRY_BATCH_SIZE)
+        parser.add_argument('--max-batches', type=int, default=None, help='Lotes máximos por pasada')
+        parser.add_argument('--loop', action='store_true', help='Repetir la pasada cada --interval segundos')
+        parser.add_argument('--interval', type=float, default=60.0)
+        parser.add_argument('--no-events', action='store_true', help='No publicar eventos en tiempo real')
+
+    def handle(self, *args, **options):
+        sweep_options = {
+            'batch_size': options['batch_size'],
+            'max_batches': options['max_batches'],
+            'publish': not options['no_events'],
+        }
+        if not options['loop']:
+            self.report(expire_stale_alerts(**sweep_options))
+            return
+
+        try:
+            run_expiry_loop(options['interval'], on_sweep=self.report, **sweep_options)
+        except KeyboardInterrupt:
+            pass
+
+    def report(self, result):
+        self.stdout.write(
+            f"{result['expired']} alertas expiradas en {result['seconds']:.3f}s "
+            f"({result['rows_per_second']:.0f} filas/s), retraso máximo {result['lag_seconds']:.0f}s"
+        )
@@ -0,0 +1,198 @@
+import math
+import random
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from api.cache import invalidate_alert_responses
+from api.categories import ALERT_CATEGORIES, get_category_ttl
+from api.geo import EARTH_RADIUS_KM
+from api.models import Alert, AlertComment, AlertReaction, UserProfile
+from api.rollups import rebuild_rollups
+
+COMMENT_TEXTS = [
+    'Sigue ahí', 'Ya se despejó', 'Confirmo, acabo de pasar', 'Tomen otra ruta',
+    'Hay patrulla en el lugar', 'Está peor que hace una hora', 'Ya llegó la grúa',
+]
+
+
+@contextmanager
+def explicit_timestamps():
+    """Lets bulk_create store the generated created_at/updated_at values"""
+    created_at = Alert._meta.get_field('created_at')
+    updated_at = Alert._meta.get_field('updated_at')
+    saved = created_at.auto_now_add, updated_at.auto_now
+    created_at.auto_now_add = updated_at.auto_now = False
+    try:
+        yield
+    finally:
+        created_at.auto_now_add, updated_at.auto_now = saved
+
+
+class Command(BaseCommand):
+    help = (
+        'Genera datos sintéticos a escala de ciudad: usuarios, alertas agrupadas '
+        'en puntos calientes, reacciones y comentarios (reproducible con --seed)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--alerts', type=int, default=10000)
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--hotspots', type=int, default=40)
+        parser.add_argument('--center', default='19.4326,-99.1332', help='lat,lng del centro de la ciudad')
+        parser.add_argument('--radius-km', type=float, default=25.0)
+        parser.add_argument('--days', type=int, default=30, help='Antigüedad máxima de las alertas')
+        parser.add_argument('--reactions-per-alert', type=float, default=3.0, help='Promedio')
+        parser.add_argument('--comments-per-alert', type=float, default=0.5, help='Promedio')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--prefix', default='city')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.options = options
+        try:
+            self.center = tuple(float(value) for value in options['center'].split(','))
+        except ValueError:
+            raise CommandError('--center debe tener el formato lat,lng')
+        if User.objects.filter(username__startswith=f"{options['prefix']}-").exists():
+            raise CommandError(f"Ya existen usuarios con el prefijo {options['prefix']}; usa otro --prefix")
+
+        start = time.perf_counter()
+        users = self.create_users()
+        self.hotspots = self.make_hotspots()
+        self.now = timezone.now()
+
+        totals = {'alerts': 0, 'reactions': 0, 'comments': 0}
+        remaining = options['alerts']
+        with explicit_timestamps():
+            while remaining > 0:
+                size = min(options['batch_size'], remaining)
+                with transaction.atomic():
+                    for key, count in self.create_batch(users, size).items():
+                        totals[key] += count
+                remaining -= size
+                self.stdout.write(f"  {totals['alerts']}/{options['alerts']} alertas")
+
+        UserProfile.recompute_statistics(UserProfile.objects.filter(user__in=users))
+        # bulk_create bypasses the incremental rollup updates
+        rebuild_rollups(self.now - timedelta(days=options['days']))
+        invalidate_alert_responses(locations=True)
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(users)} usuarios, {totals['alerts']} alertas, {totals['reactions']} reacciones y "
+            f"{totals['comments']} comentarios en {elapsed:.1f}s"
+        ))
+
+    def create_users(self):
+        password = make_password(None)
+        users = User.objects.bulk_create([
+            User(username=f"{self.options['prefix']}-{i}", password=password)
+            for i in range(self.options['users'])
+        ], batch_size=self.options['batch_size'])
+        # bulk_create skips the post_save signal that creates profiles
+        UserProfile.objects.bulk_create(
+            [UserProfile(user=user) for user in users], batch_size=self.options['batch_size']
+        )
+        return users
+
+    def make_hotspots(self):
+        """Busy spots (avenues, downtown...) with a spread, weight and favorite categories"""
+        categories = list(ALERT_CATEGORIES)
+        hotspots = []
+        for rank in range(1, self.options['hotspots'] + 1):
+            latitude, longitude = self.random_point(self.center, self.options['radius_km'] * math.sqrt(self.rng.random()))
+            hotspots.append({
+                'center': (latitude, longitude),
+                'spread_km': self.rng.uniform(0.2, 1.5),
+                # Zipf-like: a few hotspots get most of the reports
+                'weight': 1.0 / rank,
+                'categories': self.rng.sample(categories, 3),
+            })
+        return hotspots
+
+    def random_point(self, origin, distance_km):
+        bearing = self.rng.uniform(0, 2 * math.pi)
+        latitude = origin[0] + math.degrees(distance_km * math.cos(bearing) / EARTH_RADIUS_KM)
+        longitude = origin[1] + math.degrees(
+            distance_km * math.sin(bearing) / (EARTH_RADIUS_KM * math.cos(math.radians(origin[0])))
+        )
+        return latitude, longitude
+
+    def make_alert(self, users):
+        rng = self.rng
+        categories = list(ALERT_CATEGORIES)
+        # 80% of the reports come from hotspots, the rest anywhere in the city
+        if rng.random() < 0.8:
+            hotspot = rng.choices(self.hotspots, weights=[spot['weight'] for spot in self.hotspots])[0]
+            latitude, longitude = self.random_point(hotspot['center'], abs(rng.gauss(0, hotspot['spread_km'])))
+            category = rng.choice(hotspot['categories']) if rng.random() < 0.7 else rng.choice(categories)
+        else:
+            latitude, longitude = self.random_point(self.center, self.options['radius_km'] * math.sqrt(rng.random()))
+            category = rng.choice(categories)
+
+        created_at = self.now - timedelta(seconds=rng.uniform(0, self.options['days'] * 86400))
+        status, closed_at = 'active', None
+        if rng.random() < 0.15:
+            status = 'resolved'
+            closed_at = min(self.now, created_at + timedelta(minutes=rng.uniform(5, 600)))
+        elif created_at < self.now - get_category_ttl(category):
+            status = 'expired'
+
+        return Alert(
+            user=rng.choice(users),
+            title=f"{ALERT_CATEGORIES[category]['name']} #{rng.randrange(1, 10 ** 6)}",
+            description='Alerta generada para pruebas de rendimiento',
+            category=category,
+            latitude=latitude,
+            longitude=longitude,
+            status=status,
+            created_at=created_at,
+            updated_at=closed_at or created_at,
+            closed_at=closed_at,
+        )
+
+    def poisson(self, mean):
+        # Knuth's method; means here are small
+        limit, count, product = math.exp(-mean), 0, self.rng.random()
+        while product > limit:
+            count += 1
+            product *= self.rng.random()
+        return count
+
+    def create_batch(self, users, size):
+        rng = self.rng
+        alerts = [self.make_alert(users) for _ in range(size)]
+
+        # Plan reactions and comments first so the cached counters are stored
+        # with the alerts instead of being updated row by row afterwards
+        plans = []
+        for alert in alerts:
+            reactors = rng.sample(users, min(len(users), self.poisson(self.options['reactions_per_alert'])))
+            reactions = [(user, 'like' if rng.random() < 0.8 else 'dislike') for user in reactors]
+            comments = [rng.choice(users) for _ in range(self.poisson(self.options['comments_per_alert']))]
+            alert.likes_count = sum(1 for _, reaction_type in reactions if reaction_type == 'like')
+            alert.dislikes_count = len(reactions) - alert.likes_count
+            alert.comments_count = len(comments)
+            plans.append((reactions, comments))
+
+        Alert.objects.bulk_create(alerts)
+        reactions, comments = [], []
+        for alert, (alert_reactions, alert_comments) in zip(alerts, plans):
+            reactions.extend(
+                AlertReaction(user=user, alert=alert, reaction_type=reaction_type)
+                for user, reaction_type in alert_reactions
+            )
+            comments.extend(
+                AlertComment(user=user, alert=alert, text=rng.choice(COMMENT_TEXTS))
+                for user in alert_comments
+            )
+        AlertReaction.objects.bulk_create(reactions)
+        AlertComment.objects.bulk_create(comments)
+        return {'alerts': len(alerts), 'reactions': len(reactions), 'comments': len(comments)}
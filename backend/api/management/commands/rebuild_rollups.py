@@ -0,0 +1,27 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from api.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = (
+        'Recalcula los agregados por categoría, celda, hora y estado (AlertRollup) '
+        'a partir de las alertas: carga inicial y reparación de desvíos'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help='Solo las horas de los últimos N días (por defecto, todas)')
+
+    def handle(self, *args, **options):
+        since = None
+        if options['days'] is not None:
+            if options['days'] <= 0:
+                raise CommandError('--days debe ser positivo')
+            since = timezone.now() - timedelta(days=options['days'])
+        start = time.perf_counter()
+        rows = rebuild_rollups(since)
+        self.stdout.write(self.style.SUCCESS(f'{rows} agregados recalculados en {time.perf_counter() - start:.1f}s'))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from api.models import UserProfile
+
+
+class Command(BaseCommand):
+    help = 'Recalcula desde cero las estadísticas y reputación de los perfiles (reparación de desvíos)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'usernames', nargs='*',
+            help='Usuarios a recalcular; por defecto todos'
+        )
+
+    def handle(self, *args, **options):
+        queryset = UserProfile.objects.all()
+        if options['usernames']:
+            queryset = queryset.filter(user__username__in=options['usernames'])
+
+        updated = UserProfile.recompute_statistics(queryset)
+        self.stdout.write(self.style.SUCCESS(f'{updated} perfiles recalculados'))
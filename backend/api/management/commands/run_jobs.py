@@ -0,0 +1,55 @@
+import os
+import socket
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.jobs import purge_finished_jobs, run_pending_jobs, work
+
+# Seconds between purges of old finished jobs
+PURGE_INTERVAL = 3600
+
+
+class Command(BaseCommand):
+    help = (
+        'Ejecuta los trabajos en segundo plano (miniaturas, notificaciones) con '
+        'un grupo de hilos; varios procesos pueden correr a la vez'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2, help='Hilos de trabajo')
+        parser.add_argument('--interval', type=float, default=1.0, help='Segundos de espera sin trabajos')
+        parser.add_argument('--once', action='store_true', help='Ejecutar los trabajos pendientes y salir')
+
+    def handle(self, *args, **options):
+        worker_prefix = f'{socket.gethostname()}-{os.getpid()}'
+        if options['once']:
+            ran = run_pending_jobs(worker_id=worker_prefix)
+            purge_finished_jobs()
+            self.stdout.write(f'{ran} trabajos ejecutados')
+            return
+
+        stop = threading.Event()
+        threads = [
+            threading.Thread(
+                target=work, args=(f'{worker_prefix}-{number}', stop, options['interval']),
+                name=f'job-worker-{number}', daemon=True,
+            )
+            for number in range(options['workers'])
+        ]
+        for thread in threads:
+            thread.start()
+        self.stdout.write(f"{options['workers']} hilos de trabajo en marcha ({worker_prefix})")
+        try:
+            while True:
+                purged = purge_finished_jobs()
+                if purged:
+                    self.stdout.write(f'{purged} trabajos terminados eliminados')
+                time.sleep(PURGE_INTERVAL)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
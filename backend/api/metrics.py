@@ -0,0 +1,183 @@
+import heapq
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger('api.performance')
+
+# Upper bounds (seconds) of the request duration histogram buckets
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Requests per endpoint kept for the rolling quantiles
+ROLLING_WINDOW = 1000
+QUANTILES = (0.5, 0.95, 0.99)
+# Slowest statements kept per request for the slow-request log
+SLOWEST_QUERIES = 3
+
+current_timings = ContextVar('current_timings', default=None)
+
+
+class RequestTimings:
+    """What one request spent in the database and in serializers"""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.serializer_seconds = 0.0
+        self.slowest = []
+
+    def record_query(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            self.queries += 1
+            self.db_seconds += duration
+            entry = (duration, self.queries, sql)
+            if len(self.slowest) < SLOWEST_QUERIES:
+                heapq.heappush(self.slowest, entry)
+            else:
+                heapq.heappushpop(self.slowest, entry)
+
+
+def record_serializer_time(seconds):
+    timings = current_timings.get()
+    if timings is not None:
+        timings.serializer_seconds += seconds
+
+
+class EndpointStats:
+    def __init__(self):
+        self.count = 0
+        self.duration_sum = 0.0
+        self.buckets = [0] * len(DURATION_BUCKETS)
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.serializer_seconds = 0.0
+        self.recent = deque(maxlen=ROLLING_WINDOW)
+
+
+class MetricsRegistry:
+    """Per-endpoint request histograms and counters, rendered for Prometheus"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = defaultdict(EndpointStats)
+
+    def observe(self, endpoint, method, status_code, seconds, timings):
+        with self._lock:
+            stats = self._stats[(endpoint, method, str(status_code))]
+            stats.count += 1
+            stats.duration_sum += seconds
+            for index, bound in enumerate(DURATION_BUCKETS):
+                if seconds <= bound:
+                    stats.buckets[index] += 1
+            stats.queries += timings.queries
+            stats.db_seconds += timings.db_seconds
+            stats.serializer_seconds += timings.serializer_seconds
+            stats.recent.append(seconds)
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4)"""
+        with self._lock:
+            snapshot = sorted(self._stats.items())
+            snapshot = [(key, stats, sorted(stats.recent)) for key, stats in snapshot]
+
+        lines = [
+            '# HELP weyalert_request_duration_seconds Request duration.',
+            '# TYPE weyalert_request_duration_seconds histogram',
+        ]
+        for (endpoint, method, status_code), stats, _ in snapshot:
+            labels = f'endpoint="{endpoint}",method="{method}",status="{status_code}"'
+            for bound, count in zip(DURATION_BUCKETS, stats.buckets):
+                lines.append(f'weyalert_request_duration_seconds_bucket{{{labels},le="{bound}"}} {count}')
+            lines.append(f'weyalert_request_duration_seconds_bucket{{{labels},le="+Inf"}} {stats.count}')
+            lines.append(f'weyalert_request_duration_seconds_sum{{{labels}}} {stats.duration_sum:.6f}')
+            lines.append(f'weyalert_request_duration_seconds_count{{{labels}}} {stats.count}')
+
+        lines += [
+            f'# HELP weyalert_request_duration_recent_seconds Request duration over the last {ROLLING_WINDOW} requests.',
+            '# TYPE weyalert_request_duration_recent_seconds summary',
+        ]
+        for (endpoint, method, status_code), _, recent in snapshot:
+            labels = f'endpoint="{endpoint}",method="{method}",status="{status_code}"'
+            for quantile in QUANTILES:
+                value = recent[min(len(recent) - 1, int(quantile * len(recent)))]
+                lines.append(f'weyalert_request_duration_recent_seconds{{{labels},quantile="{quantile}"}} {value:.6f}')
+            lines.append(f'weyalert_request_duration_recent_seconds_sum{{{labels}}} {sum(recent):.6f}')
+            lines.append(f'weyalert_request_duration_recent_seconds_count{{{labels}}} {len(recent)}')
+
+        counters = [
+            ('weyalert_db_queries_total', 'SQL queries executed.', 'queries', '{}'),
+            ('weyalert_db_seconds_total', 'Time spent in SQL queries.', 'db_seconds', '{:.6f}'),
+            ('weyalert_serializer_seconds_total', 'Time spent serializing.', 'serializer_seconds', '{:.6f}'),
+        ]
+        for name, description, attribute, value_format in counters:
+            lines += [f'# HELP {name} {description}', f'# TYPE {name} counter']
+            for (endpoint, method, status_code), stats, _ in snapshot:
+                labels = f'endpoint="{endpoint}",method="{method}",status="{status_code}"'
+                lines.append(f'{name}{{{labels}}} {value_format.format(getattr(stats, attribute))}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+class PerformanceMiddleware:
+    """
+    Opt-in (PERFORMANCE_METRICS) per-request instrumentation: query count,
+    DB, serializer and total time. Adds a Server-Timing header, logs
+    requests slower than PERFORMANCE_SLOW_REQUEST_MS with their slowest SQL
+    and feeds the per-endpoint metrics served by the `metrics` view.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PERFORMANCE_METRICS', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.slow_request_seconds = getattr(settings, 'PERFORMANCE_SLOW_REQUEST_MS', 500) / 1000
+
+    def __call__(self, request):
+        timings = RequestTimings()
+        token = current_timings.set(timings)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(timings.record_query))
+                response = self.get_response(request)
+        finally:
+            current_timings.reset(token)
+        total = time.perf_counter() - started
+
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={timings.db_seconds * 1000:.1f};desc="{timings.queries} queries"',
+            f'serializer;dur={timings.serializer_seconds * 1000:.1f}',
+            f'total;dur={total * 1000:.1f}',
+        ])
+
+        match = getattr(request, 'resolver_match', None)
+        endpoint = match.view_name if match else 'unmatched'
+        registry.observe(endpoint, request.method, response.status_code, total, timings)
+
+        if total >= self.slow_request_seconds:
+            slowest = '\n'.join(
+                f'  {duration * 1000:.1f}ms {sql}' for duration, _, sql in sorted(timings.slowest, reverse=True)
+            )
+            logger.warning(
+                'Slow request %s %s: %.1fms, %d queries (%.1fms DB), %.1fms serializing\n%s',
+                request.method, request.get_full_path(), total * 1000, timings.queries,
+                timings.db_seconds * 1000, timings.serializer_seconds * 1000, slowest,
+            )
+        return response
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.7 on 2026-10-16 23:45
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_alert_closed_at_alertcomment'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='alert',
+            index=models.Index(fields=['status', 'latitude', 'longitude'], name='alert_status_lat_lng_idx'),
+        ),
+    ]
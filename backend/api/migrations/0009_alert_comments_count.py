@@ -0,0 +1,36 @@
+# Generated by Django 5.2.7 on 2026-10-17 00:00
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_comments_count(apps, schema_editor):
+    Alert = apps.get_model('api', 'Alert')
+    AlertComment = apps.get_model('api', 'AlertComment')
+    totals = AlertComment.objects.filter(alert=OuterRef('pk')).order_by().values('alert').annotate(
+        total=Count('id')
+    ).values('total')
+    Alert.objects.update(comments_count=Coalesce(Subquery(totals), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_image_variants'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='alert',
+            name='comments_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='alertcomment',
+            index=models.Index(fields=['alert', '-created_at'], name='comment_alert_created_idx'),
+        ),
+        migrations.RunPython(backfill_comments_count, migrations.RunPython.noop),
+    ]
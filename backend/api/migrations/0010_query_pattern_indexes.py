@@ -0,0 +1,43 @@
+# Generated by Django 5.2.7 on 2026-10-17 00:05
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_alert_comments_count'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='alertcomment',
+            name='comment_alert_created_idx',
+        ),
+        migrations.AddIndex(
+            model_name='alert',
+            index=models.Index(fields=['-created_at', '-id'], name='alert_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='alert',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='alert_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='alert',
+            index=models.Index(fields=['user', 'status'], name='alert_user_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='alert',
+            index=models.Index(fields=['status', 'category', 'created_at'], name='alert_status_cat_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='alert',
+            index=models.Index(fields=['category', 'status'], name='alert_category_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='alertcomment',
+            index=models.Index(fields=['alert', '-created_at', '-id'], name='comment_alert_created_idx'),
+        ),
+    ]
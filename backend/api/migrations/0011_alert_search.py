@@ -0,0 +1,91 @@
+# Generated by Django 5.2.7 on 2026-10-17 00:21
+
+import api.models
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Comment texts of one alert, as stored in the `comments` column
+ALERT_COMMENTS = "coalesce((SELECT group_concat(text, ' ') FROM api_alertcomment WHERE alert_id = {}), '')"
+
+CREATE_SEARCH_INDEX = [
+    # remove_diacritics lets "trafico" find "tráfico"
+    "CREATE VIRTUAL TABLE api_alert_search USING fts5("
+    "title, description, comments, tokenize = 'unicode61 remove_diacritics 2')",
+    # Title matches weigh the most, comment matches the least
+    "INSERT INTO api_alert_search (api_alert_search, rank) VALUES ('rank', 'bm25(10.0, 4.0, 1.0)')",
+    "INSERT INTO api_alert_search (rowid, title, description, comments) "
+    f"SELECT id, title, description, {ALERT_COMMENTS.format('api_alert.id')} FROM api_alert",
+    "CREATE TRIGGER api_alert_search_insert AFTER INSERT ON api_alert BEGIN "
+    "INSERT INTO api_alert_search (rowid, title, description, comments) "
+    "VALUES (new.id, new.title, new.description, ''); END",
+    "CREATE TRIGGER api_alert_search_update AFTER UPDATE OF title, description ON api_alert BEGIN "
+    "UPDATE api_alert_search SET title = new.title, description = new.description WHERE rowid = new.id; END",
+    "CREATE TRIGGER api_alert_search_delete AFTER DELETE ON api_alert BEGIN "
+    "DELETE FROM api_alert_search WHERE rowid = old.id; END",
+    "CREATE TRIGGER api_alert_search_comment_insert AFTER INSERT ON api_alertcomment BEGIN "
+    f"UPDATE api_alert_search SET comments = {ALERT_COMMENTS.format('new.alert_id')} WHERE rowid = new.alert_id; END",
+    "CREATE TRIGGER api_alert_search_comment_update AFTER UPDATE OF text ON api_alertcomment BEGIN "
+    f"UPDATE api_alert_search SET comments = {ALERT_COMMENTS.format('new.alert_id')} WHERE rowid = new.alert_id; END",
+    "CREATE TRIGGER api_alert_search_comment_delete AFTER DELETE ON api_alertcomment BEGIN "
+    f"UPDATE api_alert_search SET comments = {ALERT_COMMENTS.format('old.alert_id')} WHERE rowid = old.alert_id; END",
+]
+
+DROP_SEARCH_INDEX = [
+    'DROP TRIGGER IF EXISTS api_alert_search_insert',
+    'DROP TRIGGER IF EXISTS api_alert_search_update',
+    'DROP TRIGGER IF EXISTS api_alert_search_delete',
+    'DROP TRIGGER IF EXISTS api_alert_search_comment_insert',
+    'DROP TRIGGER IF EXISTS api_alert_search_comment_update',
+    'DROP TRIGGER IF EXISTS api_alert_search_comment_delete',
+    'DROP TABLE IF EXISTS api_alert_search',
+]
+
+
+def has_fts5(connection):
+    if connection.vendor != 'sqlite':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA compile_options')
+        return 'ENABLE_FTS5' in {row[0] for row in cursor.fetchall()}
+
+
+def create_search_index(apps, schema_editor):
+    # Other backends (or SQLite builds without FTS5) use the icontains
+    # fallback in api/search.py
+    if not has_fts5(schema_editor.connection):
+        return
+    for statement in CREATE_SEARCH_INDEX:
+        schema_editor.execute(statement)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for statement in DROP_SEARCH_INDEX:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_query_pattern_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AlertSearchEntry',
+            fields=[
+                ('alert', models.OneToOneField(db_column='rowid', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_entry', serialize=False, to='api.alert')),
+                ('title', models.TextField()),
+                ('description', models.TextField()),
+                ('comments', models.TextField()),
+                ('document', api.models.SearchDocumentField(db_column='api_alert_search')),
+                ('rank', models.FloatField()),
+            ],
+            options={
+                'db_table': 'api_alert_search',
+                'managed': False,
+            },
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
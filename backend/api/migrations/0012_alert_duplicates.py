@@ -0,0 +1,45 @@
+# Generated by Django 5.2.7 on 2026-10-17 00:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Adding a NOT NULL column rebuilds api_alert on SQLite, which drops the
+# triggers 0011 put on it for the search index
+ALERT_SEARCH_TRIGGERS = [
+    "CREATE TRIGGER IF NOT EXISTS api_alert_search_insert AFTER INSERT ON api_alert BEGIN "
+    "INSERT INTO api_alert_search (rowid, title, description, comments) "
+    "VALUES (new.id, new.title, new.description, ''); END",
+    "CREATE TRIGGER IF NOT EXISTS api_alert_search_update AFTER UPDATE OF title, description ON api_alert BEGIN "
+    "UPDATE api_alert_search SET title = new.title, description = new.description WHERE rowid = new.id; END",
+    "CREATE TRIGGER IF NOT EXISTS api_alert_search_delete AFTER DELETE ON api_alert BEGIN "
+    "DELETE FROM api_alert_search WHERE rowid = old.id; END",
+]
+
+
+def restore_search_triggers(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite' or 'api_alert_search' not in connection.introspection.table_names():
+        return
+    for statement in ALERT_SEARCH_TRIGGERS:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_alert_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='alert',
+            name='confirmations_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='alert',
+            name='duplicate_of',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='duplicates', to='api.alert'),
+        ),
+        migrations.RunPython(restore_search_triggers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.7 on 2026-10-17 00:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_jobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AlertRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField()),
+                ('category', models.CharField(max_length=50)),
+                ('cell_row', models.IntegerField()),
+                ('cell_col', models.IntegerField()),
+                ('status', models.CharField(choices=[('active', 'Activa'), ('resolved', 'Resuelta'), ('expired', 'Expirada')], max_length=20)),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('hour', 'category', 'cell_row', 'cell_col', 'status'), name='alert_rollup_key')],
+            },
+        ),
+    ]
@@ -1,8 +1,18 @@
+from datetime import timedelta
 from django.db import models
+from django.db.models import Case, Expression, Count, Exists, F, Lookup, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+from .authentication import invalidate_token, invalidate_user_tokens
+from .cache import invalidate_alert_responses
 from .categories import get_category_choices, get_category
+from .duplicates import forget_alert, track_alert
+from .geo import bounding_box, haversine_km
+from .subscriptions import forget_subscription, track_subscription
 
 class Alert(models.Model):
     STATUS_CHOICES = [
@@ -18,26 +28,149 @@ class Alert(models.Model):
     latitude = models.FloatField()
     longitude = models.FloatField()
     image = models.ImageField(upload_to='alerts/', blank=True, null=True)
+    # Thumbnails generated by api.images: {width: {'webp': name, 'jpeg': name}}
+    image_variants = models.JSONField(default=dict, blank=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='active')
     likes_count = models.IntegerField(default=0)
     dislikes_count = models.IntegerField(default=0)
+    # Kept current by the AlertComment signals below
+    comments_count = models.IntegerField(default=0)
+    # Later reports of the same incident merged into this alert ('merge' mode,
+    # see api/duplicates.py); in 'link' mode they point here with duplicate_of
+    confirmations_count = models.IntegerField(default=0)
+    duplicate_of = models.ForeignKey(
+        'self', on_delete=models.SET_NULL, blank=True, null=True, related_name='duplicates'
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     closed_at = models.DateTimeField(blank=True, null=True)
     
+    # What the map cluster tiles are built from (see api/clusters.py)
+    TILE_FIELDS = ('latitude', 'longitude', 'category', 'status')
+    
+    class Meta:
+        indexes = [
+            # Bounding-box prefilter for proximity queries on active alerts
+            models.Index(fields=['status', 'latitude', 'longitude'], name='alert_status_lat_lng_idx'),
+            # Incremental sync: alerts changed since a watermark
+            models.Index(fields=['updated_at'], name='alert_updated_at_idx'),
+            # Cursor pagination of the alert list
+            models.Index(fields=['-created_at', '-id'], name='alert_created_id_idx'),
+            # my_alerts, newest first
+            models.Index(fields=['user', '-created_at', '-id'], name='alert_user_created_idx'),
+            # Per-user statistics (UserProfile.recompute_statistics)
+            models.Index(fields=['user', 'status'], name='alert_user_status_idx'),
+            # Expiry sweep and category-filtered map queries over active alerts
+            models.Index(fields=['status', 'category', 'created_at'], name='alert_status_cat_created_idx'),
+            # Admin category filter
+            models.Index(fields=['category', 'status'], name='alert_category_status_idx'),
+        ]
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.remember_tile_values()
+        return instance
+    
+    def tile_values(self):
+        # Deferred fields stay unread instead of costing a query each
+        return tuple(self.__dict__.get(field) for field in self.TILE_FIELDS)
+    
+    def remember_tile_values(self):
+        self._saved_tile_values = self.tile_values()
+    
+    def moved_on_map(self, update_fields=None):
+        """Whether the last save changed any TILE_FIELDS (see the post_save signal)"""
+        if update_fields is not None and not set(update_fields) & set(self.TILE_FIELDS):
+            return False
+        return getattr(self, '_saved_tile_values', None) != self.tile_values()
+    
     def get_category_detail(self):
         """Returns the full category data from the dictionary"""
         return get_category(self.category)
     
+    @classmethod
+    def apply_reaction_delta(cls, alert_id, likes=0, dislikes=0):
+        """
+        Atomically shifts the cached like/dislike counts. Deltas may be ints
+        or SQL expressions (see AlertReaction.delta_expression).
+        """
+        cls.objects.filter(pk=alert_id).update(
+            likes_count=F('likes_count') + likes,
+            dislikes_count=F('dislikes_count') + dislikes,
+            updated_at=timezone.now(),
+        )
+        invalidate_alert_responses()
+    
+    @classmethod
+    def apply_comment_delta(cls, alert_id, delta):
+        """Atomically shifts the cached comment count"""
+        cls.objects.filter(pk=alert_id).update(
+            comments_count=F('comments_count') + delta,
+            updated_at=timezone.now(),
+        )
+        invalidate_alert_responses()
+    
+    @classmethod
+    def confirm(cls, alert_id, queryset=None):
+        """
+        Atomically counts one more confirmation, only if the alert is still
+        in `queryset` (all alerts by default). Returns whether it was.
+        """
+        queryset = cls.objects.all() if queryset is None else queryset
+        updated = queryset.filter(pk=alert_id).update(
+            confirmations_count=F('confirmations_count') + 1,
+            updated_at=timezone.now(),
+        )
+        if updated:
+            invalidate_alert_responses()
+        return bool(updated)
+    
     def update_reaction_counts(self):
-        """Update the cached like/dislike counts"""
+        """Recount the cached like/dislike counts from the reactions table"""
         self.likes_count = self.reactions.filter(reaction_type='like').count()
         self.dislikes_count = self.reactions.filter(reaction_type='dislike').count()
-        self.save(update_fields=['likes_count', 'dislikes_count'])
+        self.save(update_fields=['likes_count', 'dislikes_count', 'updated_at'])
     
     def __str__(self):
         return self.title
 
+class AlertTombstone(models.Model):
+    """Records deleted alerts so incremental sync clients can drop them"""
+    # How long deletions are remembered; older watermarks need a full resync
+    RETENTION = timedelta(days=7)
+    
+    alert_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(default=timezone.now, db_index=True)
+    
+    def __str__(self):
+        return f"Alerta {self.alert_id} eliminada"
+
+class AlertRollup(models.Model):
+    """
+    Number of alerts created in one hour, of one category, in one grid
+    cell, currently in one status. Maintained incrementally by api/rollups.py
+    so analytics read these rows instead of the alerts table.
+    """
+    hour = models.DateTimeField()
+    category = models.CharField(max_length=50)
+    # Cell indexes: floor(latitude / ROLLUP_CELL_DEGREES) and likewise for longitude
+    cell_row = models.IntegerField()
+    cell_col = models.IntegerField()
+    status = models.CharField(max_length=20, choices=Alert.STATUS_CHOICES)
+    count = models.IntegerField(default=0)
+    
+    class Meta:
+        constraints = [
+            # Hour first: every analytics query is a range of hours
+            models.UniqueConstraint(
+                fields=['hour', 'category', 'cell_row', 'cell_col', 'status'], name='alert_rollup_key'
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.category} ({self.cell_row}, {self.cell_col}) {self.hour:%Y-%m-%d %H}h {self.status}: {self.count}"
+
 class AlertReaction(models.Model):
     """Model to track user reactions (likes/dislikes) on alerts"""
     REACTION_CHOICES = [
@@ -53,6 +186,20 @@ class AlertReaction(models.Model):
     class Meta:
         unique_together = ('user', 'alert')  # One reaction per user per alert
     
+    @classmethod
+    def delta_expression(cls, user, alert, reaction_type, new_reaction):
+        """
+        SQL expression for how the `reaction_type` count changes when the
+        user's reaction on the alert becomes `new_reaction` (None = removed).
+        It reads the old reaction inside the UPDATE itself, so callers can
+        apply counter deltas before touching the reaction row.
+        """
+        had_reaction = Case(
+            When(Exists(cls.objects.filter(user=user, alert=alert, reaction_type=reaction_type)), then=Value(1)),
+            default=Value(0),
+        )
+        return Value(int(new_reaction == reaction_type)) - had_reaction
+    
     def __str__(self):
         return f"{self.user.username} - {self.reaction_type} - {self.alert.title}"
 
@@ -66,14 +213,160 @@ class AlertComment(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Comment pages of one alert, newest first
+            models.Index(fields=['alert', '-created_at', '-id'], name='comment_alert_created_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user.username} on {self.alert.title}: {self.text[:50]}..."
 
+class SearchDocumentField(models.TextField):
+    """FTS5's hidden column named after its table; only takes __match lookups"""
+
+
+@SearchDocumentField.register_lookup
+class Match(Lookup):
+    lookup_name = 'match'
+    
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', [*lhs_params, *rhs_params]
+
+class AlertSearchEntry(models.Model):
+    """
+    Row of the SQLite FTS5 index over an alert's title, description and
+    comment texts (see migration 0011). Maintained by database triggers and
+    only present on SQLite; query it through api/search.py.
+    """
+    alert = models.OneToOneField(
+        Alert, on_delete=models.DO_NOTHING, primary_key=True, db_column='rowid',
+        db_constraint=False, related_name='search_entry'
+    )
+    title = models.TextField()
+    description = models.TextField()
+    comments = models.TextField()
+    document = SearchDocumentField(db_column='api_alert_search')
+    # bm25 with the column weights set in the migration; lower is better
+    rank = models.FloatField()
+    
+    class Meta:
+        managed = False
+        db_table = 'api_alert_search'
+
+class Subscription(models.Model):
+    """
+    An area a user wants to hear about: a circle (latitude, longitude,
+    radius_meters) or a bounding box (south, west, north, east), optionally
+    limited to some categories. Matched against new alerts by
+    api/subscriptions.py.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='subscriptions')
+    name = models.CharField(max_length=100, blank=True)
+    latitude = models.FloatField(blank=True, null=True)
+    longitude = models.FloatField(blank=True, null=True)
+    radius_meters = models.PositiveIntegerField(blank=True, null=True)
+    south = models.FloatField(blank=True, null=True)
+    west = models.FloatField(blank=True, null=True)
+    north = models.FloatField(blank=True, null=True)
+    east = models.FloatField(blank=True, null=True)
+    # Category keys; empty means every category
+    categories = models.JSONField(default=list, blank=True)
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            # The subscription index loads the ones changed since its last sync
+            models.Index(fields=['updated_at'], name='subscription_updated_at_idx'),
+        ]
+    
+    @property
+    def is_circle(self):
+        return self.radius_meters is not None
+    
+    def bounds(self):
+        """(min_lat, max_lat, min_lng, max_lng) enclosing the area"""
+        if self.is_circle:
+            return bounding_box(self.latitude, self.longitude, self.radius_meters / 1000)
+        return self.south, self.north, self.west, self.east
+    
+    def matches(self, category, latitude, longitude):
+        """Whether an alert of `category` at the given point concerns this subscription"""
+        if self.categories and category not in self.categories:
+            return False
+        if self.is_circle:
+            return haversine_km(self.latitude, self.longitude, latitude, longitude) * 1000 <= self.radius_meters
+        return self.south <= latitude <= self.north and self.west <= longitude <= self.east
+    
+    def __str__(self):
+        return self.name or f"Suscripción {self.pk} de {self.user.username}"
+
+class Notification(models.Model):
+    """An alert delivered to a user because it matched one of their subscriptions"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notifications')
+    alert = models.ForeignKey(Alert, on_delete=models.CASCADE, related_name='notifications')
+    subscription = models.ForeignKey(
+        Subscription, on_delete=models.SET_NULL, blank=True, null=True, related_name='notifications'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    read_at = models.DateTimeField(blank=True, null=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        # One notification per user and alert, however many subscriptions match
+        unique_together = ('user', 'alert')
+        indexes = [
+            # A user's notifications, newest first
+            models.Index(fields=['user', '-created_at', '-id'], name='notification_user_created_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.user.username}: {self.alert.title}"
+
+class Job(models.Model):
+    """
+    A queued background task (see api/jobs.py): `name` is a key of
+    JOB_TASKS, called with `payload` as keyword arguments by a run_jobs worker.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pendiente'),
+        ('running', 'En ejecución'),
+        ('done', 'Terminado'),
+        ('failed', 'Fallido'),
+    ]
+    
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    # Idempotency key: a second job with the same key is not queued
+    key = models.CharField(max_length=255, unique=True, blank=True, null=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(blank=True, null=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+    
+    class Meta:
+        indexes = [
+            # Workers claim the oldest due job of a status
+            models.Index(fields=['status', 'run_after', 'id'], name='job_status_run_after_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.name} ({self.get_status_display()})"
+
 class UserProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
     phone = models.CharField(max_length=20, blank=True, null=True)
     avatar = models.ImageField(upload_to='avatars/', blank=True, null=True)
+    avatar_variants = models.JSONField(default=dict, blank=True)
     alerts_reported = models.IntegerField(default=0)
     alerts_resolved = models.IntegerField(default=0)
     reputation_points = models.IntegerField(default=0)
@@ -82,30 +375,75 @@ class UserProfile(models.Model):
     def __str__(self):
         return f"Perfil de {self.user.username}"
     
-    def update_statistics(self):
-        """Actualiza las estadísticas del usuario"""
-        # Contar alertas reportadas
-        self.alerts_reported = Alert.objects.filter(user=self.user).count()
-        
-        # Contar alertas resueltas
-        self.alerts_resolved = Alert.objects.filter(
-            user=self.user, 
-            status='resolved'
-        ).count()
+    # Puntos de reputación por evento
+    POINTS_PER_REPORT = 10
+    POINTS_PER_RESOLVED = 20
+    POINTS_PER_LIKE = 5
+    POINTS_PER_DISLIKE = -3
+    
+    @classmethod
+    def reputation_for(cls, reported=0, resolved=0, likes=0, dislikes=0):
+        return (
+            reported * cls.POINTS_PER_REPORT +
+            resolved * cls.POINTS_PER_RESOLVED +
+            likes * cls.POINTS_PER_LIKE +
+            dislikes * cls.POINTS_PER_DISLIKE
+        )
+    
+    @classmethod
+    def apply_statistics_delta(cls, user_id, reported=0, resolved=0, likes=0, dislikes=0):
+        """
+        Applies the effect of a single event (alert reported, resolved,
+        liked...) to the author's statistics with one atomic UPDATE.
+        Like/dislike deltas may also be SQL expressions.
+        """
+        updates = {}
+        if reported:
+            updates['alerts_reported'] = F('alerts_reported') + reported
+        if resolved:
+            updates['alerts_resolved'] = F('alerts_resolved') + resolved
+        reputation = cls.reputation_for(reported, resolved, likes, dislikes)
+        if isinstance(reputation, Expression) or reputation:
+            updates['reputation_points'] = F('reputation_points') + reputation
+        if updates:
+            cls.objects.filter(user_id=user_id).update(**updates)
+            # Reputation is embedded in every alert's user object
+            invalidate_alert_responses()
+    
+    @classmethod
+    def recompute_statistics(cls, queryset=None):
+        """
+        Full recompute from the alerts table for every profile in `queryset`
+        (all by default) in a single set-based UPDATE. Used to repair drift
+        from the incremental deltas; returns the number of profiles updated.
+        """
+        if queryset is None:
+            queryset = cls.objects.all()
         
-        # Calcular puntos de reputación basado en likes/dislikes
-        user_alerts = Alert.objects.filter(user=self.user)
-        total_likes = sum(alert.likes_count for alert in user_alerts)
-        total_dislikes = sum(alert.dislikes_count for alert in user_alerts)
+        alerts = Alert.objects.filter(user=OuterRef('user')).order_by().values('user')
+        reported = Coalesce(Subquery(alerts.annotate(total=Count('id')).values('total')), 0)
+        resolved = Coalesce(Subquery(
+            alerts.filter(status='resolved').annotate(total=Count('id')).values('total')
+        ), 0)
+        likes = Coalesce(Subquery(alerts.annotate(total=Sum('likes_count')).values('total')), 0)
+        dislikes = Coalesce(Subquery(alerts.annotate(total=Sum('dislikes_count')).values('total')), 0)
         
-        self.reputation_points = (
-            self.alerts_reported * 10 + 
-            self.alerts_resolved * 20 +
-            total_likes * 5 -  # +5 points per like
-            total_dislikes * 3  # -3 points per dislike
+        invalidate_alert_responses()
+        return queryset.update(
+            alerts_reported=reported,
+            alerts_resolved=resolved,
+            reputation_points=(
+                reported * cls.POINTS_PER_REPORT +
+                resolved * cls.POINTS_PER_RESOLVED +
+                likes * cls.POINTS_PER_LIKE +
+                dislikes * cls.POINTS_PER_DISLIKE
+            ),
         )
-        
-        self.save()
+    
+    def update_statistics(self):
+        """Actualiza las estadísticas del usuario (recálculo completo)"""
+        UserProfile.recompute_statistics(UserProfile.objects.filter(pk=self.pk))
+        self.refresh_from_db(fields=['alerts_reported', 'alerts_resolved', 'reputation_points'])
 
 # Señal para crear el perfil automáticamente cuando se crea un usuario
 @receiver(post_save, sender=User)
@@ -116,4 +454,74 @@ def create_user_profile(sender, instance, created, **kwargs):
 @receiver(post_save, sender=User)
 def save_user_profile(sender, instance, **kwargs):
     if hasattr(instance, 'profile'):
-        instance.profile.save()
\ No newline at end of file
+        instance.profile.save()
+
+# Señales para olvidar los tokens cacheados (ver api/authentication.py)
+@receiver(post_save, sender=User)
+def invalidate_user_token_cache(sender, instance, created, **kwargs):
+    if not created:
+        invalidate_user_tokens(instance.pk)
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    invalidate_token(instance.key)
+
+# Señal para registrar las alertas eliminadas para la sincronización incremental
+@receiver(post_delete, sender=Alert)
+def record_alert_tombstone(sender, instance, **kwargs):
+    now = timezone.now()
+    AlertTombstone.objects.create(alert_id=instance.pk, deleted_at=now)
+    AlertTombstone.objects.filter(deleted_at__lt=now - AlertTombstone.RETENTION).delete()
+
+
+# Señales para mantener el índice de alertas duplicadas (ver api/duplicates.py)
+@receiver(post_save, sender=Alert)
+def track_duplicate_candidate(sender, instance, **kwargs):
+    track_alert(instance)
+
+@receiver(post_delete, sender=Alert)
+def forget_duplicate_candidate(sender, instance, **kwargs):
+    forget_alert(instance.pk)
+
+
+# Señales para mantener el índice de suscripciones (ver api/subscriptions.py)
+@receiver(post_save, sender=Subscription)
+def track_subscription_area(sender, instance, **kwargs):
+    track_subscription(instance)
+
+@receiver(post_delete, sender=Subscription)
+def forget_subscription_area(sender, instance, **kwargs):
+    forget_subscription(instance.pk)
+
+
+# Señales para mantener el contador de comentarios de la alerta
+@receiver(post_save, sender=AlertComment)
+def count_alert_comment(sender, instance, created, **kwargs):
+    if created:
+        Alert.apply_comment_delta(instance.alert_id, 1)
+
+
+@receiver(post_delete, sender=AlertComment)
+def uncount_alert_comment(sender, instance, **kwargs):
+    Alert.apply_comment_delta(instance.alert_id, -1)
+
+
+# Señales para invalidar las respuestas cacheadas cuando cambian las alertas;
+# los tiles del mapa solo cuando una alerta aparece, desaparece o se mueve
+@receiver(post_save, sender=Alert)
+def invalidate_cached_alert(sender, instance, created, update_fields=None, **kwargs):
+    invalidate_alert_responses(locations=created or instance.moved_on_map(update_fields))
+    instance.remember_tile_values()
+
+
+@receiver(post_delete, sender=Alert)
+def invalidate_deleted_alert(sender, **kwargs):
+    invalidate_alert_responses(locations=True)
+
+
+@receiver(post_save, sender=AlertReaction)
+@receiver(post_delete, sender=AlertReaction)
+@receiver(post_save, sender=AlertComment)
+@receiver(post_delete, sender=AlertComment)
+def invalidate_cached_alerts(sender, **kwargs):
+    invalidate_alert_responses()
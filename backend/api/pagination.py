@@ -0,0 +1,25 @@
+from rest_framework.pagination import CursorPagination
+
+
+class AlertCursorPagination(CursorPagination):
+    """Keyset pagination over (created_at, id), newest alerts first"""
+    ordering = ('-created_at', '-id')
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+
+class CommentCursorPagination(CursorPagination):
+    """Keyset pagination over (created_at, id), newest comments first"""
+    ordering = ('-created_at', '-id')
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class NotificationCursorPagination(CursorPagination):
+    """Keyset pagination over (created_at, id), newest notifications first"""
+    ordering = ('-created_at', '-id')
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
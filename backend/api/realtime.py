@@ -0,0 +1,178 @@
+"""
+Live alert events pushed to map clients over WebSockets.
+
+Views publish events through the broker configured in
+``settings.ALERT_EVENTS_BROKER``; the ASGI app below subscribes one queue per
+connected client and forwards only the events matching the client's viewport
+and category filter. Publishing never touches the database, so idle clients
+cost nothing until something actually changes.
+"""
+import asyncio
+import json
+import threading
+from functools import lru_cache
+from urllib.parse import parse_qs
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+from .categories import parse_categories
+from .geo import parse_bbox
+
+# Events buffered per client before new ones are dropped for that client
+SUBSCRIBER_QUEUE_SIZE = 100
+
+
+class Subscription:
+    """A connected client: its event queue and viewport/category filter"""
+
+    def __init__(self, loop, bbox=None, categories=None):
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.bbox = bbox
+        self.categories = categories
+
+    def matches(self, event):
+        if self.categories is not None and event['category'] not in self.categories:
+            return False
+        if self.bbox is not None:
+            south, west, north, east = self.bbox
+            lat, lng = event['latitude'], event['longitude']
+            if not south <= lat <= north:
+                return False
+            # west > east means the viewport crosses the antimeridian
+            if west <= east and not west <= lng <= east:
+                return False
+            if west > east and east < lng < west:
+                return False
+        return True
+
+    def deliver(self, event):
+        """Runs on the subscriber's event loop"""
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Slow client: drop the event, it will catch up via /changes/
+            pass
+
+
+class InProcessBroker:
+    """Fans events out to the subscribers connected to this process"""
+
+    def __init__(self):
+        self._subscriptions = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self, bbox=None, categories=None, loop=None):
+        subscription = Subscription(loop or asyncio.get_running_loop(), bbox, categories)
+        with self._lock:
+            self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def publish(self, event):
+        """Thread-safe: may be called from sync views running in worker threads"""
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            if subscription.matches(event):
+                try:
+                    subscription.loop.call_soon_threadsafe(subscription.deliver, event)
+                except RuntimeError:
+                    # The subscriber's loop is closed; it is going away
+                    self.unsubscribe(subscription)
+
+
+class LocalBroker(InProcessBroker):
+    """Stand-in broker that also keeps every published event, for tests and scripts"""
+
+    def __init__(self):
+        super().__init__()
+        self.events = []
+
+    def publish(self, event):
+        self.events.append(event)
+        super().publish(event)
+
+
+@lru_cache(maxsize=None)
+def _load_broker(path):
+    return import_string(path)()
+
+
+def get_broker():
+    return _load_broker(getattr(settings, 'ALERT_EVENTS_BROKER', 'api.realtime.InProcessBroker'))
+
+
+def build_alert_event(event_type, alert):
+    """Event payload shared by every subscriber, so it carries no per-user fields"""
+    from .serializers import AlertEventSerializer
+
+    if event_type == 'deleted':
+        data = {'id': alert.pk}
+    else:
+        data = AlertEventSerializer(alert).data
+    return {
+        'type': f'alert.{event_type}',
+        'category': alert.category,
+        'latitude': alert.latitude,
+        'longitude': alert.longitude,
+        'alert': data,
+    }
+
+
+def publish_alert_event(event_type, alert):
+    """Broadcasts an alert event once the current transaction commits"""
+    event = build_alert_event(event_type, alert)
+    transaction.on_commit(lambda: get_broker().publish(event))
+
+
+async def alert_events_websocket(scope, receive, send):
+    """
+    ASGI app for ws://<host>/ws/alerts/?bbox=south,west,north,east&categories=a,b
+
+    Clients can change their filter at any time by sending
+    {"bbox": [south, west, north, east], "categories": ["flooding"]}.
+    """
+    message = await receive()
+    if message['type'] != 'websocket.connect':
+        return
+
+    query = parse_qs(scope.get('query_string', b'').decode())
+    try:
+        bbox = parse_bbox(query.get('bbox', [None])[0])
+    except ValueError:
+        await send({'type': 'websocket.close', 'code': 4400})
+        return
+    categories = parse_categories(query.get('categories', [None])[0])
+
+    await send({'type': 'websocket.accept'})
+    broker = get_broker()
+    subscription = broker.subscribe(bbox, categories)
+
+    async def forward_events():
+        while True:
+            event = await subscription.queue.get()
+            await send({'type': 'websocket.send', 'text': json.dumps(event, default=str)})
+
+    sender = asyncio.ensure_future(forward_events())
+    try:
+        while True:
+            message = await receive()
+            if message['type'] == 'websocket.disconnect':
+                break
+            if message['type'] != 'websocket.receive' or not message.get('text'):
+                continue
+            try:
+                data = json.loads(message['text'])
+                subscription.bbox = parse_bbox(data.get('bbox'))
+                subscription.categories = parse_categories(data.get('categories'))
+            except (ValueError, TypeError, AttributeError):
+                await send({'type': 'websocket.send', 'text': json.dumps({'type': 'error', 'error': 'Filtro inválido'})})
+    finally:
+        sender.cancel()
+        broker.unsubscribe(subscription)
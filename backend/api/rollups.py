@@ -0,0 +1,172 @@
+"""
+Pre-aggregated alert counts for heatmaps and trend charts (AlertRollup).
+
+Each rollup row counts the alerts created in one hour, of one category, in
+one ROLLUP_CELL_DEGREES grid cell, that are currently in one status. Writes
+keep them current with apply_rollup_deltas() (create, update, close,
+expire, delete), so analytics queries read a range of hours of rollups
+instead of grouping the alerts table. rebuild_rollups() recomputes them
+from the alerts, for the backfill and to repair drift.
+"""
+import math
+from collections import Counter, defaultdict
+from datetime import timedelta, timezone as dt_timezone
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q, Sum
+
+# Side of the grid cells in degrees (~1.1 km of latitude)
+ROLLUP_CELL_DEGREES = 0.01
+# Longest time range the analytics endpoints accept
+ROLLUP_MAX_RANGE = timedelta(days=366)
+ROLLUP_INTERVALS = {'hour': timedelta(hours=1), 'day': timedelta(days=1)}
+REBUILD_BATCH_SIZE = 5000
+
+KEY_FIELDS = ('hour', 'category', 'cell_row', 'cell_col', 'status')
+
+
+def rollup_cell(latitude, longitude):
+    return math.floor(latitude / ROLLUP_CELL_DEGREES), math.floor(longitude / ROLLUP_CELL_DEGREES)
+
+
+def hour_bucket(moment):
+    """Start of the UTC hour containing `moment`"""
+    return moment.astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+def rollup_key(category, latitude, longitude, created_at, status):
+    return (hour_bucket(created_at), category, *rollup_cell(latitude, longitude), status)
+
+
+def alert_rollup_key(alert):
+    return rollup_key(alert.category, alert.latitude, alert.longitude, alert.created_at, alert.status)
+
+
+def apply_rollup_deltas(deltas):
+    """
+    Adds each {rollup key: change} to its row with an F() UPDATE, creating
+    the row when it doesn't exist yet. Decrements of missing rows (alerts
+    from before the backfill) are dropped.
+    """
+    from .models import AlertRollup
+
+    for key, delta in deltas.items():
+        if not delta:
+            continue
+        fields = dict(zip(KEY_FIELDS, key))
+        if AlertRollup.objects.filter(**fields).update(count=F('count') + delta) or delta < 0:
+            continue
+        try:
+            with transaction.atomic():
+                AlertRollup.objects.create(count=delta, **fields)
+        except IntegrityError:
+            # Created by a concurrent write since our UPDATE
+            AlertRollup.objects.filter(**fields).update(count=F('count') + delta)
+
+
+def rollup_transition(before, after):
+    """Deltas moving one alert from rollup key `before` to `after`"""
+    if before == after:
+        return {}
+    return {before: -1, after: 1}
+
+
+def rebuild_rollups(since=None):
+    """
+    Recomputes the rollups from the alerts table, for every hour or only
+    from the hour containing `since`. Returns the number of rollup rows.
+    """
+    from .models import Alert, AlertRollup
+
+    alerts = Alert.objects.order_by()
+    rollups = AlertRollup.objects.all()
+    if since is not None:
+        since = hour_bucket(since)
+        alerts = alerts.filter(created_at__gte=since)
+        rollups = rollups.filter(hour__gte=since)
+
+    # One transaction, so writes running meanwhile are neither lost nor counted twice
+    with transaction.atomic():
+        counts = Counter(
+            rollup_key(*row) for row in alerts.values_list(
+                'category', 'latitude', 'longitude', 'created_at', 'status'
+            ).iterator(chunk_size=REBUILD_BATCH_SIZE)
+        )
+        rollups.delete()
+        AlertRollup.objects.bulk_create([
+            AlertRollup(count=count, **dict(zip(KEY_FIELDS, key))) for key, count in counts.items()
+        ], batch_size=REBUILD_BATCH_SIZE)
+    return len(counts)
+
+
+def filter_rollups(since, until, categories=None, statuses=None, bbox=None):
+    """Rollups of the hours starting in [since, until), optionally narrowed"""
+    from .models import AlertRollup
+
+    rollups = AlertRollup.objects.filter(hour__gte=hour_bucket(since), hour__lt=until)
+    if categories:
+        rollups = rollups.filter(category__in=categories)
+    if statuses:
+        rollups = rollups.filter(status__in=statuses)
+    if bbox is not None:
+        south, west, north, east = bbox
+        min_row, min_col = rollup_cell(south, west)
+        max_row, max_col = rollup_cell(north, east)
+        rollups = rollups.filter(cell_row__gte=min_row, cell_row__lte=max_row)
+        if west <= east:
+            rollups = rollups.filter(cell_col__gte=min_col, cell_col__lte=max_col)
+        else:
+            # The box crosses the antimeridian: columns east of `west` or west of `east`
+            rollups = rollups.filter(Q(cell_col__gte=min_col) | Q(cell_col__lte=max_col))
+    return rollups
+
+
+def heatmap(rollups, resolution=1):
+    """
+    Alert counts per grid cell, merging `resolution` x `resolution` base
+    cells; each cell as its center point, busiest first.
+    """
+    totals = defaultdict(int)
+    for row, col, count in rollups.order_by().values('cell_row', 'cell_col').annotate(
+        total=Sum('count')
+    ).values_list('cell_row', 'cell_col', 'total'):
+        totals[row // resolution, col // resolution] += count
+
+    size = ROLLUP_CELL_DEGREES * resolution
+    cells = [
+        {
+            'latitude': round((row + 0.5) * size, 6),
+            'longitude': round((col + 0.5) * size, 6),
+            'count': count,
+        }
+        for (row, col), count in totals.items() if count > 0
+    ]
+    cells.sort(key=lambda cell: (-cell['count'], cell['latitude'], cell['longitude']))
+    return {'cell_degrees': round(size, 6), 'cells': cells}
+
+
+def timeseries(rollups, since, until, interval='hour', by_category=False):
+    """
+    Alert counts per `interval` bucket (UTC) from `since` to `until`,
+    including empty buckets; with `by_category`, also split per category.
+    """
+    step = ROLLUP_INTERVALS[interval]
+    fields = ['hour', 'category'] if by_category else ['hour']
+    buckets = defaultdict(Counter)
+    for row in rollups.order_by().values(*fields).annotate(total=Sum('count')):
+        hour = row['hour']
+        start = hour.replace(hour=0) if interval == 'day' else hour
+        buckets[start][row.get('category')] += row['total']
+
+    start = hour_bucket(since)
+    if interval == 'day':
+        start = start.replace(hour=0)
+    series = []
+    while start < until:
+        counts = buckets.get(start, Counter())
+        bucket = {'start': start.isoformat().replace('+00:00', 'Z'), 'count': sum(counts.values())}
+        if by_category:
+            bucket['categories'] = {key: count for key, count in sorted(counts.items()) if count}
+        series.append(bucket)
+        start += step
+    return {'interval': interval, 'buckets': series}
@@ -0,0 +1,27 @@
+from django.db import connections
+
+PRIMARY = 'default'
+REPLICA = 'replica'
+
+
+class PrimaryReplicaRouter:
+    """
+    Sends reads to the read-only REPLICA connection and writes to PRIMARY.
+    Reads inside a transaction on PRIMARY stay there, so a transaction sees
+    its own uncommitted writes and keeps a consistent snapshot.
+    """
+
+    def db_for_read(self, model, **hints):
+        if REPLICA not in connections.settings or connections[PRIMARY].in_atomic_block:
+            return PRIMARY
+        return REPLICA
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases are the same database file
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == PRIMARY
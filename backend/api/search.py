@@ -0,0 +1,97 @@
+import re
+
+from django.core import checks
+from django.db import connections
+from django.db.models import Exists, OuterRef, Q
+
+from .models import AlertComment, AlertSearchEntry
+
+# Words of a query taken into account; the rest are ignored
+SEARCH_MAX_TERMS = 10
+
+_WORD = re.compile(r'\w+')
+# Per database alias: whether the FTS5 index from migration 0011 exists
+_index_available = {}
+# Triggers that keep the index in sync with api_alert and api_alertcomment.
+# Django doesn't know about them: a migration that rebuilds either table on
+# SQLite drops them and has to create them again (see 0012)
+SEARCH_TRIGGERS = (
+    'api_alert_search_insert',
+    'api_alert_search_update',
+    'api_alert_search_delete',
+    'api_alert_search_comment_insert',
+    'api_alert_search_comment_update',
+    'api_alert_search_comment_delete',
+)
+
+
+def search_terms(text):
+    return _WORD.findall(text or '')[:SEARCH_MAX_TERMS]
+
+
+def match_expression(terms):
+    """
+    FTS5 query matching every term, the last one as a prefix so results
+    show up while typing. Terms are quoted, so user input can't inject
+    FTS5 operators.
+    """
+    phrases = [f'"{term}"' for term in terms]
+    phrases[-1] += '*'
+    return ' '.join(phrases)
+
+
+def has_search_index(using):
+    if using not in _index_available:
+        connection = connections[using]
+        _index_available[using] = (
+            connection.vendor == 'sqlite' and
+            AlertSearchEntry._meta.db_table in connection.introspection.table_names()
+        )
+    return _index_available[using]
+
+
+def missing_search_triggers(using):
+    """Names of the SEARCH_TRIGGERS absent from a database that has the index"""
+    if not has_search_index(using):
+        return []
+    with connections[using].cursor() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")
+        existing = {name for name, in cursor.fetchall()}
+    return [name for name in SEARCH_TRIGGERS if name not in existing]
+
+
+@checks.register(checks.Tags.database)
+def check_search_triggers(app_configs, databases=None, **kwargs):
+    """`manage.py check --database default` reports a search index left out of sync"""
+    errors = []
+    for using in databases or ():
+        missing = missing_search_triggers(using)
+        if missing:
+            errors.append(checks.Error(
+                f"Faltan triggers del índice de búsqueda en '{using}': {', '.join(missing)}",
+                hint='Una migración reconstruyó api_alert o api_alertcomment; vuelve a crearlos como en 0012.',
+                id='api.E001',
+            ))
+    return errors
+
+
+def search_alerts(queryset, terms):
+    """
+    Narrows an alert queryset to the ones whose title, description or
+    comments contain every term, best matches first. With the FTS5 index
+    the match drives the query and the other filters are checked per
+    matching row, so cost follows the matches rather than the table size;
+    elsewhere it falls back to icontains scans, newest first.
+    """
+    if has_search_index(queryset.db):
+        return queryset.filter(
+            search_entry__document__match=match_expression(terms)
+        ).order_by('search_entry__rank', '-id')
+
+    for term in terms:
+        queryset = queryset.filter(
+            Q(title__icontains=term) |
+            Q(description__icontains=term) |
+            Exists(AlertComment.objects.filter(alert=OuterRef('pk'), text__icontains=term))
+        )
+    return queryset.order_by('-created_at', '-id')
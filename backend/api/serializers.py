@@ -1,7 +1,87 @@
+import time
+
 from rest_framework import serializers
 from django.contrib.auth.models import User
-from .models import Alert, UserProfile, AlertReaction, AlertComment
+from .models import Alert, UserProfile, AlertReaction, AlertComment, Notification, Subscription
 from .categories import get_category
+from .images import thumbnail_urls
+from .subscriptions import SUBSCRIPTION_MAX_RADIUS_METERS
+from .metrics import record_serializer_time
+
+def parse_field_list(value):
+    """Parses a comma separated query param into a set, or None when absent"""
+    if value is None:
+        return None
+    return {name.strip() for name in value.split(',') if name.strip()}
+
+class TimedSerializerMixin:
+    """Reports the time spent building `.data` to the performance middleware"""
+    
+    @property
+    def data(self):
+        started = time.perf_counter()
+        try:
+            return super().data
+        finally:
+            record_serializer_time(time.perf_counter() - started)
+
+class TimedListSerializer(TimedSerializerMixin, serializers.ListSerializer):
+    pass
+
+class SparseFieldsMixin:
+    """
+    Lets clients trim the payload with query params:
+    ?fields=id,latitude,longitude keeps only those fields, and
+    ?expand=user,comments lists which nested objects to embed. When `expand`
+    is sent, nested objects that are not listed are collapsed (see
+    `expandable_fields`) or dropped. Fields in `deferred_fields` are only
+    embedded when listed in `expand`.
+    """
+    # Nested fields that can be collapsed; maps name -> factory for the
+    # collapsed representation, or None to drop the field entirely
+    expandable_fields = {}
+    # Expandable fields left out unless explicitly requested with ?expand=
+    deferred_fields = set()
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if request is None:
+            return
+        
+        fields, _ = self.get_sparse_params(request)
+        for name in list(self.fields):
+            if fields is not None and name not in fields:
+                self.fields.pop(name)
+            elif not self.is_expanded(request, name):
+                collapsed = self.expandable_fields[name]
+                if collapsed is None:
+                    self.fields.pop(name)
+                else:
+                    self.fields[name] = collapsed()
+    
+    @staticmethod
+    def get_sparse_params(request):
+        params = getattr(request, 'query_params', request.GET)
+        return parse_field_list(params.get('fields')), parse_field_list(params.get('expand'))
+    
+    @classmethod
+    def is_rendered(cls, request, name):
+        """Whether `name` is part of the response for this request"""
+        fields, _ = cls.get_sparse_params(request)
+        return fields is None or name in fields
+    
+    @classmethod
+    def is_expanded(cls, request, name):
+        """Whether `name` is rendered as a full nested object"""
+        if not cls.is_rendered(request, name):
+            return False
+        if name not in cls.expandable_fields:
+            return True
+        _, expand = cls.get_sparse_params(request)
+        if expand is None:
+            return name not in cls.deferred_fields
+        return name in expand
 
 class UserSerializer(serializers.ModelSerializer):
     reputation_points = serializers.IntegerField(source='profile.reputation_points', read_only=True, default=0)
@@ -32,11 +112,12 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
 class UserProfileSerializer(serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
     avatar_url = serializers.SerializerMethodField()
+    avatar_thumbnails = serializers.SerializerMethodField()
     avatar = serializers.ImageField(write_only=True, required=False, allow_null=True)
     
     class Meta:
         model = UserProfile
-        fields = ['user', 'phone', 'avatar', 'avatar_url', 'alerts_reported', 'alerts_resolved', 'reputation_points', 'created_at']
+        fields = ['user', 'phone', 'avatar', 'avatar_url', 'avatar_thumbnails', 'alerts_reported', 'alerts_resolved', 'reputation_points', 'created_at']
         read_only_fields = ['alerts_reported', 'alerts_resolved', 'reputation_points', 'created_at']
     
     def get_avatar_url(self, obj):
@@ -46,28 +127,45 @@ class UserProfileSerializer(serializers.ModelSerializer):
                 return request.build_absolute_uri(obj.avatar.url)
             return obj.avatar.url
         return None
+    
+    def get_avatar_thumbnails(self, obj):
+        if obj.avatar:
+            return thumbnail_urls(obj.avatar, obj.avatar_variants, self.context.get('request'))
+        return None
 
-class AlertCommentSerializer(serializers.ModelSerializer):
+class AlertCommentSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
     
     class Meta:
         model = AlertComment
+        list_serializer_class = TimedListSerializer
         fields = ['id', 'user', 'text', 'created_at', 'updated_at']
         read_only_fields = ['id', 'user', 'created_at', 'updated_at']
 
-class AlertSerializer(serializers.ModelSerializer):
+class AlertSerializer(TimedSerializerMixin, SparseFieldsMixin, serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
     category_detail = serializers.SerializerMethodField()
     image = serializers.ImageField(required=False, allow_null=True)
+    image_thumbnails = serializers.SerializerMethodField()
     user_reaction = serializers.SerializerMethodField()
     comments = AlertCommentSerializer(many=True, read_only=True)
-    comments_count = serializers.IntegerField(source='comments.count', read_only=True)
     status_display = serializers.CharField(source='get_status_display', read_only=True)
     
     class Meta:
         model = Alert
-        fields = '__all__'
-        read_only_fields = ['user', 'created_at', 'updated_at', 'likes_count', 'dislikes_count', 'closed_at']
+        exclude = ['image_variants']
+        list_serializer_class = TimedListSerializer
+        read_only_fields = [
+            'user', 'created_at', 'updated_at', 'likes_count', 'dislikes_count', 'comments_count',
+            'confirmations_count', 'duplicate_of', 'closed_at',
+        ]
+    
+    expandable_fields = {
+        'user': lambda: serializers.PrimaryKeyRelatedField(read_only=True),
+        'comments': None,
+    }
+    # Comments are served paginated by the `comments` action
+    deferred_fields = {'comments'}
     
     def get_category_detail(self, obj):
         """Returns the full category data from the dictionary"""
@@ -79,20 +177,103 @@ class AlertSerializer(serializers.ModelSerializer):
             }
         return None
     
+    def get_image_thumbnails(self, obj):
+        """URLs of the generated thumbnails; None until processing finishes"""
+        if obj.image:
+            return thumbnail_urls(obj.image, obj.image_variants, self.context.get('request'))
+        return None
+    
     def get_user_reaction(self, obj):
         """Returns the current user's reaction to this alert"""
+        # Lists receive the reactions prefetched as {alert_id: reaction_type}
+        user_reactions = self.context.get('user_reactions')
+        if user_reactions is not None:
+            return user_reactions.get(obj.id)
+        
         request = self.context.get('request')
         if request and request.user.is_authenticated:
-            try:
-                reaction = obj.reactions.get(user=request.user)
-                return reaction.reaction_type
-            except:
-                return None
+            return obj.reactions.filter(user=request.user).values_list('reaction_type', flat=True).first()
         return None
 
+class AlertEventSerializer(AlertSerializer):
+    """
+    Alert payload of the realtime events. Shared by every subscriber, so it
+    has no per-user fields, and it never touches the comments.
+    """
+    comments = None
+    user_reaction = None
+
 class AlertCreateSerializer(serializers.ModelSerializer):
     image = serializers.ImageField(required=False, allow_null=True)
     
     class Meta:
         model = Alert
-        fields = ['category', 'title', 'description', 'latitude', 'longitude', 'image']
\ No newline at end of file
+        fields = ['id', 'category', 'title', 'description', 'latitude', 'longitude', 'image', 'duplicate_of']
+        # Set when the report turns out to be a duplicate (see api/duplicates.py)
+        read_only_fields = ['duplicate_of']
+
+class SubscriptionSerializer(serializers.ModelSerializer):
+    CIRCLE_FIELDS = ('latitude', 'longitude', 'radius_meters')
+    BBOX_FIELDS = ('south', 'west', 'north', 'east')
+    
+    categories = serializers.ListField(child=serializers.CharField(), required=False)
+    
+    class Meta:
+        model = Subscription
+        fields = [
+            'id', 'name', 'latitude', 'longitude', 'radius_meters', 'south', 'west', 'north', 'east',
+            'categories', 'is_active', 'created_at', 'updated_at',
+        ]
+        read_only_fields = ['id', 'created_at', 'updated_at']
+    
+    def validate_categories(self, value):
+        unknown = sorted({key for key in value if get_category(key) is None})
+        if unknown:
+            raise serializers.ValidationError(f"Categorías desconocidas: {', '.join(unknown)}")
+        return sorted(set(value))
+    
+    def validate(self, data):
+        """Exactly one area: a circle or a bounding box. Sending one replaces the other."""
+        sent_circle = any(field in data for field in self.CIRCLE_FIELDS)
+        sent_bbox = any(field in data for field in self.BBOX_FIELDS)
+        if sent_circle and sent_bbox:
+            raise serializers.ValidationError("Indica un círculo o un rectángulo, no ambos")
+        if not sent_circle and not sent_bbox:
+            if self.instance is None:
+                raise serializers.ValidationError(
+                    "Indica un círculo (latitude, longitude, radius_meters) o un rectángulo (south, west, north, east)"
+                )
+            return data
+        
+        fields, cleared = (self.CIRCLE_FIELDS, self.BBOX_FIELDS) if sent_circle else (self.BBOX_FIELDS, self.CIRCLE_FIELDS)
+        area = {field: data.get(field, getattr(self.instance, field, None)) for field in fields}
+        if any(value is None for value in area.values()):
+            raise serializers.ValidationError(f"Faltan campos del área: {', '.join(fields)}")
+        
+        if sent_circle:
+            if not (-90 <= area['latitude'] <= 90 and -180 <= area['longitude'] <= 180):
+                raise serializers.ValidationError("Coordenadas fuera de rango")
+            if not 0 < area['radius_meters'] <= SUBSCRIPTION_MAX_RADIUS_METERS:
+                raise serializers.ValidationError(
+                    f"radius_meters debe estar entre 1 y {SUBSCRIPTION_MAX_RADIUS_METERS}"
+                )
+        else:
+            if not (-90 <= area['south'] <= area['north'] <= 90 and -180 <= area['west'] <= area['east'] <= 180):
+                raise serializers.ValidationError("Rectángulo inválido: se espera south <= north y west <= east")
+        
+        data.update(area)
+        data.update(dict.fromkeys(cleared))
+        return data
+
+class NotificationAlertSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Alert
+        fields = ['id', 'title', 'category', 'latitude', 'longitude', 'status', 'created_at']
+
+class NotificationSerializer(serializers.ModelSerializer):
+    alert = NotificationAlertSerializer(read_only=True)
+    
+    class Meta:
+        model = Notification
+        fields = ['id', 'alert', 'subscription', 'created_at', 'read_at']
+        read_only_fields = fields
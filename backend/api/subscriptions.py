@@ -0,0 +1,183 @@
+import math
+import threading
+import time
+from collections import defaultdict
+
+from .geo import haversine_km
+
+# Largest circle a subscription may cover
+SUBSCRIPTION_MAX_RADIUS_METERS = 50000
+# Subscriptions per user accepted by the API
+SUBSCRIPTIONS_PER_USER = 20
+# Side of the index cells in degrees (~5.5 km of latitude)
+SUBSCRIPTION_CELL_DEGREES = 0.05
+# Subscriptions covering more cells than this are checked on every match
+SUBSCRIPTION_MAX_CELLS = 64
+# How often (seconds) the index picks up subscriptions changed by other processes
+SYNC_INTERVAL = 5
+# Subscription ids per confirming query, below SQLite's variable limit
+CONFIRM_BATCH_SIZE = 500
+
+
+class SubscriptionIndex:
+    """
+    In-memory grid over the areas of the active subscriptions. Each one is
+    registered in every cell its bounding box overlaps, so matching a point
+    reads a single cell (plus the few subscriptions too large to register)
+    instead of scanning the table.
+
+    Kept in sync by the Subscription signals in models.py for this process
+    and by sync(), which reads subscriptions changed since the last
+    watermark. notify_subscribers() confirms the matches against the
+    database, so subscriptions deleted elsewhere never get notified.
+    """
+
+    def __init__(self, cell=SUBSCRIPTION_CELL_DEGREES):
+        self.cell = cell
+        self._lock = threading.Lock()
+        self._cells = defaultdict(dict)
+        self._keys = {}
+        self._watermark = None
+        self._synced_at = 0.0
+
+    def _cell_keys(self, min_lat, max_lat, min_lng, max_lng):
+        rows = range(math.floor(min_lat / self.cell), math.floor(max_lat / self.cell) + 1)
+        cols = range(math.floor(min_lng / self.cell), math.floor(max_lng / self.cell) + 1)
+        if len(rows) * len(cols) > SUBSCRIPTION_MAX_CELLS:
+            return None
+        return [(row, col) for row in rows for col in cols]
+
+    def _discard(self, subscription_id):
+        # Caller holds the lock
+        for key in self._keys.pop(subscription_id, ()):
+            cell = self._cells[key]
+            cell.pop(subscription_id, None)
+            if not cell:
+                del self._cells[key]
+
+    def add(self, subscription):
+        """Indexes a Subscription (saved or not, as long as it has a pk)"""
+        bounds = subscription.bounds()
+        center = None
+        if subscription.is_circle:
+            center = (subscription.latitude, subscription.longitude, subscription.radius_meters / 1000)
+        entry = (*bounds, center)
+        # Filed under each of its categories (None: all of them), so matching
+        # never looks at subscriptions for other categories
+        categories = set(subscription.categories) or {None}
+        keys = [
+            (row, col, category)
+            for row, col in self._cell_keys(*bounds) or [(None, None)]
+            for category in categories
+        ]
+        with self._lock:
+            self._discard(subscription.pk)
+            for key in keys:
+                self._cells[key][subscription.pk] = entry
+            self._keys[subscription.pk] = keys
+
+    def remove(self, subscription_id):
+        with self._lock:
+            self._discard(subscription_id)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def match(self, category, lat, lng):
+        """Ids of the indexed subscriptions an alert of `category` at (lat, lng) concerns"""
+        row, col = math.floor(lat / self.cell), math.floor(lng / self.cell)
+        # Wide subscriptions live in the (None, None) cell
+        keys = [(row, col, None), (row, col, category), (None, None, None), (None, None, category)]
+        found = []
+        with self._lock:
+            for key in keys:
+                for subscription_id, (min_lat, max_lat, min_lng, max_lng, center) in self._cells.get(key, {}).items():
+                    if not (min_lat <= lat <= max_lat and min_lng <= lng <= max_lng):
+                        continue
+                    if center is not None and haversine_km(center[0], center[1], lat, lng) > center[2]:
+                        continue
+                    found.append(subscription_id)
+        return found
+
+    def sync(self, force=False):
+        """Applies subscriptions changed since the last sync, at most every SYNC_INTERVAL seconds"""
+        from .models import Subscription
+
+        if not force and time.monotonic() - self._synced_at < SYNC_INTERVAL:
+            return
+        self._synced_at = time.monotonic()
+        changed = Subscription.objects.order_by()
+        if self._watermark is not None:
+            changed = changed.filter(updated_at__gte=self._watermark)
+        for subscription in changed.iterator(chunk_size=2000):
+            if subscription.is_active:
+                self.add(subscription)
+            else:
+                self.remove(subscription.pk)
+            if self._watermark is None or subscription.updated_at > self._watermark:
+                self._watermark = subscription.updated_at
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_subscription_index():
+    """The process-wide index, loaded from the database on first use"""
+    global _index
+    with _index_lock:
+        if _index is None:
+            index = SubscriptionIndex()
+            index.sync(force=True)
+            _index = index
+        return _index
+
+
+def track_subscription(subscription):
+    """Adds, moves or drops `subscription` in the index after a save, if the index is in use"""
+    if _index is None:
+        return
+    if subscription.is_active:
+        _index.add(subscription)
+    else:
+        _index.remove(subscription.pk)
+
+
+def forget_subscription(subscription_id):
+    if _index is not None:
+        _index.remove(subscription_id)
+
+
+def notify_subscribers(alert_id):
+    """
+    Background job (see api/jobs.py) queued for every new alert. Creates a
+    Notification for every user with an active subscription the alert
+    matches, except its author. Returns how many users matched.
+    """
+    from .models import Alert, Notification, Subscription
+
+    alert = Alert.objects.filter(
+        pk=alert_id, status='active', duplicate_of__isnull=True
+    ).values('user_id', 'category', 'latitude', 'longitude').first()
+    if alert is None:
+        return 0
+
+    index = get_subscription_index()
+    index.sync()
+    candidate_ids = index.match(alert['category'], alert['latitude'], alert['longitude'])
+
+    subscription_by_user = {}
+    for start in range(0, len(candidate_ids), CONFIRM_BATCH_SIZE):
+        confirmed = Subscription.objects.filter(
+            pk__in=candidate_ids[start:start + CONFIRM_BATCH_SIZE], is_active=True
+        ).exclude(user_id=alert['user_id']).order_by('pk')
+        for subscription in confirmed:
+            if subscription.matches(alert['category'], alert['latitude'], alert['longitude']):
+                subscription_by_user.setdefault(subscription.user_id, subscription.pk)
+
+    notifications = Notification.objects.bulk_create([
+        Notification(user_id=user_id, alert_id=alert_id, subscription_id=subscription_id)
+        for user_id, subscription_id in subscription_by_user.items()
+    ], batch_size=500, ignore_conflicts=True)
+    return len(notifications)
+
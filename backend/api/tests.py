@@ -1,3 +1,1708 @@
-from django.test import TestCase
+import asyncio
+import json
+import random
+import re
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image
+from django.core.management import call_command
+from django.db import DatabaseError, connection, connections
+from django.db.models import Q, Sum
+from django.test import TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from . import duplicates, subscriptions
+from .authentication import local_token_cache
+from .expiry import expire_stale_alerts
+from .duplicates import get_duplicate_index
+from .jobs import claim_job, enqueue, retry_delay, run_job, run_pending_jobs
+from .geo import RouteCorridor, bbox_q, bounding_box, decode_polyline, haversine_km
+from .metrics import registry
+from .models import Alert, AlertComment, AlertReaction, AlertRollup, AlertTombstone, Job, Notification, Subscription, UserProfile
+from .realtime import alert_events_websocket, get_broker, publish_alert_event
+from .routers import PrimaryReplicaRouter
+from .rollups import hour_bucket, rebuild_rollups
+from .search import SEARCH_TRIGGERS, check_search_triggers, missing_search_triggers, search_alerts
+from .subscriptions import SubscriptionIndex, get_subscription_index, notify_subscribers
+
+
+def make_alert(user, latitude=19.4326, longitude=-99.1332, **kwargs):
+    defaults = {
+        'title': 'Choque en Reforma',
+        'description': 'Dos autos involucrados',
+        'category': 'traffic_accident',
+    }
+    defaults.update(kwargs)
+    return Alert.objects.create(user=user, latitude=latitude, longitude=longitude, **defaults)
+
+
+class FileDatabaseMixin:
+    """
+    Runs a TransactionTestCase on a copy of the test database in a temporary
+    file, for tests whose threads need real SQLite locking between
+    connections (the in-memory test database shares one cache, where lock
+    conflicts fail at once instead of waiting on the busy timeout).
+    """
+    
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        primary = connections['default']
+        cls._memory_name = primary.settings_dict['NAME']
+        cls._file_dir = tempfile.mkdtemp()
+        path = f'{cls._file_dir}/db.sqlite3'
+        primary.ensure_connection()
+        # Closing Django's connections would otherwise drop the in-memory database
+        cls._memory_keeper = sqlite3.connect(cls._memory_name, uri=True)
+        target = sqlite3.connect(path)
+        primary.connection.backup(target)
+        target.close()
+        cls._file_aliases = [alias for alias in connections if connections[alias].settings_dict['NAME'] == cls._memory_name]
+        for alias in cls._file_aliases:
+            # Renamed first: SQLite connections ignore close() on in-memory databases
+            connections[alias].settings_dict['NAME'] = path
+            connections[alias].close()
+    
+    @classmethod
+    def tearDownClass(cls):
+        for alias in cls._file_aliases:
+            connections[alias].close()
+            connections[alias].settings_dict['NAME'] = cls._memory_name
+        connections['default'].ensure_connection()
+        cls._memory_keeper.close()
+        shutil.rmtree(cls._file_dir)
+        super().tearDownClass()
+
+
+class GeoTests(TestCase):
+    def test_haversine_known_distance(self):
+        # Zócalo -> Ángel de la Independencia is roughly 3.7 km
+        distance = haversine_km(19.4326, -99.1332, 19.4270, -99.1677)
+        self.assertAlmostEqual(distance, 3.68, delta=0.1)
+
+    def test_bounding_box_contains_circle(self):
+        min_lat, max_lat, min_lng, max_lng = bounding_box(19.4326, -99.1332, 5)
+        for bearing_lat, bearing_lng in [(max_lat, -99.1332), (min_lat, -99.1332), (19.4326, max_lng), (19.4326, min_lng)]:
+            self.assertAlmostEqual(haversine_km(19.4326, -99.1332, bearing_lat, bearing_lng), 5, delta=0.05)
+
+    def test_decode_polyline(self):
+        self.assertEqual(
+            decode_polyline('_p~iF~ps|U_ulLnnqC_mqNvxq`@'),
+            [(38.5, -120.2), (40.7, -120.95), (43.252, -126.453)],
+        )
+        with self.assertRaises(ValueError):
+            decode_polyline('_p~iF~ps|U_ulL')
+
+    def test_route_corridor_distances(self):
+        route = RouteCorridor([(19.4326, -99.1332), (19.4326, -99.1532), (19.4426, -99.1532)], 0.1)
+        self.assertAlmostEqual(route.length_km, 2.098 + 1.112, delta=0.01)
+        distance, position = route.locate(19.4330, -99.1500)
+        self.assertAlmostEqual(distance, 0.0445, delta=0.001)
+        self.assertAlmostEqual(position, haversine_km(19.4326, -99.1332, 19.4326, -99.1500), delta=0.001)
+        # Past the end of the route, measured to the last vertex
+        self.assertIsNone(route.locate(19.4436, -99.1532))
+        self.assertAlmostEqual(route.locate(19.4432, -99.1532)[0], 0.0667, delta=0.001)
+
+
+class RouteCorridorTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user('reporter')
+        self.points = '19.4326,-99.1332;19.4326,-99.1532;19.4426,-99.1532'
+        self.on_route = make_alert(self.user, 19.4326, -99.1400, title='Sobre la ruta')
+        self.first_leg = make_alert(self.user, 19.4330, -99.1500, title='Primer tramo')
+        self.second_leg = make_alert(self.user, 19.4400, -99.1535, title='Segundo tramo')
+        self.off_route = make_alert(self.user, 19.4400, -99.1400, title='Lejos')
+        make_alert(self.user, 19.4326, -99.1450, title='Resuelta', status='resolved')
+
+    def test_orders_by_position_along_route(self):
+        response = self.client.get('/api/alerts/corridor/', {'points': self.points})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [item['id'] for item in response.data],
+            [self.on_route.id, self.first_leg.id, self.second_leg.id],
+        )
+        self.assertEqual(response.data[0]['distance'], 0)
+        self.assertLess(response.data[1]['route_position'], response.data[2]['route_position'])
+
+    def test_polyline_width_and_post(self):
+        response = self.client.get('/api/alerts/corridor/', {'polyline': 'wlruBn}`|Q?~{Bo}@?', 'width': 1000, 'limit': 4})
+        self.assertEqual(
+            [item['id'] for item in response.data],
+            [self.on_route.id, self.off_route.id, self.first_leg.id, self.second_leg.id],
+        )
+        response = self.client.post('/api/alerts/corridor/', {
+            'points': [[19.4326, -99.1332], [19.4326, -99.1532]], 'width': 50,
+        }, format='json')
+        self.assertEqual([item['id'] for item in response.data], [self.on_route.id, self.first_leg.id])
+
+    def test_rejects_bad_routes(self):
+        for params in ({}, {'points': '19.43,-99.13'}, {'points': '19.43'}, {'polyline': '_p~iF~'},
+                       {'points': self.points, 'width': 0}, {'points': self.points, 'width': 'x'}):
+            self.assertEqual(self.client.get('/api/alerts/corridor/', params).status_code, 400, params)
+
+
+# Tasks for the job queue tests, registered with mock.patch.dict(JOB_TASKS)
+ran_jobs = []
+
+
+def record_job(n):
+    ran_jobs.append(n)
+
+
+def failing_job():
+    raise RuntimeError('Servicio no disponible')
+
+
+TEST_JOB_TASKS = {'record': 'api.tests.record_job', 'failing': 'api.tests.failing_job'}
+
+
+@mock.patch.dict('api.jobs.JOB_TASKS', TEST_JOB_TASKS)
+@override_settings(JOBS_EAGER=False)
+class JobQueueTests(TestCase):
+    def setUp(self):
+        ran_jobs.clear()
+
+    def test_enqueued_on_commit_once_per_key(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            enqueue('record', {'n': 1}, key='record:1')
+            enqueue('record', {'n': 1}, key='record:1')
+            enqueue('record', {'n': 2})
+        self.assertEqual(ran_jobs, [])
+        self.assertEqual(Job.objects.filter(status='pending').count(), 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            enqueue('record', {'n': 1}, key='record:1')
+        self.assertEqual(run_pending_jobs(), 2)
+        self.assertEqual(ran_jobs, [1, 2])
+        self.assertEqual(Job.objects.filter(status='done').count(), 2)
+
+        # Nothing is queued before the transaction commits
+        with self.captureOnCommitCallbacks() as callbacks:
+            enqueue('record', {'n': 3})
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(Job.objects.count(), 2)
+        with self.assertRaises(ValueError):
+            enqueue('unknown')
+
+    @override_settings(JOBS_EAGER=True)
+    def test_eager_runs_after_commit_without_queueing(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            enqueue('record', {'n': 7})
+        self.assertEqual(ran_jobs, [7])
+        self.assertFalse(Job.objects.exists())
+
+    @override_settings(JOBS_EAGER=True)
+    def test_eager_failures_are_logged(self):
+        with self.assertLogs('api.jobs', 'ERROR'), self.captureOnCommitCallbacks(execute=True):
+            enqueue('failing')
+        self.assertFalse(Job.objects.exists())
+
+    def test_failures_retry_with_backoff_then_fail(self):
+        job = Job.objects.create(name='failing', max_attempts=2)
+        with self.assertLogs('api.jobs', 'WARNING'):
+            self.assertEqual(run_pending_jobs(), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('pending', 1))
+        self.assertIn('Servicio no disponible', job.last_error)
+        delay = (job.run_after - timezone.now()).total_seconds()
+        self.assertTrue(4 < delay <= 5 * 1.25, delay)
+        # Not due yet
+        self.assertIsNone(claim_job('worker'))
+
+        Job.objects.filter(pk=job.pk).update(run_after=timezone.now())
+        with self.assertLogs('api.jobs', 'ERROR'):
+            run_pending_jobs()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('failed', 2))
+        self.assertIsNotNone(job.finished_at)
+
+        self.assertTrue(10 <= retry_delay(2) <= 12.5)
+        self.assertLessEqual(retry_delay(30), 3600 * 1.25)
+
+    def test_claims_are_exclusive_and_lost_jobs_are_taken_back(self):
+        Job.objects.create(name='record', payload={'n': 1})
+        first = claim_job('a')
+        self.assertEqual(first.locked_by, 'a')
+        self.assertIsNone(claim_job('b'))
+
+        # Worker 'a' went away mid-job
+        Job.objects.filter(pk=first.pk).update(locked_at=timezone.now() - timedelta(hours=1))
+        second = claim_job('b')
+        self.assertEqual((second.pk, second.attempts), (first.pk, 2))
+        run_job(first)
+        self.assertEqual(Job.objects.get(pk=first.pk).status, 'running')
+        run_job(second)
+        self.assertEqual(Job.objects.get(pk=first.pk).status, 'done')
+
+    def test_run_jobs_command(self):
+        Job.objects.bulk_create([Job(name='record', payload={'n': n}) for n in range(3)])
+        Job.objects.create(
+            name='record', payload={'n': 9}, status='done', finished_at=timezone.now() - timedelta(days=30),
+        )
+        out = StringIO()
+        call_command('run_jobs', '--once', stdout=out)
+        self.assertIn('3 trabajos ejecutados', out.getvalue())
+        self.assertEqual(sorted(ran_jobs), [0, 1, 2])
+        self.assertEqual(Job.objects.count(), 3)
+
+
+@mock.patch.dict('api.jobs.JOB_TASKS', TEST_JOB_TASKS)
+@override_settings(JOBS_EAGER=False)
+class JobWorkerConcurrencyTests(FileDatabaseMixin, TransactionTestCase):
+    # Includes the read replica when the concurrent SQLite profile is on
+    databases = '__all__'
+
+    def test_each_job_runs_once_across_workers(self):
+        ran_jobs.clear()
+        Job.objects.bulk_create([Job(name='record', payload={'n': n}) for n in range(60)])
+
+        def drain(worker_id):
+            try:
+                run_pending_jobs(worker_id)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=drain, args=(f'worker-{i}',)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sorted(ran_jobs), list(range(60)))
+        self.assertEqual(Job.objects.filter(status='done').count(), 60)
+
+
+class DuplicateDetectionTests(TestCase):
+    def setUp(self):
+        # The index is per process; start each test from an empty one
+        duplicates._index = None
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('second'))
+        self.original = make_alert(User.objects.create_user('first'), title='Bache en Insurgentes', category='road_hazard')
+
+    def report(self, **overrides):
+        data = {
+            'title': 'Bache enorme', 'description': 'En el carril derecho', 'category': 'road_hazard',
+            'latitude': 19.4330, 'longitude': -99.1335,
+        }
+        data.update(overrides)
+        return self.client.post('/api/alerts/', data, format='json')
+
+    def test_links_nearby_report_to_original(self):
+        response = self.report()
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['duplicate_of'], self.original.id)
+        # Duplicates aren't originals themselves: the next report links to the first alert too
+        self.assertEqual(self.report().data['duplicate_of'], self.original.id)
+        self.assertEqual(self.original.duplicates.count(), 2)
+        # Each report is counted once, as its own alert, not as a confirmation too
+        self.original.refresh_from_db()
+        self.assertEqual(self.original.confirmations_count, 0)
+
+    @override_settings(ALERT_DUPLICATES={'MODE': 'merge'})
+    def test_merge_returns_original_without_creating(self):
+        response = self.report()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['id'], self.original.id)
+        self.assertEqual(response.data['confirmations_count'], 1)
+        self.assertEqual(Alert.objects.count(), 1)
+
+    @override_settings(ALERT_DUPLICATES={'MODE': 'off'})
+    def test_off_creates_independent_alert(self):
+        response = self.report()
+        self.assertIsNone(response.data['duplicate_of'])
+        self.original.refresh_from_db()
+        self.assertEqual(self.original.confirmations_count, 0)
+
+    def test_only_matches_same_category_nearby_recent_and_active(self):
+        self.assertIsNone(self.report(category='flooding').data['duplicate_of'])
+        self.assertIsNone(self.report(latitude=19.4400).data['duplicate_of'])
+        Alert.objects.filter(pk=self.original.pk).update(created_at=timezone.now() - timedelta(hours=1))
+        self.assertIsNone(self.report(longitude=-99.1400).data['duplicate_of'])
+
+        fresh = make_alert(self.original.user, 19.5, -99.2, category='road_hazard')
+        self.client.force_authenticate(fresh.user)
+        self.client.post(f'/api/alerts/{fresh.id}/close/')
+        self.assertIsNone(self.report(latitude=19.5, longitude=-99.2).data['duplicate_of'])
+
+    def test_index_lookup_doesnt_query(self):
+        index = get_duplicate_index()
+        for i in range(200):
+            make_alert(self.original.user, 19.3 + i * 0.001, -99.1, category='road_hazard')
+        with CaptureQueriesContext(connection) as queries:
+            found = index.candidates('road_hazard', self.original.latitude, self.original.longitude, timezone.now())
+        self.assertEqual(found, [self.original.id])
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(len(index), 201)
+
+    def test_sync_picks_up_alerts_from_other_processes(self):
+        index = get_duplicate_index()
+        Alert.objects.bulk_create([Alert(
+            user=self.original.user, title='Otra', description='Sin señales', category='flooding',
+            latitude=19.5, longitude=-99.2,
+        )])
+        self.assertEqual(index.candidates('flooding', 19.5, -99.2, timezone.now()), [])
+        index.sync(force=True)
+        self.assertEqual(len(index.candidates('flooding', 19.5, -99.2, timezone.now())), 1)
+
+
+@override_settings(JOBS_EAGER=False)
+class SubscriptionTests(TestCase):
+    def setUp(self):
+        subscriptions._index = None
+        self.client = APIClient()
+        self.reporter = User.objects.create_user('reporter')
+        self.client.force_authenticate(self.reporter)
+        self.users = {name: User.objects.create_user(name) for name in ('home', 'work', 'far', 'floods', 'paused')}
+        self.home = Subscription.objects.create(user=self.users['home'], latitude=19.4326, longitude=-99.1332, radius_meters=500)
+        Subscription.objects.create(user=self.users['work'], south=19.40, west=-99.20, north=19.45, east=-99.10)
+        Subscription.objects.create(user=self.users['far'], latitude=19.30, longitude=-99.20, radius_meters=1000)
+        Subscription.objects.create(
+            user=self.users['floods'], latitude=19.4326, longitude=-99.1332, radius_meters=500, categories=['flooding'],
+        )
+        Subscription.objects.create(
+            user=self.users['paused'], latitude=19.4326, longitude=-99.1332, radius_meters=500, is_active=False,
+        )
+        # Reporters aren't notified of their own alerts
+        Subscription.objects.create(user=self.reporter, latitude=19.4326, longitude=-99.1332, radius_meters=500)
+
+    def report(self, **overrides):
+        data = {
+            'title': 'Choque', 'description': 'Dos autos', 'category': 'traffic_accident',
+            'latitude': 19.4330, 'longitude': -99.1335,
+        }
+        data.update(overrides)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/alerts/', data, format='json')
+        run_pending_jobs()
+        return response
+
+    def notified(self, alert_id):
+        return set(Notification.objects.filter(alert_id=alert_id).values_list('user__username', flat=True))
+
+    def test_new_alert_notifies_matching_subscribers(self):
+        alert_id = self.report().data['id']
+        self.assertEqual(self.notified(alert_id), {'home', 'work'})
+        self.assertEqual(self.notified(self.report(category='flooding').data['id']), {'home', 'work', 'floods'})
+        # A duplicate report doesn't notify again
+        duplicate = self.report()
+        self.assertEqual(duplicate.data['duplicate_of'], alert_id)
+        self.assertEqual(self.notified(duplicate.data['id']), set())
+
+    def test_notifications_endpoint(self):
+        alert_id = self.report().data['id']
+        client = APIClient()
+        client.force_authenticate(self.users['home'])
+        response = client.get('/api/notifications/')
+        self.assertEqual([item['alert']['id'] for item in response.data['results']], [alert_id])
+        self.assertEqual(response.data['results'][0]['subscription'], self.home.id)
+
+        notification_id = response.data['results'][0]['id']
+        self.assertIsNotNone(client.post(f'/api/notifications/{notification_id}/read/').data['read_at'])
+        self.assertEqual(client.get('/api/notifications/', {'unread': 1}).data['results'], [])
+        self.assertEqual(self.client.get(f'/api/notifications/{notification_id}/').status_code, 404)
+
+    def test_index_follows_changes(self):
+        index = get_subscription_index()
+        self.assertEqual(len(index), 5)
+        self.assertIn(self.home.id, index.match('traffic_accident', 19.4330, -99.1335))
+        self.home.latitude = 19.50
+        self.home.save()
+        self.assertNotIn(self.home.id, index.match('traffic_accident', 19.4330, -99.1335))
+        self.home.delete()
+        self.assertEqual(len(index), 4)
+
+        # Changed by another process: picked up on the next sync
+        Subscription.objects.filter(user=self.users['far']).update(is_active=False, updated_at=timezone.now())
+        index.sync(force=True)
+        self.assertEqual(len(index), 3)
+
+    def test_index_matches_full_scan(self):
+        rng = random.Random(7)
+        areas = []
+        for pk in range(1, 400):
+            lat, lng = 19.4 + rng.uniform(-0.3, 0.3), -99.1 + rng.uniform(-0.3, 0.3)
+            categories = rng.choice([[], ['flooding'], ['flooding', 'road_hazard']])
+            if pk % 3:
+                areas.append(Subscription(pk=pk, latitude=lat, longitude=lng, radius_meters=rng.randint(100, 50000), categories=categories))
+            else:
+                size = rng.uniform(0.001, 1)
+                areas.append(Subscription(pk=pk, south=lat, north=lat + size, west=lng, east=lng + size, categories=categories))
+        index = SubscriptionIndex()
+        for subscription in areas:
+            index.add(subscription)
+        for _ in range(200):
+            category = rng.choice(['flooding', 'road_hazard', 'traffic_accident'])
+            lat, lng = 19.4 + rng.uniform(-0.5, 0.5), -99.1 + rng.uniform(-0.5, 0.5)
+            self.assertEqual(
+                sorted(index.match(category, lat, lng)),
+                [subscription.pk for subscription in areas if subscription.matches(category, lat, lng)],
+            )
+
+    def test_subscription_api(self):
+        response = self.client.post('/api/subscriptions/', {
+            'name': 'Casa', 'latitude': 19.43, 'longitude': -99.13, 'radius_meters': 800, 'categories': ['flooding'],
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        subscription_id = response.data['id']
+        response = self.client.patch(f'/api/subscriptions/{subscription_id}/', {
+            'south': 19.4, 'west': -99.2, 'north': 19.5, 'east': -99.1,
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(response.data['radius_meters'])
+        self.assertEqual(len(self.client.get('/api/subscriptions/').data), 2)
+
+        for data in ({'name': 'Nada'},
+                     {'latitude': 19.43, 'longitude': -99.13},
+                     {'latitude': 19.43, 'longitude': -99.13, 'radius_meters': 10 ** 6},
+                     {'latitude': 19.43, 'longitude': -99.13, 'radius_meters': 100, 'south': 19.4},
+                     {'south': 19.5, 'west': -99.2, 'north': 19.4, 'east': -99.1},
+                     {'latitude': 19.43, 'longitude': -99.13, 'radius_meters': 100, 'categories': ['nope']}):
+            self.assertEqual(self.client.post('/api/subscriptions/', data, format='json').status_code, 400, data)
+
+    def test_benchmark_command(self):
+        out = StringIO()
+        call_command('bench_subscriptions', '--subscriptions', '2000', '--alerts', '50', '--scan-alerts', '5', stdout=out)
+        self.assertIn('index', out.getvalue())
+
+
+class AlertRollupTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('reporter')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def report(self, **overrides):
+        data = {
+            'title': 'Inundación', 'description': 'Calle cerrada', 'category': 'flooding',
+            'latitude': 19.4326, 'longitude': -99.1332,
+        }
+        data.update(overrides)
+        response = self.client.post('/api/alerts/', data, format='json')
+        self.assertEqual(response.status_code, 201)
+        return response.data['id']
+
+    def snapshot(self):
+        return {
+            (row.hour, row.category, row.cell_row, row.cell_col, row.status): row.count
+            for row in AlertRollup.objects.all() if row.count
+        }
+
+    @override_settings(ALERT_DUPLICATES={'MODE': 'off'})
+    def test_incremental_updates_match_rebuild(self):
+        first = self.report()
+        second = self.report()
+        self.report(category='road_hazard')
+        moved = self.report(latitude=19.5)
+        self.client.post(f'/api/alerts/{first}/close/')
+        self.client.patch(f'/api/alerts/{moved}/', {'latitude': 19.45, 'status': 'resolved'}, format='json')
+        self.client.delete(f'/api/alerts/{second}/')
+        stale = make_alert(self.user, category='road_hazard')
+        Alert.objects.filter(pk=stale.pk).update(created_at=timezone.now() - timedelta(days=30))
+        rebuild_rollups(timezone.now() - timedelta(days=31))
+        self.assertEqual(expire_stale_alerts(publish=False)['expired'], 1)
+
+        incremental = self.snapshot()
+        rebuild_rollups()
+        self.assertEqual(incremental, self.snapshot())
+        self.assertEqual(sum(incremental.values()), Alert.objects.count())
+        statuses = {key[4]: count for key, count in incremental.items() if key[1] == 'road_hazard'}
+        self.assertEqual(statuses, {'active': 1, 'expired': 1})
+
+    @override_settings(ALERT_DUPLICATES={'MODE': 'off'})
+    def test_heatmap(self):
+        for _ in range(3):
+            self.report()
+        self.report(latitude=19.4472, longitude=-99.1398)
+        self.report(category='road_hazard', latitude=19.30, longitude=-99.30)
+
+        with CaptureQueriesContext(connection) as queries:
+            data = self.client.get('/api/alerts/heatmap/').data
+        # Answered from the rollups alone
+        self.assertFalse([query for query in queries if '"api_alert"' in query['sql']])
+        self.assertEqual([cell['count'] for cell in data['cells']], [3, 1, 1])
+        self.assertEqual((data['cells'][0]['latitude'], data['cells'][0]['longitude']), (19.435, -99.135))
+
+        data = self.client.get('/api/alerts/heatmap/', {'resolution': 10, 'categories': 'flooding'}).data
+        self.assertEqual(data['cell_degrees'], 0.1)
+        self.assertEqual([cell['count'] for cell in data['cells']], [4])
+        data = self.client.get('/api/alerts/heatmap/', {'bbox': '19.2,-99.4,19.35,-99.2'}).data
+        self.assertEqual([cell['count'] for cell in data['cells']], [1])
+        # Crossing the antimeridian
+        self.report(latitude=-17.7, longitude=179.9)
+        self.report(latitude=-17.7, longitude=-179.9)
+        data = self.client.get('/api/alerts/heatmap/', {'bbox': '-18,179,-17,-179'}).data
+        self.assertEqual([cell['count'] for cell in data['cells']], [1, 1])
+        earlier = (timezone.now() - timedelta(days=3)).isoformat()
+        self.assertEqual(self.client.get('/api/alerts/heatmap/', {'until': earlier}).data['cells'], [])
+
+        for params in ({'resolution': 0}, {'since': 'ayer'}, {'status': 'open'}, {'bbox': '1,2'},
+                       {'since': '2026-01-01T00:00:00Z', 'until': '2024-01-01T00:00:00Z'},
+                       {'since': '2020-01-01T00:00:00Z', 'until': '2026-01-01T00:00:00Z'}):
+            self.assertEqual(self.client.get('/api/alerts/heatmap/', params).status_code, 400, params)
+
+    @mock.patch('django.utils.timezone.now')
+    def test_timeseries(self, clock):
+        # Mid-hour, so the run can't straddle an hour boundary
+        now = clock.return_value = datetime(2026, 3, 10, 12, 30, tzinfo=dt_timezone.utc)
+        self.report()
+        self.report(category='road_hazard')
+        old = make_alert(self.user, category='road_hazard')
+        Alert.objects.filter(pk=old.pk).update(created_at=now - timedelta(hours=5))
+        rebuild_rollups()
+
+        data = self.client.get('/api/alerts/timeseries/', {'since': (now - timedelta(hours=6)).isoformat()}).data
+        self.assertEqual(data['interval'], 'hour')
+        self.assertEqual(len(data['buckets']), 7)
+        self.assertEqual([bucket['count'] for bucket in data['buckets']], [0, 1, 0, 0, 0, 0, 2])
+        self.assertEqual(data['buckets'][-1]['start'], hour_bucket(now).isoformat().replace('+00:00', 'Z'))
+
+        data = self.client.get('/api/alerts/timeseries/', {'interval': 'day', 'group_by': 'category'}).data
+        self.assertEqual(len(data['buckets']), 8)
+        self.assertEqual(sum(bucket['count'] for bucket in data['buckets']), 3)
+        self.assertEqual(
+            {key: sum(bucket['categories'].get(key, 0) for bucket in data['buckets']) for key in ('flooding', 'road_hazard')},
+            {'flooding': 1, 'road_hazard': 2},
+        )
+        self.assertEqual(self.client.get('/api/alerts/timeseries/', {'interval': 'week'}).status_code, 400)
+
+    def test_failed_counter_update_rolls_back_the_write(self):
+        alert_id = self.report()
+        with mock.patch('api.views.apply_rollup_deltas', side_effect=DatabaseError('disk I/O error')):
+            with self.assertRaises(DatabaseError):
+                self.client.post('/api/alerts/', {
+                    'title': 'Otra', 'description': 'Sin luz', 'category': 'road_hazard',
+                    'latitude': 19.30, 'longitude': -99.30,
+                }, format='json')
+            with self.assertRaises(DatabaseError):
+                self.client.post(f'/api/alerts/{alert_id}/close/')
+        self.assertEqual(list(Alert.objects.values_list('id', 'status')), [(alert_id, 'active')])
+        profile = UserProfile.objects.get(user=self.user)
+        self.assertEqual((profile.alerts_reported, profile.alerts_resolved), (1, 0))
+
+    def test_rebuild_command(self):
+        make_alert(self.user)
+        old = make_alert(self.user)
+        Alert.objects.filter(pk=old.pk).update(created_at=timezone.now() - timedelta(days=10))
+        AlertRollup.objects.all().delete()
+        out = StringIO()
+        call_command('rebuild_rollups', '--days', '2', stdout=out)
+        self.assertEqual(AlertRollup.objects.count(), 1)
+        call_command('rebuild_rollups', stdout=out)
+        self.assertEqual(AlertRollup.objects.count(), 2)
+        self.assertIn('agregados recalculados', out.getvalue())
+
+
+class NearbyTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user('reporter')
+        self.center = make_alert(self.user, 19.4326, -99.1332, title='Centro')
+        self.close = make_alert(self.user, 19.4400, -99.1332, title='Cerca')
+        self.far = make_alert(self.user, 19.6000, -99.1332, title='Lejos')
+        make_alert(self.user, 19.4327, -99.1332, title='Resuelta', status='resolved')
+
+    def test_requires_coordinates(self):
+        response = self.client.get('/api/alerts/nearby/')
+        self.assertEqual(response.status_code, 400)
+
+    def test_rejects_non_numeric_params(self):
+        response = self.client.get('/api/alerts/nearby/', {'lat': 'abc', 'lng': '-99.1'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_filters_by_radius_and_orders_by_distance(self):
+        response = self.client.get('/api/alerts/nearby/', {'lat': 19.4326, 'lng': -99.1332, 'radius': 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['id'] for item in response.data], [self.center.id, self.close.id])
+        self.assertEqual(response.data[0]['distance'], 0)
+        self.assertAlmostEqual(response.data[1]['distance'], 0.82, delta=0.01)
+
+    def test_limit(self):
+        response = self.client.get('/api/alerts/nearby/', {'lat': 19.4326, 'lng': -99.1332, 'radius': 50, 'limit': 1})
+        self.assertEqual([item['id'] for item in response.data], [self.center.id])
+
+
+class AlertListQueryCountTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.viewer = User.objects.create_user('viewer')
+        self.client.force_authenticate(self.viewer)
+
+    def add_alerts(self, count):
+        for i in range(count):
+            author = User.objects.create_user(f'author{Alert.objects.count()}')
+            alert = make_alert(author)
+            AlertComment.objects.create(user=author, alert=alert, text='Sigue cerrado')
+            AlertComment.objects.create(user=self.viewer, alert=alert, text='Confirmo')
+            AlertReaction.objects.create(user=self.viewer, alert=alert, reaction_type='like')
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response
+
+    def test_list_query_count_is_constant(self):
+        self.add_alerts(2)
+        small, _ = self.count_queries('/api/alerts/')
+        self.add_alerts(8)
+        large, response = self.count_queries('/api/alerts/')
+        self.assertEqual(small, large)
+
+        item = response.data['results'][0]
+        self.assertEqual(item['user_reaction'], 'like')
+        self.assertEqual(item['comments_count'], 2)
+        self.assertNotIn('comments', item)
+
+        # Embedding comments on request stays a single prefetch
+        small, _ = self.count_queries('/api/alerts/?expand=user,comments')
+        self.add_alerts(3)
+        large, response = self.count_queries('/api/alerts/?expand=user,comments')
+        self.assertEqual(small, large)
+        self.assertEqual(len(response.data['results'][0]['comments']), 2)
+
+    def test_my_alerts_and_nearby_query_count_is_constant(self):
+        self.add_alerts(1)
+        make_alert(self.viewer)
+        small_mine, _ = self.count_queries('/api/alerts/my_alerts/')
+        small_nearby, _ = self.count_queries('/api/alerts/nearby/?lat=19.4326&lng=-99.1332')
+        self.add_alerts(5)
+        make_alert(self.viewer)
+        make_alert(self.viewer)
+        large_mine, response = self.count_queries('/api/alerts/my_alerts/')
+        self.assertEqual(len(response.data), 3)
+        large_nearby, _ = self.count_queries('/api/alerts/nearby/?lat=19.4326&lng=-99.1332')
+        self.assertEqual(small_mine, large_mine)
+        self.assertEqual(small_nearby, large_nearby)
+
+
+class AlertPaginationTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user('reporter')
+        self.alerts = [make_alert(self.user, title=f'Alerta {i}') for i in range(5)]
+        AlertComment.objects.create(user=self.user, alert=self.alerts[0], text='Sigue ahí')
+
+    def test_cursor_pages_cover_every_alert_once(self):
+        seen = []
+        url = '/api/alerts/?page_size=2'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(len(response.data['results']), 2)
+            seen.extend(item['id'] for item in response.data['results'])
+            url = response.data['next']
+        self.assertEqual(seen, [alert.id for alert in reversed(self.alerts)])
+
+    def test_sparse_fields(self):
+        response = self.client.get('/api/alerts/', {'fields': 'id,latitude,longitude,category,status'})
+        self.assertEqual(
+            set(response.data['results'][0]),
+            {'id', 'latitude', 'longitude', 'category', 'status'}
+        )
+
+    def test_expand_collapses_unlisted_relations(self):
+        response = self.client.get('/api/alerts/', {'expand': 'comments'})
+        oldest = response.data['results'][-1]
+        self.assertEqual(oldest['user'], self.user.id)
+        self.assertEqual(len(oldest['comments']), 1)
+
+        response = self.client.get('/api/alerts/', {'expand': 'user'})
+        oldest = response.data['results'][-1]
+        self.assertEqual(oldest['user']['username'], 'reporter')
+        self.assertNotIn('comments', oldest)
+        self.assertEqual(oldest['comments_count'], 1)
+
+
+class CommentTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user('vecino')
+        self.alert = make_alert(self.user)
+
+    def test_comments_count_follows_creates_and_deletes(self):
+        comments = [
+            AlertComment.objects.create(user=self.user, alert=self.alert, text=f'Comentario {i}')
+            for i in range(3)
+        ]
+        self.alert.refresh_from_db()
+        self.assertEqual(self.alert.comments_count, 3)
+
+        comments[0].delete()
+        self.alert.refresh_from_db()
+        self.assertEqual(self.alert.comments_count, 2)
+
+        self.client.force_authenticate(self.user)
+        response = self.client.post(f'/api/alerts/{self.alert.id}/comments/', {'text': 'Ya llegó la patrulla'})
+        self.assertEqual(response.status_code, 201)
+        response = self.client.get(f'/api/alerts/{self.alert.id}/')
+        self.assertEqual(response.data['comments_count'], 3)
+        self.assertNotIn('comments', response.data)
+
+    def test_comment_pages_cover_every_comment_once(self):
+        comments = [
+            AlertComment.objects.create(user=self.user, alert=self.alert, text=f'Comentario {i}')
+            for i in range(5)
+        ]
+        seen = []
+        url = f'/api/alerts/{self.alert.id}/comments/?page_size=2'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(len(response.data['results']), 2)
+            seen.extend(item['id'] for item in response.data['results'])
+            url = response.data['next']
+        self.assertEqual(seen, [comment.id for comment in reversed(comments)])
+
+    def test_comment_page_uses_alert_index(self):
+        plan = str(self.alert.comments.order_by('-created_at', '-id').explain())
+        self.assertIn('comment_alert_created_idx', plan)
+
+
+@skipUnlessDBFeature('supports_explaining_query_execution')
+class QueryPlanTests(TestCase):
+    """Every hot query must be answered from an index, never a full table scan"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('reporter')
+        cls.alert = make_alert(cls.user)
+
+    def assertUsesIndex(self, queryset, ordered=False):
+        plan = str(queryset.explain())
+        if connection.vendor != 'sqlite':
+            self.assertNotIn('Seq Scan', plan)
+            return
+        # "SCAN <table>" without "USING ... INDEX" reads every row
+        self.assertIsNone(re.search(r'\bSCAN \w+(?! USING (COVERING )?INDEX)\b', plan), plan)
+        if ordered:
+            self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_alert_list_pages(self):
+        alerts = Alert.objects.order_by('-created_at', '-id')
+        self.assertUsesIndex(alerts[:51], ordered=True)
+        self.assertUsesIndex(alerts.filter(created_at__lt=timezone.now())[:51], ordered=True)
+
+    def test_nearby_and_clusters(self):
+        min_lat, max_lat, min_lng, max_lng = bounding_box(19.4326, -99.1332, 5)
+        active = Alert.objects.filter(status='active')
+        self.assertUsesIndex(active.filter(bbox_q(min_lat, max_lat, min_lng, max_lng)))
+        self.assertUsesIndex(
+            active.filter(category__in=['flooding', 'police']).filter(
+                bbox_q(min_lat, max_lat, min_lng, max_lng)
+            ).order_by('-created_at')[:100]
+        )
+
+    def test_route_corridor(self):
+        points = [(19.40 + i * 0.0005, -99.20 + i * 0.0004) for i in range(200)]
+        boxes = RouteCorridor(points, 0.1).bounding_boxes()
+        self.assertUsesIndex(Alert.objects.filter(Q(*[Q(status='active') & bbox_q(*box) for box in boxes], _connector=Q.OR)))
+
+    def test_my_alerts(self):
+        self.assertUsesIndex(Alert.objects.filter(user=self.user).order_by('-created_at', '-id'), ordered=True)
+
+    def test_changes_feed(self):
+        now = timezone.now()
+        self.assertUsesIndex(
+            Alert.objects.filter(updated_at__gt=now - timedelta(hours=1), updated_at__lte=now).order_by('updated_at', 'id')
+        )
+        self.assertUsesIndex(AlertTombstone.objects.filter(deleted_at__gt=now - timedelta(hours=1)))
+
+    def test_statistics(self):
+        self.assertUsesIndex(Alert.objects.filter(user=self.user, status='resolved'))
+
+    def test_expiry_sweep(self):
+        self.assertUsesIndex(
+            Alert.objects.filter(status='active', category='traffic_jam', created_at__lt=timezone.now())
+            .order_by('created_at', 'id')[:500]
+        )
+
+    def test_admin_filters(self):
+        self.assertUsesIndex(Alert.objects.filter(category='flooding'))
+        self.assertUsesIndex(Alert.objects.filter(status='resolved'))
+        self.assertUsesIndex(Alert.objects.filter(category='flooding', status='active'))
+
+    def test_comments_and_reactions(self):
+        self.assertUsesIndex(self.alert.comments.order_by('-created_at', '-id')[:21], ordered=True)
+        self.assertUsesIndex(AlertReaction.objects.filter(user=self.user, alert_id__in=[self.alert.id]))
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('searcher')
+        self.client = APIClient()
+        self.pothole = make_alert(self.user, title='Bache profundo', description='En el carril derecho', category='road_hazard')
+        self.traffic = make_alert(self.user, title='Tráfico lento', description='Por un bache en Insurgentes')
+        self.flood = make_alert(
+            self.user, latitude=20.6597, longitude=-103.3496,
+            title='Calle inundada', description='No pasar', category='flooding',
+        )
+
+    def search(self, **params):
+        response = self.client.get('/api/alerts/search/', params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return [item['id'] for item in response.json()]
+
+    def test_ranked_matches(self):
+        # Title matches rank above description matches
+        self.assertEqual(self.search(q='bache'), [self.pothole.pk, self.traffic.pk])
+        # Accents are ignored and the last word matches as a prefix
+        self.assertEqual(self.search(q='trafico len'), [self.traffic.pk])
+        self.assertEqual(self.search(q='bache "OR" inundada'), [])
+
+    def test_index_follows_writes(self):
+        comment = AlertComment.objects.create(alert=self.flood, user=self.user, text='Sigue el bache')
+        self.assertIn(self.flood.pk, self.search(q='bache'))
+        comment.delete()
+        self.assertNotIn(self.flood.pk, self.search(q='bache'))
+        self.pothole.title = 'Hoyo profundo'
+        self.pothole.description = 'Carril derecho'
+        self.pothole.save()
+        self.assertEqual(self.search(q='bache'), [self.traffic.pk])
+        self.traffic.delete()
+        self.assertEqual(self.search(q='bache'), [])
+
+    def test_filters(self):
+        self.assertEqual(self.search(q='bache', categories='road_hazard'), [self.pothole.pk])
+        self.assertEqual(self.search(q='bache calle inundada', status='active'), [])
+        self.assertEqual(self.search(q='inundada', bbox='20,-104,21,-103'), [self.flood.pk])
+        self.assertEqual(self.search(q='bache', bbox='20,-104,21,-103'), [])
+        self.assertEqual(self.search(q='bache', limit=1), [self.pothole.pk])
+        self.assertEqual(self.client.get('/api/alerts/search/', {'q': ' '}).status_code, 400)
+        self.assertEqual(self.client.get('/api/alerts/search/', {'q': 'bache', 'limit': 0}).status_code, 400)
+
+    def test_fallback_without_index(self):
+        with mock.patch('api.search.has_search_index', return_value=False):
+            self.assertEqual(set(self.search(q='bache')), {self.pothole.pk, self.traffic.pk})
+            AlertComment.objects.create(alert=self.flood, user=self.user, text='Sigue el bache')
+            self.assertEqual(self.search(q='bache', categories='flooding'), [self.flood.pk])
+
+    def test_match_drives_the_query(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('FTS5 index is SQLite only')
+        # The FTS5 match is the outer loop; alerts are looked up by id per match
+        plan = str(search_alerts(Alert.objects.filter(status='active'), ['bache']).explain())
+        self.assertRegex(plan, r'SCAN api_alert_search VIRTUAL TABLE')
+        self.assertRegex(plan, r'SEARCH api_alert USING INTEGER PRIMARY KEY')
+
+    def test_triggers_survive_migrations(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('FTS5 index is SQLite only')
+        # The test database is built by running every migration
+        self.assertEqual(missing_search_triggers('default'), [])
+        self.assertEqual(check_search_triggers(None, databases=['default']), [])
+
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TRIGGER {SEARCH_TRIGGERS[0]}')
+        self.assertEqual(missing_search_triggers('default'), [SEARCH_TRIGGERS[0]])
+        self.assertEqual([error.id for error in check_search_triggers(None, databases=['default'])], ['api.E001'])
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user('reporter')
+        self.inside = make_alert(self.user, category='flooding')
+        self.resolved = make_alert(self.user, status='resolved')
+        self.far = make_alert(self.user, latitude=20.6597, longitude=-103.3496)
+
+    def export(self, **params):
+        response = self.client.get('/api/alerts/export/', params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_geojson_feature_collection(self):
+        data = json.loads(self.export(bbox='19.3,-99.3,19.6,-99.0'))
+        self.assertEqual(data['type'], 'FeatureCollection')
+        self.assertEqual([feature['id'] for feature in data['features']], [self.inside.id, self.resolved.id])
+        feature = data['features'][0]
+        self.assertEqual(feature['geometry'], {'type': 'Point', 'coordinates': [-99.1332, 19.4326]})
+        self.assertEqual(feature['properties']['category'], 'flooding')
+
+        self.assertEqual(json.loads(self.export(bbox='0,0,1,1'))['features'], [])
+
+    def test_ndjson_with_filters(self):
+        lines = self.export(output='ndjson', status='active').splitlines()
+        self.assertEqual([json.loads(line)['id'] for line in lines], [self.inside.id, self.far.id])
+
+        lines = self.export(output='ndjson', categories='flooding', since=self.inside.created_at.isoformat())
+        self.assertEqual([json.loads(line)['id'] for line in lines.splitlines()], [self.inside.id])
+
+        self.assertEqual(self.export(output='ndjson', until='2000-01-01T00:00:00Z'), '')
+
+    def test_rejects_bad_filters(self):
+        for params in ({'output': 'csv'}, {'bbox': 'a,b'}, {'since': 'ayer'}, {'status': 'deleted'}):
+            response = self.client.get('/api/alerts/export/', params)
+            self.assertEqual(response.status_code, 400, params)
+
+
+@override_settings(PERFORMANCE_METRICS=True, PERFORMANCE_SLOW_REQUEST_MS=0)
+class PerformanceMiddlewareTests(TestCase):
+    def setUp(self):
+        registry.reset()
+        self.client = APIClient()
+        self.user = User.objects.create_user('reporter')
+        make_alert(self.user)
+
+    def test_server_timing_and_slow_request_log(self):
+        self.client.force_authenticate(self.user)
+        with self.assertLogs('api.performance', level='WARNING') as logs:
+            response = self.client.get('/api/alerts/my_alerts/')
+        self.assertEqual(response.status_code, 200)
+        timing = response['Server-Timing']
+        self.assertRegex(timing, r'db;dur=[\d.]+;desc="[1-9]\d* queries"')
+        self.assertRegex(timing, r'serializer;dur=[\d.]+')
+        self.assertRegex(timing, r'total;dur=[\d.]+')
+        self.assertIn('SELECT', logs.output[-1])
+
+    @override_settings(PERFORMANCE_SLOW_REQUEST_MS=60000)
+    def test_metrics_endpoint_is_admin_only(self):
+        self.client.get('/api/alerts/')
+        self.assertEqual(self.client.get('/api/metrics/').status_code, 401)
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.client.get('/api/metrics/').status_code, 403)
+
+        admin = User.objects.create_user('admin', is_staff=True)
+        self.client.force_authenticate(admin)
+        response = self.client.get('/api/metrics/')
+        self.assertEqual(response.status_code, 200)
+        body = response.content.decode()
+        self.assertIn('weyalert_request_duration_seconds_bucket{endpoint="alert-list",method="GET",status="200",le="+Inf"} 1', body)
+        self.assertIn('weyalert_request_duration_recent_seconds{endpoint="alert-list",method="GET",status="200",quantile="0.99"}', body)
+        self.assertIn('weyalert_db_queries_total{endpoint="alert-list"', body)
+
+    @override_settings(PERFORMANCE_METRICS=False)
+    def test_disabled_by_default(self):
+        response = APIClient().get('/api/alerts/')
+        self.assertNotIn('Server-Timing', response)
+
+
+class AlertChangesTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user('reporter')
+        self.client.force_authenticate(self.user)
+        self.unchanged = make_alert(self.user, title='Sin cambios')
+        self.updated = make_alert(self.user, title='Actualizada')
+        self.deleted = make_alert(self.user, title='Eliminada')
+        # Outside the overlap repeated before each watermark
+        Alert.objects.update(updated_at=timezone.now() - timedelta(hours=1))
+
+    def test_snapshot_without_since(self):
+        response = self.client.get('/api/alerts/changes/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['reset'])
+        self.assertEqual(len(response.data['alerts']), 3)
+        self.assertIsNone(response.data['next'])
+
+    def test_snapshot_is_paginated(self):
+        response = self.client.get('/api/alerts/changes/', {'page_size': 2})
+        self.assertTrue(response.data['reset'])
+        self.assertEqual(len(response.data['alerts']), 2)
+        rest = self.client.get(response.data['next'])
+        self.assertIsNone(rest.data['next'])
+        self.assertEqual(
+            sorted(item['id'] for item in response.data['alerts'] + rest.data['alerts']),
+            sorted([self.unchanged.id, self.updated.id, self.deleted.id])
+        )
+
+    def test_returns_only_changes_after_watermark(self):
+        watermark = self.client.get('/api/alerts/changes/').data['watermark']
+
+        self.client.post(f'/api/alerts/{self.updated.id}/close/')
+        self.client.delete(f'/api/alerts/{self.deleted.id}/')
+        created = make_alert(self.user, title='Nueva')
+
+        response = self.client.get('/api/alerts/changes/', {'since': watermark})
+        self.assertFalse(response.data['reset'])
+        self.assertEqual(
+            [(item['id'], item['status']) for item in response.data['alerts']],
+            [(self.updated.id, 'resolved'), (created.id, 'active')]
+        )
+        self.assertEqual(response.data['deleted'], [self.deleted.id])
+
+        # Changes made well before the watermark aren't sent again
+        Alert.objects.update(updated_at=timezone.now() - timedelta(hours=1))
+        AlertTombstone.objects.update(deleted_at=timezone.now() - timedelta(hours=1))
+        response = self.client.get('/api/alerts/changes/', {'since': response.data['watermark']})
+        self.assertEqual(response.data['alerts'], [])
+        self.assertEqual(response.data['deleted'], [])
+
+    def test_late_commit_reaches_next_poll(self):
+        watermark = self.client.get('/api/alerts/changes/').data['watermark']
+        # Saved just before the watermark but committed after that poll read
+        Alert.objects.filter(pk=self.updated.pk).update(
+            status='resolved', updated_at=parse_datetime(watermark) - timedelta(seconds=5)
+        )
+        response = self.client.get('/api/alerts/changes/', {'since': watermark})
+        self.assertEqual([item['id'] for item in response.data['alerts']], [self.updated.id])
+
+    def test_reactions_count_as_changes(self):
+        watermark = self.client.get('/api/alerts/changes/').data['watermark']
+        self.client.post(f'/api/alerts/{self.unchanged.id}/react/', {'reaction_type': 'like'})
+        response = self.client.get('/api/alerts/changes/', {'since': watermark})
+        self.assertEqual([item['id'] for item in response.data['alerts']], [self.unchanged.id])
+
+    def test_rejects_invalid_since(self):
+        response = self.client.get('/api/alerts/changes/', {'since': 'ayer'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_deletion_records_tombstone(self):
+        alert_id = self.deleted.id
+        self.deleted.delete()
+        self.assertTrue(AlertTombstone.objects.filter(alert_id=alert_id).exists())
+
+
+class TokenCacheTests(TestCase):
+    def setUp(self):
+        local_token_cache.clear()
+        self.user = User.objects.create_user('reporter', password='secreta-123')
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_cached_token_saves_a_query_per_request(self):
+        make_alert(self.user)
+        first = self.count_queries('/api/alerts/my_alerts/')
+        second = self.count_queries('/api/alerts/my_alerts/')
+        self.assertEqual(second, first - 1)
+
+    def test_logout_revokes_cached_token(self):
+        self.client.get('/api/alerts/my_alerts/')
+        response = self.client.post('/api/auth/logout/')
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get('/api/alerts/my_alerts/')
+        self.assertEqual(response.status_code, 401)
+
+    def test_password_change_and_deactivation_refresh_cached_user(self):
+        self.client.get('/api/alerts/my_alerts/')
+        response = self.client.post('/api/user/change-password/', {
+            'current_password': 'secreta-123', 'new_password': 'otra-clave-456',
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(local_token_cache.get(self.token.key))
+
+        self.client.get('/api/alerts/my_alerts/')
+        user = User.objects.get(pk=self.user.pk)
+        user.is_active = False
+        user.save()
+        response = self.client.get('/api/alerts/my_alerts/')
+        self.assertEqual(response.status_code, 401)
+
+
+class BenchmarkCommandTests(TestCase):
+    def test_generate_and_benchmark(self):
+        out = StringIO()
+        call_command(
+            'generate_city_data', '--alerts', '300', '--users', '20', '--hotspots', '5',
+            '--batch-size', '100', stdout=out,
+        )
+        self.assertEqual(Alert.objects.count(), 300)
+        self.assertEqual(UserProfile.objects.filter(user__username__startswith='city-').count(), 20)
+        # Cached counters match the generated rows
+        alert = Alert.objects.order_by('-comments_count').first()
+        self.assertEqual(alert.comments_count, alert.comments.count())
+        self.assertEqual(alert.likes_count, alert.reactions.filter(reaction_type='like').count())
+        self.assertEqual(
+            UserProfile.objects.filter(user__username__startswith='city-').aggregate(total=Sum('alerts_reported'))['total'],
+            300,
+        )
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        output = f'{directory}/bench.json'
+        call_command('bench_endpoints', '--requests', '5', '--warmup', '1', '--output', output, stdout=out)
+        with open(output) as results:
+            report = json.load(results)
+        self.assertEqual(set(report['results']), {'list', 'detail', 'nearby', 'react', 'comments', 'categories'})
+        for row in report['results'].values():
+            self.assertEqual(row['errors'], 0)
+            self.assertLessEqual(row['p50_ms'], row['p99_ms'])
+
+
+class AsyncReadViewTests(TestCase):
+    def setUp(self):
+        caches['responses'].clear()
+        self.user = User.objects.create_user('async-reader')
+        self.token = Token.objects.create(user=self.user)
+        self.alerts = [
+            Alert.objects.create(
+                user=self.user, title=f'Alerta {i}', description='Cerca', category='traffic_jam',
+                latitude=19.4326 + i * 0.001, longitude=-99.1332,
+            )
+            for i in range(3)
+        ]
+        AlertComment.objects.create(alert=self.alerts[0], user=self.user, text='Sigue ahí')
+        AlertReaction.objects.create(alert=self.alerts[1], user=self.user, reaction_type='like')
+        self.paths = [
+            ('/api/alerts/', {}),
+            ('/api/alerts/', {'fields': 'title,user_reaction', 'page_size': 2}),
+            (f'/api/alerts/{self.alerts[1].pk}/', {}),
+            (f'/api/alerts/{self.alerts[0].pk}/', {'fields': 'title,user_reaction'}),
+            ('/api/alerts/nearby/', {'lat': 19.4326, 'lng': -99.1332, 'radius': 2}),
+            ('/api/alerts/nearby/', {'lat': 'x', 'lng': -99.1332}),
+            (f'/api/alerts/{self.alerts[0].pk}/comments/', {}),
+            ('/api/alerts/999999/', {}),
+            ('/api/categories/', {}),
+        ]
+
+    def sync_responses(self, **headers):
+        client = APIClient()
+        return [client.get(path, params, headers=headers) for path, params in self.paths]
+
+    async def async_responses(self, **headers):
+        with override_settings(ROOT_URLCONF='backend.async_urls'):
+            return [await self.async_client.get(path, params, headers=headers) for path, params in self.paths]
+
+    async def test_responses_match_sync_views(self):
+        for headers in ({}, {'Authorization': f'Token {self.token.key}'}):
+            expected = await sync_to_async(self.sync_responses)(**headers)
+            # Once against a cold response cache and once against a warm one
+            for _ in range(2):
+                caches['responses'].clear()
+                for sync_response, async_response in zip(expected, await self.async_responses(**headers)):
+                    self.assertEqual(async_response.status_code, sync_response.status_code)
+                    self.assertEqual(async_response.content, sync_response.content)
+                    self.assertEqual(async_response.get('ETag'), sync_response.get('ETag'))
+
+    async def test_user_reaction_and_not_modified(self):
+        headers = {'Authorization': f'Token {self.token.key}'}
+        with override_settings(ROOT_URLCONF='backend.async_urls'):
+            response = await self.async_client.get(f'/api/alerts/{self.alerts[1].pk}/', headers=headers)
+            self.assertEqual(response.json()['user_reaction'], 'like')
+            response = await self.async_client.get(
+                f'/api/alerts/{self.alerts[1].pk}/', headers={**headers, 'If-None-Match': response['ETag']}
+            )
+            self.assertEqual(response.status_code, 304)
+            response = await self.async_client.get('/api/alerts/', headers={'Authorization': 'Token invalido'})
+            self.assertEqual(response.status_code, 401)
+
+    @override_settings(ROOT_URLCONF='backend.async_urls')
+    def test_other_methods_use_sync_views(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.post('/api/alerts/', {
+            'category': 'road_hazard', 'title': 'Bache', 'description': 'Profundo',
+            'latitude': 19.43, 'longitude': -99.13,
+        })
+        self.assertEqual(response.status_code, 201)
+        response = client.post(f'/api/alerts/{self.alerts[0].pk}/comments/', {'text': 'Ya pasó'})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(client.delete(f'/api/alerts/{self.alerts[2].pk}/').status_code, 204)
+        # List actions aren't taken for alert ids by the async detail route
+        for path in ('/api/alerts/changes/', '/api/alerts/my_alerts/', '/api/alerts/export/',
+                     '/api/alerts/search/?q=bache'):
+            self.assertEqual(client.get(path).status_code, 200, path)
+
+
+class AsgiBenchmarkTests(TransactionTestCase):
+    databases = '__all__'
+
+    def test_benchmark_compares_sync_and_async(self):
+        user = User.objects.create_user('asgi-bench')
+        for i in range(5):
+            Alert.objects.create(
+                user=user, title=f'Alerta {i}', description='Benchmark', category='traffic_jam',
+                latitude=19.4326 + i * 0.001, longitude=-99.1332,
+            )
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        output = f'{directory}/asgi.json'
+        call_command('bench_asgi', '--connections', '1,4', '--requests', '3', '--output', output, stdout=StringIO())
+        with open(output) as results:
+            report = json.load(results)
+        self.assertEqual(set(report['results']), {'sync', 'async'})
+        for mode in report['results'].values():
+            self.assertEqual(set(mode), {'1', '4'})
+            for row in mode.values():
+                self.assertEqual(row['errors'], 0)
+                self.assertGreater(row['throughput_rps'], 0)
+
+
+class AlertExpiryTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('reporter')
+
+    def make_aged_alert(self, hours, **kwargs):
+        alert = make_alert(self.user, **kwargs)
+        Alert.objects.filter(pk=alert.pk).update(created_at=timezone.now() - timedelta(hours=hours))
+        return alert
+
+    def test_expires_by_category_ttl(self):
+        jam = self.make_aged_alert(3, category='traffic_jam')
+        works = self.make_aged_alert(3, category='construction')
+        closed = self.make_aged_alert(10, category='traffic_jam', status='resolved')
+
+        result = expire_stale_alerts(publish=False)
+
+        self.assertEqual(result['expired'], 1)
+        self.assertGreaterEqual(result['lag_seconds'], 3600 - 60)
+        statuses = dict(Alert.objects.values_list('id', 'status'))
+        self.assertEqual(statuses[jam.id], 'expired')
+        self.assertEqual(statuses[works.id], 'active')
+        self.assertEqual(statuses[closed.id], 'resolved')
+
+    def test_drains_backlog_in_bounded_batches(self):
+        for _ in range(5):
+            self.make_aged_alert(30, category='flooding')
+        before = timezone.now()
+
+        with CaptureQueriesContext(connection) as queries:
+            result = expire_stale_alerts(batch_size=2, publish=False)
+
+        self.assertEqual(result['expired'], 5)
+        # One per batch on the alerts table (rollup counters are updated apart)
+        updates = [query for query in queries if query['sql'].startswith('UPDATE "api_alert" ')]
+        self.assertEqual(len(updates), 3)
+        self.assertFalse(Alert.objects.filter(status='active').exists())
+        # Bumped so /changes/ picks the expiry up
+        self.assertFalse(Alert.objects.filter(updated_at__lt=before).exists())
+
+    @override_settings(ALERT_EVENTS_BROKER='api.realtime.LocalBroker')
+    def test_publishes_lean_events_after_the_batch(self):
+        broker = get_broker()
+        broker.events.clear()
+        alerts = [self.make_aged_alert(30, category='flooding') for _ in range(3)]
+        for alert in alerts:
+            for i in range(5):
+                AlertComment.objects.create(alert=alert, user=self.user, text=f'Comentario {i}')
+
+        with self.captureOnCommitCallbacks(execute=True), CaptureQueriesContext(connection) as queries:
+            expire_stale_alerts()
+
+        self.assertEqual(
+            sorted(event['alert']['id'] for event in broker.events if event['type'] == 'alert.expired'),
+            sorted(alert.id for alert in alerts)
+        )
+        self.assertFalse([query for query in queries if 'api_alertcomment' in query['sql']])
+
+    def test_command_reports_throughput(self):
+        self.make_aged_alert(30, category='flooding')
+        out = StringIO()
+        call_command('expire_alerts', '--no-events', stdout=out)
+        self.assertIn('1 alertas expiradas', out.getvalue())
+        self.assertIn('filas/s', out.getvalue())
+
+
+@override_settings(ALERT_EVENTS_BROKER='api.realtime.LocalBroker')
+class RealtimeEventTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user('reporter')
+        self.client.force_authenticate(self.user)
+        self.broker = get_broker()
+        self.broker.events.clear()
+
+    def test_views_publish_events_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/alerts/', {
+                'title': 'Inundación', 'description': 'Paso a desnivel', 'category': 'flooding',
+                'latitude': 19.43, 'longitude': -99.13,
+            }, format='json')
+        alert_id = Alert.objects.get().id
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/alerts/{alert_id}/react/', {'reaction_type': 'like'})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/alerts/{alert_id}/close/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(f'/api/alerts/{alert_id}/')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            [event['type'] for event in self.broker.events],
+            ['alert.created', 'alert.reacted', 'alert.closed', 'alert.deleted']
+        )
+        self.assertEqual(self.broker.events[1]['alert']['likes_count'], 1)
+        self.assertNotIn('user_reaction', self.broker.events[1]['alert'])
+        self.assertEqual(self.broker.events[-1]['alert'], {'id': alert_id})
+
+    def test_events_are_built_after_the_write_transaction(self):
+        # Serializing inside the view's atomic block would hold the write lock
+        depth = len(connection.atomic_blocks)
+        published = []
+
+        def record(event_type, alert):
+            published.append((event_type, len(connection.atomic_blocks) - depth))
+
+        with mock.patch('api.views.publish_alert_event', side_effect=record):
+            self.client.post('/api/alerts/', {
+                'title': 'Inundación', 'description': 'Paso a desnivel', 'category': 'flooding',
+                'latitude': 19.43, 'longitude': -99.13,
+            }, format='json')
+            alert_id = Alert.objects.get().id
+            self.client.patch(f'/api/alerts/{alert_id}/', {'title': 'Inundación grave'}, format='json')
+            self.client.post(f'/api/alerts/{alert_id}/react/', {'reaction_type': 'like'})
+            self.client.post(f'/api/alerts/{alert_id}/close/')
+        self.assertEqual(published, [('created', 0), ('updated', 0), ('reacted', 0), ('closed', 0)])
+
+    def test_publishing_does_not_load_comments(self):
+        alert = make_alert(self.user)
+        for i in range(10):
+            AlertComment.objects.create(alert=alert, user=self.user, text=f'Comentario {i}')
+        alert = Alert.objects.get(pk=alert.pk)
+
+        # The author and their profile, whatever the number of comments
+        with self.assertNumQueries(2), self.captureOnCommitCallbacks(execute=True):
+            publish_alert_event('updated', alert)
+        self.assertNotIn('comments', self.broker.events[0]['alert'])
+        self.assertEqual(self.broker.events[0]['alert']['user']['username'], 'reporter')
+
+    def test_websocket_receives_only_matching_events(self):
+        inside = {'type': 'alert.created', 'category': 'flooding', 'latitude': 19.43, 'longitude': -99.13, 'alert': {'id': 1}}
+        outside = {**inside, 'latitude': 25.0, 'alert': {'id': 2}}
+        other_category = {**inside, 'category': 'police', 'alert': {'id': 3}}
+
+        async def scenario():
+            incoming = asyncio.Queue()
+            sent = []
+            await incoming.put({'type': 'websocket.connect'})
+
+            async def send(message):
+                sent.append(message)
+
+            scope = {'type': 'websocket', 'path': '/ws/alerts/', 'query_string': b'bbox=19,-100,20,-99&categories=flooding'}
+            connection = asyncio.ensure_future(alert_events_websocket(scope, incoming.get, send))
+            while not sent:
+                await asyncio.sleep(0)
+            for event in (outside, other_category, inside):
+                self.broker.publish(event)
+            while len(sent) < 2:
+                await asyncio.sleep(0.01)
+            await incoming.put({'type': 'websocket.disconnect'})
+            await connection
+            return sent
+
+        sent = asyncio.run(scenario())
+        self.assertEqual(sent[0], {'type': 'websocket.accept'})
+        self.assertEqual([json.loads(message['text'])['alert']['id'] for message in sent[1:]], [1])
+        self.assertFalse(self.broker._subscriptions)
+
+
+class UserStatisticsTests(TestCase):
+    STAT_FIELDS = ('alerts_reported', 'alerts_resolved', 'reputation_points')
+
+    def setUp(self):
+        self.author = User.objects.create_user('author')
+        self.fans = [User.objects.create_user(f'fan{i}') for i in range(3)]
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def snapshot(self):
+        return {
+            profile.user_id: tuple(getattr(profile, field) for field in self.STAT_FIELDS)
+            for profile in UserProfile.objects.all()
+        }
+
+    def test_incremental_updates_match_full_recompute(self):
+        author = self.client_for(self.author)
+        for i in range(3):
+            author.post('/api/alerts/', {
+                'title': f'Bache {i}', 'description': 'Profundo', 'category': 'road_hazard',
+                'latitude': 19.43, 'longitude': -99.13,
+            }, format='json')
+        ids = list(Alert.objects.order_by('id').values_list('id', flat=True))
+
+        for fan in self.fans:
+            self.client_for(fan).post(f'/api/alerts/{ids[0]}/react/', {'reaction_type': 'like'})
+        self.client_for(self.fans[0]).post(f'/api/alerts/{ids[0]}/react/', {'reaction_type': 'dislike'})
+        self.client_for(self.fans[1]).post(f'/api/alerts/{ids[0]}/react/', {'reaction_type': 'remove'})
+        self.client_for(self.fans[2]).post(f'/api/alerts/{ids[1]}/react/', {'reaction_type': 'dislike'})
+        author.post(f'/api/alerts/{ids[0]}/close/')
+        author.post(f'/api/alerts/{ids[2]}/close/')
+        author.patch(f'/api/alerts/{ids[2]}/', {'status': 'active'}, format='json')
+        author.delete(f'/api/alerts/{ids[1]}/')
+
+        incremental = self.snapshot()
+        # 2 reported, 1 resolved, 1 like and 1 dislike left on the first alert
+        self.assertEqual(incremental[self.author.id], (2, 1, 2 * 10 + 20 + 5 - 3))
+
+        UserProfile.objects.update(alerts_reported=0, alerts_resolved=0, reputation_points=0)
+        call_command('recompute_statistics', stdout=StringIO())
+        self.assertEqual(self.snapshot(), incremental)
+
+
+class ReactionTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user('author')
+        self.fan = User.objects.create_user('fan')
+        self.alert = make_alert(self.author)
+        self.client = APIClient()
+        self.client.force_authenticate(self.fan)
+
+    def react(self, reaction_type):
+        response = self.client.post(f'/api/alerts/{self.alert.id}/react/', {'reaction_type': reaction_type})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_transitions_apply_exact_deltas(self):
+        steps = [
+            ('like', 1, 0, 'like'),
+            ('like', 1, 0, 'like'),
+            ('dislike', 0, 1, 'dislike'),
+            ('remove', 0, 0, None),
+            ('remove', 0, 0, None),
+            ('dislike', 0, 1, 'dislike'),
+        ]
+        for reaction_type, likes, dislikes, user_reaction in steps:
+            data = self.react(reaction_type)
+            self.assertEqual((data['likes_count'], data['dislikes_count'], data['user_reaction']), (likes, dislikes, user_reaction))
+        self.assertEqual(AlertReaction.objects.count(), 1)
+        self.author.profile.refresh_from_db()
+        self.assertEqual(self.author.profile.reputation_points, -3)
+
+    def test_rejects_unknown_reaction(self):
+        response = self.client.post(f'/api/alerts/{self.alert.id}/react/', {'reaction_type': 'love'})
+        self.assertEqual(response.status_code, 400)
+
+
+class ReactionConcurrencyTests(FileDatabaseMixin, TransactionTestCase):
+    # Includes the read replica when the concurrent SQLite profile is on
+    databases = '__all__'
+
+    def test_concurrent_reactions_keep_exact_counts(self):
+        output = StringIO()
+        call_command('bench_reactions', '--users', '24', '--threads', '6', stdout=output)
+        self.assertIn('Contadores exactos', output.getvalue())
+
+    def test_concurrent_read_write_benchmark(self):
+        output = StringIO()
+        call_command('bench_concurrency', '--readers', '2', '--writers', '2', '--seconds', '0.5', stdout=output)
+        self.assertRegex(output.getvalue(), r'lecturas/s .* escrituras/s .* errores por bloqueo')
+        self.assertFalse(User.objects.filter(username__startswith='bench-rw-').exists())
+
+
+class DatabaseRouterTests(TestCase):
+    def setUp(self):
+        self.router = PrimaryReplicaRouter()
+
+    def test_reads_use_replica_outside_transactions(self):
+        replica = {**connections.settings['default'], 'TEST': {'MIRROR': 'default'}}
+        with mock.patch.dict(connections.settings, {'replica': replica}):
+            with mock.patch.object(connections['default'], 'in_atomic_block', False):
+                self.assertEqual(self.router.db_for_read(Alert), 'replica')
+            # TestCase runs inside a transaction on the primary
+            self.assertEqual(self.router.db_for_read(Alert), 'default')
+        self.assertEqual(self.router.db_for_write(Alert), 'default')
+        self.assertFalse(self.router.allow_migrate('replica', 'api'))
+
+    def test_reads_stay_on_primary_without_replica(self):
+        with mock.patch.dict(connections.settings):
+            connections.settings.pop('replica', None)
+            with mock.patch.object(connections['default'], 'in_atomic_block', False):
+                self.assertEqual(self.router.db_for_read(Alert), 'default')
+
+
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        caches['responses'].clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user('reporter')
+        self.alert = make_alert(self.user)
+
+    def test_bodies_expire_after_the_cache_timeout(self):
+        # Bumps made by other processes don't reach a local memory cache
+        self.client.get('/api/alerts/')
+        Alert.objects.filter(pk=self.alert.pk).update(status='expired')
+        later = time.time() + caches['responses'].default_timeout + 1
+        with mock.patch('time.time', return_value=later):
+            response = self.client.get('/api/alerts/')
+        self.assertEqual(response.data['results'][0]['status'], 'expired')
+
+    def test_anonymous_reads_are_served_from_cache(self):
+        urls = ['/api/alerts/', f'/api/alerts/{self.alert.id}/', '/api/categories/']
+        first = [self.client.get(url).data for url in urls]
+        with self.assertNumQueries(0):
+            second = [self.client.get(url).data for url in urls]
+        self.assertEqual(first, second)
+
+    def test_writes_invalidate_cached_responses(self):
+        self.client.get('/api/alerts/')
+        AlertComment.objects.create(user=self.user, alert=self.alert, text='Ya pasó la grúa')
+        response = self.client.get('/api/alerts/')
+        self.assertEqual(response.data['results'][0]['comments_count'], 1)
+
+        Alert.apply_reaction_delta(self.alert.id, likes=1)
+        response = self.client.get(f'/api/alerts/{self.alert.id}/')
+        self.assertEqual(response.data['likes_count'], 1)
+
+    def test_etag_returns_not_modified(self):
+        response = self.client.get('/api/alerts/')
+        etag = response['ETag']
+        response = self.client.get('/api/alerts/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        make_alert(self.user, title='Otra')
+        response = self.client.get('/api/alerts/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_user_reaction_is_layered_on_shared_body(self):
+        fan = User.objects.create_user('fan')
+        AlertReaction.objects.create(user=fan, alert=self.alert, reaction_type='dislike')
+        self.client.get('/api/alerts/')
+
+        self.client.force_authenticate(fan)
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/alerts/')
+        self.assertEqual(response.data['results'][0]['user_reaction'], 'dislike')
+
+        self.client.force_authenticate(None)
+        response = self.client.get('/api/alerts/')
+        self.assertIsNone(response.data['results'][0]['user_reaction'])
+
+
+@override_settings(JOBS_EAGER=False)
+class ImageProcessingTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        self.user = User.objects.create_user('reporter')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def phone_photo(self):
+        # Landscape pixels with EXIF orientation 6 (rotate 90° to display)
+        image = Image.new('RGB', (3000, 1000), (200, 30, 30))
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        exif[0x010F] = 'PhoneMaker'
+        buffer = BytesIO()
+        image.save(buffer, format='JPEG', exif=exif)
+        return SimpleUploadedFile('foto.jpg', buffer.getvalue(), content_type='image/jpeg')
+
+    def test_upload_is_normalized_and_thumbnailed(self):
+        with self.settings(MEDIA_ROOT=self.media_root):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post('/api/alerts/', {
+                    'title': 'Inundación', 'description': 'Con foto', 'category': 'flooding',
+                    'latitude': 19.43, 'longitude': -99.13, 'image': self.phone_photo(),
+                }, format='multipart')
+            self.assertEqual(response.status_code, 201)
+            # Processed by a job worker, not in the request
+            alert = Alert.objects.get()
+            self.assertEqual(alert.image_variants, {})
+            self.assertEqual(run_pending_jobs(), 2)
+
+            alert.refresh_from_db()
+            with alert.image.open('rb') as stored:
+                image = Image.open(stored)
+                self.assertEqual(image.size, (640, 1920))
+                self.assertEqual(len(image.getexif()), 0)
+
+            self.assertEqual(set(alert.image_variants), {'160', '480', '960'})
+            with alert.image.storage.open(alert.image_variants['160']['webp']) as thumbnail:
+                self.assertEqual(Image.open(thumbnail).size, (160, 480))
+
+            data = self.client.get(f'/api/alerts/{alert.id}/').data
+            self.assertTrue(data['image_thumbnails']['480']['jpeg'].endswith('/media/alerts/thumbs/foto_480.jpg'))
+            self.assertNotIn('image_variants', data)
+
+    def test_stored_format_follows_the_content_not_the_extension(self):
+        buffer = BytesIO()
+        Image.new('RGBA', (40, 30), (0, 0, 0, 0)).save(buffer, format='PNG')
+        upload = SimpleUploadedFile('captura.jpg', buffer.getvalue(), content_type='image/jpeg')
+        with self.settings(MEDIA_ROOT=self.media_root):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post('/api/alerts/', {
+                    'title': 'Bache', 'description': 'Captura', 'category': 'flooding',
+                    'latitude': 19.43, 'longitude': -99.13, 'image': upload,
+                }, format='multipart')
+            run_pending_jobs()
+
+            alert = Alert.objects.get()
+            self.assertEqual(alert.image.name, 'alerts/captura.png')
+            self.assertFalse(alert.image.storage.exists('alerts/captura.jpg'))
+            with alert.image.open('rb') as stored:
+                image = Image.open(stored)
+                self.assertEqual((image.format, image.mode), ('PNG', 'RGBA'))
+
+
+class ClusterTests(TestCase):
+    def setUp(self):
+        caches['responses'].clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user('reporter')
+        # Two hotspots a few km apart, plus one resolved alert that must not count
+        for _ in range(3):
+            make_alert(self.user, 19.4326, -99.1332)
+        make_alert(self.user, 19.4330, -99.1330, category='flooding')
+        make_alert(self.user, 19.3500, -99.0500, category='police')
+        make_alert(self.user, 19.4326, -99.1332, status='resolved')
+
+    def get(self, **params):
+        params.setdefault('bbox', '19.0,-99.5,19.8,-98.8')
+        return self.client.get('/api/alerts/clusters/', params)
+
+    def test_low_zoom_groups_alerts_into_clusters(self):
+        response = self.get(zoom=10)
+        self.assertEqual(response.status_code, 200)
+        clusters = sorted(response.data['clusters'], key=lambda cluster: -cluster['count'])
+        self.assertEqual([cluster['count'] for cluster in clusters], [4, 1])
+        self.assertEqual(clusters[0]['categories'], {'traffic_accident': 3, 'flooding': 1})
+        self.assertAlmostEqual(clusters[0]['latitude'], 19.4327, places=4)
+        south, west, north, east = clusters[0]['bounds']
+        self.assertTrue(south <= clusters[0]['latitude'] <= north and west <= clusters[0]['longitude'] <= east)
+        self.assertEqual(response.data['alerts'], [])
+
+    def test_category_filter(self):
+        response = self.get(zoom=10, categories='police,flooding')
+        self.assertEqual(sorted(cluster['count'] for cluster in response.data['clusters']), [1, 1])
+
+    def test_high_zoom_returns_individual_alerts(self):
+        response = self.get(zoom=17, bbox='19.43,-99.14,19.44,-99.13')
+        self.assertEqual(response.data['clusters'], [])
+        self.assertEqual(len(response.data['alerts']), 4)
+
+    def test_tiles_are_cached_and_invalidated(self):
+        self.get(zoom=10)
+        with self.assertNumQueries(0):
+            self.get(zoom=10, bbox='19.01,-99.49,19.79,-98.81')
+        make_alert(self.user, 19.4326, -99.1332)
+        response = self.get(zoom=10)
+        self.assertEqual(max(cluster['count'] for cluster in response.data['clusters']), 5)
+
+    def test_tiles_survive_writes_that_dont_move_alerts(self):
+        alert = Alert.objects.filter(category='police').get()
+        self.get(zoom=10)
+        self.client.force_authenticate(self.user)
+        self.client.post(f'/api/alerts/{alert.id}/react/', {'reaction_type': 'like'})
+        AlertComment.objects.create(user=self.user, alert=alert, text='Sigue ahí')
+        Alert.confirm(alert.id)
+        self.client.patch(f'/api/alerts/{alert.id}/', {'title': 'Retén'})
+        self.client.force_authenticate(None)
+        with self.assertNumQueries(0):
+            self.get(zoom=10)
+
+        self.client.force_authenticate(self.user)
+        self.client.patch(f'/api/alerts/{alert.id}/', {'latitude': 19.4326, 'longitude': -99.1332})
+        self.client.force_authenticate(None)
+        response = self.get(zoom=10)
+        self.assertEqual([cluster['count'] for cluster in response.data['clusters']], [5])
+
+    def test_requires_bbox_and_zoom(self):
+        self.assertEqual(self.client.get('/api/alerts/clusters/', {'zoom': 10}).status_code, 400)
+        self.assertEqual(self.get(zoom='far').status_code, 400)
+        self.assertEqual(self.get(zoom=12, bbox='-80,-180,80,180').status_code, 400)
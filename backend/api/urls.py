@@ -5,6 +5,8 @@ from . import views
 router = DefaultRouter()
 router.register(r'alerts', views.AlertViewSet)
 router.register(r'profiles', views.UserProfileViewSet)
+router.register(r'subscriptions', views.SubscriptionViewSet)
+router.register(r'notifications', views.NotificationViewSet)
 
 urlpatterns = [
     # Incluir las rutas del router bajo /api/
@@ -13,6 +15,9 @@ urlpatterns = [
     # Categories from dictionary
     path('categories/', views.categories_list, name='categories-list'),
     
+    # Métricas de rendimiento (solo administradores)
+    path('metrics/', views.metrics, name='metrics'),
+    
     # Rutas de autenticación - CORREGIDAS
     path('auth/register/', views.UserRegisterView.as_view(), name='register'),
     path('auth/login/', views.UserLoginView.as_view(), name='login'),
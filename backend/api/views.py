@@ -1,3 +1,5 @@
+from datetime import timedelta
+
 from rest_framework import viewsets, status, permissions
 from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
@@ -7,25 +9,93 @@ from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 from django.contrib.auth import authenticate
 from django.contrib.auth.models import User
 from django.db import transaction
-from .models import Alert, UserProfile, AlertReaction, AlertComment
+from django.db.models import Prefetch, Q
+from django.http import HttpResponse, StreamingHttpResponse
+from .models import Alert, UserProfile, AlertReaction, AlertComment, AlertTombstone, Notification, Subscription
 from .serializers import (
     AlertSerializer, AlertCreateSerializer, AlertCommentSerializer,
-    UserSerializer, UserRegistrationSerializer, UserProfileSerializer
+    UserSerializer, UserRegistrationSerializer, UserProfileSerializer, parse_field_list,
+    SubscriptionSerializer, NotificationSerializer
 )
 from django.utils import timezone
-from .categories import get_all_categories
+from django.utils.dateparse import parse_datetime
+from .categories import get_all_categories, parse_categories
+from .pagination import AlertCursorPagination, CommentCursorPagination, NotificationCursorPagination
+from .geo import RouteCorridor, bbox_q, bounding_box, decode_polyline, haversine_km, parse_bbox, parse_points
+from .realtime import publish_alert_event
+from .jobs import enqueue
+from .rollups import (
+    ROLLUP_INTERVALS, ROLLUP_MAX_RANGE, alert_rollup_key, apply_rollup_deltas, filter_rollups, heatmap,
+    rollup_transition, timeseries
+)
+from .authentication import invalidate_user_tokens
+from .cache import LOCATIONS_KEY, conditional_response, get_or_build, invalidate_alert_responses, make_cache_key
+from .metrics import registry
+from .export import export_rows, geojson_stream, ndjson_stream
+from .search import search_alerts, search_terms
+from .duplicates import get_duplicate_index, get_duplicate_settings
+from .subscriptions import SUBSCRIPTIONS_PER_USER
+from .clusters import CLUSTER_MAX_ZOOM, MAX_TILES, tile_clusters, tiles_for_bbox
+
+# Upper bound for `nearby` radius, in kilometers
+NEARBY_MAX_RADIUS_KM = 100
+# Individual alerts returned by `clusters` at high zoom
+CLUSTER_MAX_ALERTS = 2000
+# Route vertices accepted by `corridor`, and its corridor width in meters
+ROUTE_MAX_POINTS = 10000
+ROUTE_DEFAULT_WIDTH_M = 100
+ROUTE_MAX_WIDTH_M = 5000
+# Base cells merged per side by `heatmap`
+HEATMAP_MAX_RESOLUTION = 50
+# Seconds `heatmap` and `timeseries` bodies are cached; default ranges end now,
+# so they also move without any alert write
+ROLLUP_CACHE_TIMEOUT = 60
+# `changes` also returns rows changed this long before `since`: updated_at is
+# set before the writing transaction commits, which can wait out the SQLite
+# busy timeout, so a late commit still reaches the next poll
+CHANGES_OVERLAP = timedelta(seconds=30)
+# Results returned by `search`
+SEARCH_DEFAULT_LIMIT = 20
+SEARCH_MAX_LIMIT = 100
 
 @api_view(['GET'])
 @permission_classes([permissions.AllowAny])
 def categories_list(request):
     """Returns all available categories from the dictionary configuration"""
-    categories = get_all_categories()
-    return Response(categories)
+    # Categories live in code, so the cached body never needs invalidation
+    categories = get_or_build(request, 'categories', get_all_categories, versioned=False)
+    return conditional_response(request, categories)
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAdminUser])
+def metrics(request):
+    """Per-endpoint request metrics in Prometheus text format (see api/metrics.py)"""
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+def enqueue_image_processing(alert):
+    """Queues thumbnails for the alert's current image, once per uploaded file"""
+    enqueue('process_alert_image', {'alert_id': alert.pk}, key=f'process_alert_image:{alert.pk}:{alert.image.name}')
 
 class AlertViewSet(viewsets.ModelViewSet):
     queryset = Alert.objects.all()
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
     parser_classes = [MultiPartParser, FormParser, JSONParser]
+    pagination_class = AlertCursorPagination
+    
+    def get_queryset(self):
+        """
+        Load users and profiles (and comments, when expanded) up front so
+        serialization doesn't query per alert. Relations left out by
+        ?fields= / ?expand= are skipped.
+        """
+        queryset = Alert.objects.all()
+        if AlertSerializer.is_expanded(self.request, 'user'):
+            queryset = queryset.select_related('user__profile')
+        if AlertSerializer.is_expanded(self.request, 'comments'):
+            queryset = queryset.prefetch_related(
+                Prefetch('comments', queryset=AlertComment.objects.select_related('user__profile'))
+            )
+        return queryset
     
     def get_serializer_class(self):
         if self.action == 'create':
@@ -36,31 +106,178 @@ class AlertViewSet(viewsets.ModelViewSet):
         """Pass request context to serializer for user_reaction field"""
         context = super().get_serializer_context()
         context['request'] = self.request
+        if getattr(self, 'building_shared_body', False):
+            # Cached bodies are shared between users; see with_user_reactions()
+            context['user_reactions'] = {}
         return context
     
+    def get_serializer(self, *args, **kwargs):
+        """Prefetch the current user's reactions for lists in a single query"""
+        if kwargs.get('many') and args:
+            alerts = list(args[0])
+            args = (alerts, *args[1:])
+            context = kwargs.get('context') or self.get_serializer_context()
+            if 'user_reactions' not in context:
+                context['user_reactions'] = self.get_user_reactions([alert.id for alert in alerts])
+            kwargs['context'] = context
+        return super().get_serializer(*args, **kwargs)
+    
+    def get_user_reactions(self, alert_ids):
+        """Returns {alert_id: reaction_type} for the current user"""
+        if not self.request.user.is_authenticated or not alert_ids:
+            return {}
+        if not AlertSerializer.is_rendered(self.request, 'user_reaction'):
+            return {}
+        return dict(
+            AlertReaction.objects.filter(
+                user=self.request.user,
+                alert_id__in=alert_ids
+            ).values_list('alert_id', 'reaction_type')
+        )
+    
+    def can_share_body(self):
+        # The user_reaction overlay needs ids to match reactions to alerts
+        return AlertSerializer.is_rendered(self.request, 'id') or \
+            not AlertSerializer.is_rendered(self.request, 'user_reaction')
+    
+    def get_shared_body(self, scope, build):
+        """
+        Cached response body without per-user fields, or None when this
+        request can't use the shared cache.
+        """
+        if not self.can_share_body():
+            return None
+        
+        def build_shared():
+            self.building_shared_body = True
+            try:
+                return build()
+            finally:
+                self.building_shared_body = False
+        
+        return get_or_build(self.request, scope, build_shared)
+    
+    def with_user_reactions(self, items):
+        """Layers the current user's reactions onto shared (cached) alert items"""
+        if not self.request.user.is_authenticated or not AlertSerializer.is_rendered(self.request, 'user_reaction'):
+            return
+        reactions = self.get_user_reactions([item['id'] for item in items])
+        for item in items:
+            item['user_reaction'] = reactions.get(item['id'])
+    
+    def list(self, request, *args, **kwargs):
+        data = self.get_shared_body('alerts-list', lambda: super(AlertViewSet, self).list(request, *args, **kwargs).data)
+        if data is None:
+            return super().list(request, *args, **kwargs)
+        self.with_user_reactions(data['results'] if 'results' in data else data)
+        return conditional_response(request, data)
+    
+    def retrieve(self, request, *args, **kwargs):
+        data = self.get_shared_body('alerts-detail', lambda: super(AlertViewSet, self).retrieve(request, *args, **kwargs).data)
+        if data is None:
+            return super().retrieve(request, *args, **kwargs)
+        self.with_user_reactions([data])
+        return conditional_response(request, data)
+    
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        merged_into = self.perform_create(serializer)
+        if merged_into is not None:
+            # Counted as a confirmation of an existing alert; nothing was created
+            data = AlertSerializer(merged_into, context=self.get_serializer_context()).data
+            return Response(data, status=status.HTTP_200_OK)
+        headers = self.get_success_headers(serializer.data)
+        return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
+    
     def perform_create(self, serializer):
-        alert = serializer.save(user=self.request.user)
-        # Actualizar estadísticas del usuario
-        if hasattr(self.request.user, 'profile'):
-            self.request.user.profile.update_statistics()
+        """
+        Saves the alert, unless it duplicates a recent active one nearby and
+        ALERT_DUPLICATES is in 'merge' mode: then returns that alert instead.
+        """
+        original = None
+        options = get_duplicate_settings()
+        if options['MODE'] != 'off':
+            data = serializer.validated_data
+            merge = options['MODE'] == 'merge'
+            # Only a merged report is a confirmation: in 'link' mode the report
+            # is saved as its own alert, and counting it on the original too
+            # would count it twice
+            original = get_duplicate_index().find_duplicate(
+                data['category'], data['latitude'], data['longitude'], confirm=merge
+            )
+            if original is not None and merge:
+                publish_alert_event('updated', original)
+                return original
+        
+        # The alert and its counters commit together or not at all
+        with transaction.atomic():
+            alert = serializer.save(user=self.request.user, duplicate_of=original)
+            if alert.image:
+                enqueue_image_processing(alert)
+            if original is None:
+                # Subscribers of a duplicate were already told about the original
+                enqueue('notify_subscribers', {'alert_id': alert.pk}, key=f'notify_subscribers:{alert.pk}')
+            # Actualizar estadísticas del usuario (un UPDATE O(1), se queda en la petición)
+            UserProfile.apply_statistics_delta(alert.user_id, reported=1)
+            apply_rollup_deltas({alert_rollup_key(alert): 1})
+        # Serialized after the block so building the event doesn't hold the write lock
+        publish_alert_event('created', alert)
     
     def perform_update(self, serializer):
         # Check if user is the owner
         if serializer.instance.user != self.request.user:
             raise permissions.PermissionDenied("Solo el creador puede editar esta alerta")
-        serializer.save()
+        was_resolved = serializer.instance.status == 'resolved'
+        rollup_before = alert_rollup_key(serializer.instance)
+        with transaction.atomic():
+            if 'image' in serializer.validated_data:
+                # Old thumbnails no longer match; new ones are generated below
+                alert = serializer.save(image_variants={})
+                if alert.image:
+                    enqueue_image_processing(alert)
+            else:
+                alert = serializer.save()
+            is_resolved = alert.status == 'resolved'
+            if was_resolved != is_resolved:
+                UserProfile.apply_statistics_delta(alert.user_id, resolved=1 if is_resolved else -1)
+            apply_rollup_deltas(rollup_transition(rollup_before, alert_rollup_key(alert)))
+        publish_alert_event('updated', alert)
     
     def perform_destroy(self, instance):
-        # Actualizar estadísticas antes de eliminar
-        user_profile = instance.user.profile
-        super().perform_destroy(instance)
-        user_profile.update_statistics()
+        with transaction.atomic():
+            # Only carries the id and position, which the delete clears
+            publish_alert_event('deleted', instance)
+            super().perform_destroy(instance)
+            # Descontar la alerta y sus reacciones de las estadísticas del autor
+            UserProfile.apply_statistics_delta(
+                instance.user_id,
+                reported=-1,
+                resolved=-1 if instance.status == 'resolved' else 0,
+                likes=-instance.likes_count,
+                dislikes=-instance.dislikes_count,
+            )
+            apply_rollup_deltas({alert_rollup_key(instance): -1})
     
     @action(detail=False, methods=['get'])
     def nearby(self, request):
-        lat = request.query_params.get('lat')
-        lng = request.query_params.get('lng')
-        radius = request.query_params.get('radius', 5)
+        """Active alerts within `radius` km of (lat, lng), closest first"""
+        params = self.parse_nearby_params(request.query_params)
+        if isinstance(params, Response):
+            return params
+        lat, lng, radius, limit = params
+        
+        ordered_ids, distances = self.rank_nearby(self.nearby_candidates(lat, lng, radius), lat, lng, radius, limit)
+        alerts_by_id = self.get_queryset().in_bulk(ordered_ids)
+        alerts = [alerts_by_id[alert_id] for alert_id in ordered_ids if alert_id in alerts_by_id]
+        return Response(self.nearby_data(self.get_serializer(alerts, many=True), distances))
+    
+    def parse_nearby_params(self, params):
+        """(lat, lng, radius, limit) for `nearby`, or a 400 Response"""
+        lat = params.get('lat')
+        lng = params.get('lng')
+        radius = params.get('radius', 5)
+        limit = params.get('limit')
         
         if not lat or not lng:
             return Response(
@@ -68,11 +285,416 @@ class AlertViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Aquí puedes implementar la lógica de búsqueda por cercanía
-        # Por ahora retornamos todas las alertas activas
+        try:
+            lat = float(lat)
+            lng = float(lng)
+            radius = float(radius)
+            limit = int(limit) if limit else None
+        except (TypeError, ValueError):
+            return Response(
+                {"error": "lat, lng, radius y limit deben ser numéricos"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        if not (-90 <= lat <= 90 and -180 <= lng <= 180) or radius <= 0 or (limit is not None and limit <= 0):
+            return Response(
+                {"error": "Parámetros de búsqueda fuera de rango"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return lat, lng, min(radius, NEARBY_MAX_RADIUS_KM), limit
+    
+    def nearby_candidates(self, lat, lng, radius):
+        """(id, latitude, longitude) of active alerts in the bounding box around (lat, lng)"""
+        # Bounding-box prefilter on the (status, latitude, longitude) index;
+        # exact haversine distances are computed on this small set
+        return Alert.objects.filter(status='active').filter(
+            bbox_q(*bounding_box(lat, lng, radius))
+        ).values_list('id', 'latitude', 'longitude')
+    
+    def rank_nearby(self, candidates, lat, lng, radius, limit):
+        """Ids of the candidates within `radius` km, closest first, and their distances"""
+        distances = {}
+        for alert_id, alert_lat, alert_lng in candidates:
+            distance = haversine_km(lat, lng, alert_lat, alert_lng)
+            if distance <= radius:
+                distances[alert_id] = distance
+        
+        ordered_ids = sorted(distances, key=distances.get)
+        if limit is not None:
+            ordered_ids = ordered_ids[:limit]
+        return ordered_ids, distances
+    
+    def nearby_data(self, serializer, distances):
+        """Serialized alerts with their distance in km"""
+        data = serializer.data
+        for item, alert in zip(data, serializer.instance):
+            item['distance'] = round(distances[alert.id], 3)
+        return data
+    
+    @action(detail=False, methods=['get', 'post'], permission_classes=[permissions.AllowAny])
+    def corridor(self, request):
+        """
+        Active alerts within ?width= meters (default 100) of a route, in the
+        order they appear along it. The route is ?polyline= (encoded) or
+        ?points=lat,lng;lat,lng; long routes can be POSTed as JSON with
+        `polyline` or `points` as [[lat, lng], ...]. Optional ?categories=a,b
+        and ?limit=. Each alert gets `distance` from the route and
+        `route_position` along it, in km.
+        """
+        params = request.data if request.method == 'POST' else request.query_params
+        try:
+            if params.get('polyline'):
+                points = decode_polyline(params['polyline'])
+            else:
+                points = parse_points(params.get('points') or [])
+        except (TypeError, ValueError):
+            return Response(
+                {"error": "polyline o points no válidos"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not 2 <= len(points) <= ROUTE_MAX_POINTS:
+            return Response(
+                {"error": f"La ruta debe tener entre 2 y {ROUTE_MAX_POINTS} puntos"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            width = float(params.get('width', ROUTE_DEFAULT_WIDTH_M))
+            limit = int(params['limit']) if params.get('limit') else None
+        except (TypeError, ValueError):
+            return Response(
+                {"error": "width y limit deben ser numéricos"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not 0 < width <= ROUTE_MAX_WIDTH_M or (limit is not None and limit <= 0):
+            return Response(
+                {"error": "Parámetros de búsqueda fuera de rango"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        # One indexed (status, latitude) range per box: SQLite only turns an
+        # OR into per-term index searches when each term has the status too
+        route = RouteCorridor(points, width / 1000)
+        candidates = Alert.objects.filter(Q(
+            *[Q(status='active') & bbox_q(*box) for box in route.bounding_boxes()],
+            _connector=Q.OR
+        ))
+        categories = parse_categories(params.get('categories'))
+        if categories is not None:
+            candidates = candidates.filter(category__in=categories)
+        
+        located = {}
+        for alert_id, alert_lat, alert_lng in candidates.values_list('id', 'latitude', 'longitude'):
+            match = route.locate(alert_lat, alert_lng)
+            if match is not None:
+                located[alert_id] = match
+        
+        ordered_ids = sorted(located, key=lambda alert_id: (located[alert_id][1], alert_id))
+        if limit is not None:
+            ordered_ids = ordered_ids[:limit]
+        alerts_by_id = self.get_queryset().in_bulk(ordered_ids)
+        alerts = [alerts_by_id[alert_id] for alert_id in ordered_ids if alert_id in alerts_by_id]
+        data = self.get_serializer(alerts, many=True).data
+        for item, alert in zip(data, alerts):
+            distance, position = located[alert.id]
+            item['distance'] = round(distance, 3)
+            item['route_position'] = round(position, 3)
+        return Response(data)
+    
+    @action(detail=False, methods=['get'])
+    def clusters(self, request):
+        """
+        Map aggregation for ?bbox=south,west,north,east&zoom=N. Below
+        CLUSTER_MAX_ZOOM active alerts are grouped into grid cells with counts
+        per category; at higher zoom the individual alerts are returned.
+        Optional ?categories=a,b filters both.
+        """
+        try:
+            bbox = parse_bbox(request.query_params.get('bbox'))
+            zoom = int(request.query_params.get('zoom', ''))
+        except ValueError:
+            bbox = zoom = None
+        if bbox is None or zoom is None or not 0 <= zoom <= 22:
+            return Response(
+                {"error": "bbox (sur,oeste,norte,este) y zoom (0-22) son requeridos"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        categories = parse_categories(request.query_params.get('categories'))
         alerts = Alert.objects.filter(status='active')
-        serializer = AlertSerializer(alerts, many=True)
-        return Response(serializer.data)
+        if categories:
+            alerts = alerts.filter(category__in=categories)
+        
+        if zoom >= CLUSTER_MAX_ZOOM:
+            south, west, north, east = bbox
+            if east < west:
+                east += 360.0
+            rows = alerts.filter(bbox_q(south, north, west, east)).values(
+                'id', 'title', 'latitude', 'longitude', 'category', 'status'
+            ).order_by('-created_at')[:CLUSTER_MAX_ALERTS]
+            return Response({'zoom': zoom, 'clusters': [], 'alerts': list(rows)})
+        
+        tiles = tiles_for_bbox(bbox, zoom)
+        if len(tiles) > MAX_TILES:
+            return Response(
+                {"error": "El área es demasiado grande para este nivel de zoom"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        # Each tile is cached on its own so panning reuses the tiles already
+        # built, and survives reactions, comments and confirmations
+        category_key = sorted(categories) if categories else None
+        clusters = []
+        for x, y in tiles:
+            clusters.extend(get_or_build(
+                request, 'alerts-clusters',
+                lambda x=x, y=y: tile_clusters(alerts, zoom, x, y),
+                key=make_cache_key('alerts-clusters', [zoom, x, y, category_key], generation_key=LOCATIONS_KEY),
+            ))
+        return Response({'zoom': zoom, 'clusters': clusters, 'alerts': []})
+    
+    @action(detail=False, methods=['get'])
+    def changes(self, request):
+        """
+        Incremental sync: alerts created, updated or closed after ?since=
+        plus the ids of alerts deleted since then. Changes from the last
+        CHANGES_OVERLAP before `since` are repeated, so clients merge by id.
+        Without `since` (or with a watermark older than the tombstone
+        retention) a snapshot is returned with `reset: true`, one cursor page
+        at a time: clients follow `next` and keep the first page's
+        `watermark`, which they pass back next time.
+        """
+        watermark = timezone.now()
+        since = request.query_params.get('since')
+        
+        if since:
+            since = parse_datetime(since)
+            if since is None:
+                return Response(
+                    {"error": "since debe ser una fecha ISO 8601"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            if timezone.is_naive(since):
+                since = timezone.make_aware(since)
+        
+        reset = since is None or since < watermark - AlertTombstone.RETENTION
+        next_page = None
+        deleted = []
+        if reset:
+            alerts = self.paginate_queryset(self.get_queryset())
+            next_page = self.paginator.get_next_link()
+        else:
+            since -= CHANGES_OVERLAP
+            alerts = self.get_queryset().filter(updated_at__gt=since).order_by('updated_at', 'id')
+            deleted = list(
+                AlertTombstone.objects.filter(deleted_at__gt=since).order_by('deleted_at', 'alert_id')
+                .values_list('alert_id', flat=True)
+            )
+        
+        serializer = self.get_serializer(alerts, many=True)
+        return Response({
+            'watermark': watermark.isoformat().replace('+00:00', 'Z'),
+            'reset': reset,
+            'alerts': serializer.data,
+            'deleted': deleted,
+            'next': next_page,
+        })
+    
+    def filter_alerts(self, alerts, params):
+        """
+        Applies the ?bbox=, ?since= / ?until=, ?status= and ?categories=
+        filters shared by `export` and `search`; a 400 Response when one is
+        malformed.
+        """
+        try:
+            bbox = parse_bbox(params.get('bbox'))
+        except ValueError:
+            return Response(
+                {"error": "bbox debe tener el formato sur,oeste,norte,este"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if bbox is not None:
+            south, west, north, east = bbox
+            alerts = alerts.filter(bbox_q(south, north, west, east))
+        
+        for name, lookup in (('since', 'created_at__gte'), ('until', 'created_at__lt')):
+            value = params.get(name)
+            if not value:
+                continue
+            moment = parse_datetime(value)
+            if moment is None:
+                return Response(
+                    {"error": f"{name} debe ser una fecha ISO 8601"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            if timezone.is_naive(moment):
+                moment = timezone.make_aware(moment)
+            alerts = alerts.filter(**{lookup: moment})
+        
+        statuses = parse_field_list(params.get('status'))
+        if statuses is not None:
+            if not statuses <= {key for key, _ in Alert.STATUS_CHOICES}:
+                return Response(
+                    {"error": "status no válido"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            alerts = alerts.filter(status__in=statuses)
+        categories = parse_categories(params.get('categories'))
+        if categories is not None:
+            alerts = alerts.filter(category__in=categories)
+        return alerts
+    
+    def parse_rollup_params(self, params, default_range):
+        """
+        The filters of the rollup-backed analytics actions: ?since= / ?until=
+        (the last `default_range` by default), ?categories=, ?status= and
+        ?bbox=. Returns a dict of filter_rollups() arguments or a 400 Response.
+        """
+        moments = {}
+        for name in ('since', 'until'):
+            value = params.get(name)
+            if not value:
+                continue
+            moment = parse_datetime(value)
+            if moment is None:
+                return Response(
+                    {"error": f"{name} debe ser una fecha ISO 8601"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            moments[name] = timezone.make_aware(moment) if timezone.is_naive(moment) else moment
+        until = moments.get('until') or timezone.now()
+        since = moments.get('since') or until - default_range
+        if not timedelta(0) < until - since <= ROLLUP_MAX_RANGE:
+            return Response(
+                {"error": f"El rango debe ser positivo y de hasta {ROLLUP_MAX_RANGE.days} días"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        statuses = parse_field_list(params.get('status'))
+        if statuses is not None and not statuses <= {key for key, _ in Alert.STATUS_CHOICES}:
+            return Response(
+                {"error": "status no válido"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            bbox = parse_bbox(params.get('bbox'))
+        except ValueError:
+            return Response(
+                {"error": "bbox debe tener el formato sur,oeste,norte,este"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return {
+            'since': since,
+            'until': until,
+            'categories': parse_categories(params.get('categories')),
+            'statuses': statuses,
+            'bbox': bbox,
+        }
+    
+    @action(detail=False, methods=['get'])
+    def heatmap(self, request):
+        """
+        Alerts per grid cell over a time range (the last 24 hours by default),
+        from the hourly rollups; ?resolution=N merges N x N cells.
+        """
+        filters = self.parse_rollup_params(request.query_params, timedelta(hours=24))
+        if isinstance(filters, Response):
+            return filters
+        try:
+            resolution = int(request.query_params.get('resolution', 1))
+        except ValueError:
+            resolution = 0
+        if not 1 <= resolution <= HEATMAP_MAX_RESOLUTION:
+            return Response(
+                {"error": f"resolution debe ser un entero entre 1 y {HEATMAP_MAX_RESOLUTION}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        def build():
+            return heatmap(filter_rollups(**filters), resolution)
+        
+        return conditional_response(request, get_or_build(request, 'alerts-heatmap', build, timeout=ROLLUP_CACHE_TIMEOUT))
+    
+    @action(detail=False, methods=['get'])
+    def timeseries(self, request):
+        """
+        Alerts per hour or day (?interval=) over a time range (the last 7 days
+        by default), from the hourly rollups; ?group_by=category splits them.
+        """
+        filters = self.parse_rollup_params(request.query_params, timedelta(days=7))
+        if isinstance(filters, Response):
+            return filters
+        interval = request.query_params.get('interval', 'hour')
+        group_by = request.query_params.get('group_by')
+        if interval not in ROLLUP_INTERVALS or group_by not in (None, 'category'):
+            return Response(
+                {"error": "interval debe ser 'hour' o 'day' y group_by solo admite 'category'"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        def build():
+            return timeseries(
+                filter_rollups(**filters), filters['since'], filters['until'], interval, by_category=bool(group_by)
+            )
+        
+        return conditional_response(request, get_or_build(request, 'alerts-timeseries', build, timeout=ROLLUP_CACHE_TIMEOUT))
+    
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """
+        Streams every matching alert as GeoJSON (?output=geojson, default) or
+        NDJSON (?output=ndjson). Filters: ?bbox=south,west,north,east,
+        ?since= / ?until= (ISO 8601, on created_at), ?status=a,b and
+        ?categories=a,b. Rows are read in chunks, so memory stays flat.
+        """
+        params = request.query_params
+        output = params.get('output', 'geojson')
+        if output not in ('geojson', 'ndjson'):
+            return Response(
+                {"error": "output debe ser geojson o ndjson"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        alerts = self.filter_alerts(Alert.objects.all(), params)
+        if isinstance(alerts, Response):
+            return alerts
+        
+        rows = export_rows(alerts)
+        if output == 'ndjson':
+            response = StreamingHttpResponse(ndjson_stream(rows), content_type='application/x-ndjson')
+        else:
+            response = StreamingHttpResponse(geojson_stream(rows), content_type='application/geo+json')
+        response['Content-Disposition'] = f'attachment; filename="alerts.{output}"'
+        return response
+    
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """
+        Full-text search over titles, descriptions and comments (?q=), best
+        matches first. Takes the same filters as `export` and ?limit= (up to
+        SEARCH_MAX_LIMIT).
+        """
+        params = request.query_params
+        terms = search_terms(params.get('q'))
+        if not terms:
+            return Response(
+                {"error": "q es requerido"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            limit = int(params.get('limit', SEARCH_DEFAULT_LIMIT))
+        except ValueError:
+            limit = 0
+        if not 0 < limit <= SEARCH_MAX_LIMIT:
+            return Response(
+                {"error": f"limit debe estar entre 1 y {SEARCH_MAX_LIMIT}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        alerts = self.filter_alerts(self.get_queryset(), params)
+        if isinstance(alerts, Response):
+            return alerts
+        alerts = search_alerts(alerts, terms)[:limit]
+        return Response(self.get_serializer(alerts, many=True).data)
     
     @action(detail=False, methods=['get'])
     def my_alerts(self, request):
@@ -81,8 +703,8 @@ class AlertViewSet(viewsets.ModelViewSet):
                 {"error": "Autenticación requerida"},
                 status=status.HTTP_401_UNAUTHORIZED
             )
-        alerts = Alert.objects.filter(user=request.user)
-        serializer = AlertSerializer(alerts, many=True, context={'request': request})
+        alerts = self.get_queryset().filter(user=request.user).order_by('-created_at', '-id')
+        serializer = self.get_serializer(alerts, many=True)
         return Response(serializer.data)
     
     @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated])
@@ -97,37 +719,35 @@ class AlertViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
+        new_reaction = None if reaction_type == 'remove' else reaction_type
+        
         with transaction.atomic():
-            try:
-                # Get existing reaction
-                existing_reaction = AlertReaction.objects.get(
-                    user=request.user,
-                    alert=alert
-                )
-                
-                if reaction_type == 'remove':
-                    # Remove the reaction
-                    existing_reaction.delete()
-                else:
-                    # Update existing reaction
-                    existing_reaction.reaction_type = reaction_type
-                    existing_reaction.save()
-                    
-            except AlertReaction.DoesNotExist:
-                if reaction_type != 'remove':
-                    # Create new reaction
-                    AlertReaction.objects.create(
-                        user=request.user,
-                        alert=alert,
-                        reaction_type=reaction_type
-                    )
+            # Counter deltas are computed in SQL from the old reaction and
+            # applied before the reaction row changes, so the transaction
+            # starts by writing and never upgrades a read lock.
+            likes = AlertReaction.delta_expression(request.user, alert, 'like', new_reaction)
+            dislikes = AlertReaction.delta_expression(request.user, alert, 'dislike', new_reaction)
+            Alert.apply_reaction_delta(alert.id, likes=likes, dislikes=dislikes)
+            UserProfile.apply_statistics_delta(alert.user_id, likes=likes, dislikes=dislikes)
             
-            # Update alert counts
-            alert.update_reaction_counts()
+            if new_reaction is None:
+                AlertReaction.objects.filter(user=request.user, alert=alert).delete()
+            else:
+                # Single upsert on the (user, alert) unique key
+                AlertReaction.objects.bulk_create(
+                    [AlertReaction(user=request.user, alert=alert, reaction_type=new_reaction)],
+                    update_conflicts=True,
+                    unique_fields=['user', 'alert'],
+                    update_fields=['reaction_type'],
+                )
             
-            # Update user reputation
-            if alert.user.profile:
-                alert.user.profile.update_statistics()
+            old_counts = (alert.likes_count, alert.dislikes_count)
+            alert.refresh_from_db(fields=['likes_count', 'dislikes_count', 'updated_at'])
+        
+        if (alert.likes_count, alert.dislikes_count) != old_counts:
+            if hasattr(alert.user, 'profile'):
+                alert.user.profile.refresh_from_db(fields=['reputation_points'])
+            publish_alert_event('reacted', alert)
         
         # Return updated alert data
         serializer = AlertSerializer(alert, context={'request': request})
@@ -153,14 +773,17 @@ class AlertViewSet(viewsets.ModelViewSet):
             )
         
         # Update alert status
+        rollup_before = alert_rollup_key(alert)
         alert.status = 'resolved'
         alert.closed_at = timezone.now()
-        alert.save()
-        
-        # Update user statistics
-        if hasattr(request.user, 'profile'):
-            request.user.profile.update_statistics()
+        with transaction.atomic():
+            alert.save(update_fields=['status', 'closed_at', 'updated_at'])
+            
+            # Update user statistics
+            UserProfile.apply_statistics_delta(alert.user_id, resolved=1)
+            apply_rollup_deltas(rollup_transition(rollup_before, alert_rollup_key(alert)))
         
+        publish_alert_event('closed', alert)
         serializer = AlertSerializer(alert, context={'request': request})
         return Response(serializer.data)
     
@@ -170,9 +793,12 @@ class AlertViewSet(viewsets.ModelViewSet):
         alert = self.get_object()
         
         if request.method == 'GET':
-            comments = alert.comments.all()
-            serializer = AlertCommentSerializer(comments, many=True)
-            return Response(serializer.data)
+            # Served from the (alert, -created_at) index a page at a time
+            comments = alert.comments.select_related('user__profile')
+            paginator = CommentCursorPagination()
+            page = paginator.paginate_queryset(comments, request, view=self)
+            serializer = AlertCommentSerializer(page, many=True)
+            return paginator.get_paginated_response(serializer.data)
         
         elif request.method == 'POST':
             # Check if user is authenticated
@@ -198,6 +824,15 @@ class AlertViewSet(viewsets.ModelViewSet):
             serializer = AlertCommentSerializer(comment)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
+def save_profile(serializer):
+    """Saves a profile update, scheduling thumbnails when a new avatar is uploaded"""
+    if 'avatar' not in serializer.validated_data:
+        return serializer.save()
+    profile = serializer.save(avatar_variants={})
+    if profile.avatar:
+        enqueue('process_avatar', {'profile_id': profile.pk}, key=f'process_avatar:{profile.pk}:{profile.avatar.name}')
+    return profile
+
 class UserProfileViewSet(viewsets.ModelViewSet):
     queryset = UserProfile.objects.all()
     serializer_class = UserProfileSerializer
@@ -222,7 +857,7 @@ class UserProfileViewSet(viewsets.ModelViewSet):
         elif request.method == 'PATCH':
             serializer = UserProfileSerializer(profile, data=request.data, partial=True)
             if serializer.is_valid():
-                serializer.save()
+                save_profile(serializer)
                 
                 # Actualizar también el usuario si se envían datos
                 user_data = {}
@@ -235,6 +870,8 @@ class UserProfileViewSet(viewsets.ModelViewSet):
                 
                 if user_data:
                     User.objects.filter(pk=request.user.pk).update(**user_data)
+                    invalidate_user_tokens(request.user.pk)
+                    invalidate_alert_responses()
                     # Actualizar el objeto user en la solicitud
                     request.user.refresh_from_db()
                 
@@ -258,6 +895,54 @@ class UserProfileViewSet(viewsets.ModelViewSet):
         
         return Response({"message": "Contraseña cambiada correctamente"})
 
+class SubscriptionViewSet(viewsets.ModelViewSet):
+    """The current user's geofence subscriptions (see api/subscriptions.py)"""
+    queryset = Subscription.objects.all()
+    serializer_class = SubscriptionSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get_queryset(self):
+        return Subscription.objects.filter(user=self.request.user)
+    
+    def create(self, request, *args, **kwargs):
+        if Subscription.objects.filter(user=request.user).count() >= SUBSCRIPTIONS_PER_USER:
+            return Response(
+                {"error": f"Máximo {SUBSCRIPTIONS_PER_USER} suscripciones por usuario"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return super().create(request, *args, **kwargs)
+    
+    def perform_create(self, serializer):
+        serializer.save(user=self.request.user)
+
+class NotificationViewSet(viewsets.ReadOnlyModelViewSet):
+    """Alerts delivered to the current user by their subscriptions, newest first"""
+    queryset = Notification.objects.all()
+    serializer_class = NotificationSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = NotificationCursorPagination
+    
+    def get_queryset(self):
+        notifications = Notification.objects.filter(user=self.request.user).select_related('alert')
+        if self.request.query_params.get('unread') in ('1', 'true'):
+            notifications = notifications.filter(read_at__isnull=True)
+        return notifications
+    
+    @action(detail=True, methods=['post'])
+    def read(self, request, pk=None):
+        notification = self.get_object()
+        if notification.read_at is None:
+            notification.read_at = timezone.now()
+            notification.save(update_fields=['read_at'])
+        return Response(self.get_serializer(notification).data)
+    
+    @action(detail=False, methods=['post'])
+    def read_all(self, request):
+        updated = Notification.objects.filter(
+            user=request.user, read_at__isnull=True
+        ).update(read_at=timezone.now())
+        return Response({"updated": updated})
+
 class UserRegisterView(APIView):
     permission_classes = [permissions.AllowAny]
     authentication_classes = []
@@ -331,7 +1016,7 @@ def user_profile(request):
         
         serializer = UserProfileSerializer(profile, data=data, partial=True, context={'request': request})
         if serializer.is_valid():
-            serializer.save()
+            save_profile(serializer)
             
             # Actualizar datos del usuario
             user_data = {}
@@ -344,6 +1029,8 @@ def user_profile(request):
             
             if user_data:
                 User.objects.filter(pk=request.user.pk).update(**user_data)
+                invalidate_user_tokens(request.user.pk)
+                invalidate_alert_responses()
                 request.user.refresh_from_db()
             
             # Return with context to get full URLs
@@ -13,4 +13,23 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported after Django is set up, since it loads settings and models
+from api.realtime import alert_events_websocket  # noqa: E402
+
+WEBSOCKET_ROUTES = {
+    '/ws/alerts/': alert_events_websocket,
+}
+
+
+async def application(scope, receive, send):
+    """Routes WebSocket connections to the live alert feed and HTTP to Django"""
+    if scope['type'] == 'websocket':
+        handler = WEBSOCKET_ROUTES.get(scope['path'])
+        if handler is None:
+            await send({'type': 'websocket.close', 'code': 4404})
+            return
+        await handler(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
@@ -0,0 +1,15 @@
+"""
+URL configuration that serves the hot read endpoints with the native async
+views in api/async_views.py, ahead of the regular routes in backend.urls.
+Selected with WEYALERT_ASYNC_READS=1; meant for ASGI servers.
+"""
+from django.urls import include, path
+
+from api.async_views import urlpatterns as async_read_urlpatterns
+
+from .urls import urlpatterns as sync_urlpatterns
+
+urlpatterns = [
+    path('api/', include(async_read_urlpatterns)),
+    *sync_urlpatterns,
+]
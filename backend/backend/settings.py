@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -44,6 +45,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Opt-in, see PERFORMANCE_METRICS below
+    'api.metrics.PerformanceMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -59,6 +62,12 @@ CORS_ALLOWED_ORIGINS = [
 ]
 ROOT_URLCONF = 'backend.urls'
 
+# Native async views for the hot read endpoints (api/async_views.py). Only
+# worth it under an ASGI server; under WSGI Django runs them in an event loop
+# per request.
+if os.environ.get('WEYALERT_ASYNC_READS') == '1':
+    ROOT_URLCONF = 'backend.async_urls'
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -87,6 +96,70 @@ DATABASES = {
     }
 }
 
+# High-concurrency SQLite profile, enabled with WEYALERT_SQLITE_PROFILE=concurrent.
+# WAL lets readers run alongside the writer; write transactions start with
+# BEGIN IMMEDIATE so they queue on the busy timeout up front instead of
+# failing with "database is locked" when upgrading a read lock. Reads go
+# to a read-only connection (see api/routers.py).
+SQLITE_PROFILE = os.environ.get('WEYALERT_SQLITE_PROFILE', 'default')
+SQLITE_CONCURRENT_PRAGMAS = [
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA mmap_size=268435456',  # 256 MiB
+    'PRAGMA cache_size=-65536',  # 64 MiB
+    'PRAGMA temp_store=MEMORY',
+]
+
+if SQLITE_PROFILE == 'concurrent':
+    DATABASES['default']['OPTIONS'] = {
+        'init_command': ';'.join(SQLITE_CONCURRENT_PRAGMAS),
+        # Seconds to wait for the write lock (busy_timeout)
+        'timeout': 20,
+        'transaction_mode': 'IMMEDIATE',
+    }
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': f"file:{DATABASES['default']['NAME']}?mode=ro",
+        'OPTIONS': {
+            'init_command': ';'.join(SQLITE_CONCURRENT_PRAGMAS[2:]),
+            'timeout': 20,
+        },
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_ROUTERS = ['api.routers.PrimaryReplicaRouter']
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+#
+# 'responses' holds serialized alert/category bodies (see api/cache.py).
+# Local memory is per process: writes from other processes (other server
+# workers, expire_alerts, run_jobs) only show up once a body's TIMEOUT runs
+# out. Set WEYALERT_RESPONSE_CACHE=file to share the cache (and its
+# invalidation) between all of them.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'responses': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'weyalert-responses',
+        'TIMEOUT': 300,
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    },
+}
+
+if os.environ.get('WEYALERT_RESPONSE_CACHE') == 'file':
+    CACHES['responses'] = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache' / 'responses',
+        'TIMEOUT': 300,
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    }
+
+ALERT_RESPONSE_CACHE = 'responses'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -128,6 +201,22 @@ STATIC_URL = 'static/'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Image processing and subscriber notifications run as background jobs
+# (see api/jobs.py), executed by `python manage.py run_jobs`. JOBS_EAGER runs
+# them in the request process right after the commit instead (no worker
+# needed in development); failures are logged, not retried.
+JOBS_EAGER = os.environ.get('WEYALERT_JOBS_EAGER') == '1'
+
+# New alerts of the same category reported within RADIUS_METERS and
+# WINDOW_MINUTES of an active one (see api/duplicates.py): 'link' saves them
+# with duplicate_of set and leaves the original as is, 'merge' only counts a
+# confirmation on the existing alert and returns it, 'off' disables the check
+ALERT_DUPLICATES = {
+    'MODE': 'link',
+    'RADIUS_METERS': 150,
+    'WINDOW_MINUTES': 30,
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -136,10 +225,27 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # REST Framework configuration
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',  # Esto permite GET sin auth
     ],
 }
+
+# Valid API tokens are cached for TOKEN_CACHE_TTL seconds in a bounded
+# in-process LRU (see api/authentication.py). Set TOKEN_CACHE_SHARED to a
+# cache alias to share them between processes as well.
+TOKEN_CACHE_TTL = 60
+TOKEN_CACHE_MAX_ENTRIES = 10000
+TOKEN_CACHE_SHARED = None
+
+# Per-request query/serializer timings, Server-Timing headers, a slow
+# request log and Prometheus metrics at /api/metrics/ (api/metrics.py)
+PERFORMANCE_METRICS = os.environ.get('WEYALERT_PERFORMANCE_METRICS') == '1'
+PERFORMANCE_SLOW_REQUEST_MS = int(os.environ.get('WEYALERT_SLOW_REQUEST_MS', '500'))
+
+# Live alert events (see api/realtime.py). The in-process broker fans out
+# to WebSocket clients connected to the same ASGI process; swap it for
+# 'api.realtime.LocalBroker' to record events in tests or scripts.
+ALERT_EVENTS_BROKER = 'api.realtime.InProcessBroker'
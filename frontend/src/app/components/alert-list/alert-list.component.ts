@@ -21,6 +21,8 @@ export class AlertListComponent implements OnInit, AfterViewInit {
   
   myAlerts: Alert[] = [];
   allAlerts: Alert[] = [];
+  allAlertsNextPage: string | null = null;
+  loadingMoreAlerts: boolean = false;
   isLoading: boolean = true;
   activeView: 'list' | 'map' = 'list';
   selectedAlert: Alert | null = null;
@@ -31,6 +33,7 @@ export class AlertListComponent implements OnInit, AfterViewInit {
   newCommentText: string = '';
   showComments: boolean = false;
   loadingComments: boolean = false;
+  commentsNextPage: string | null = null;
   
   private map: L.Map | null = null;
   private markers: L.Marker[] = [];
@@ -128,8 +131,18 @@ export class AlertListComponent implements OnInit, AfterViewInit {
 
     // Limpiar marcadores existentes
     this.clearMarkers();
+    this.addMarkers(this.allAlerts);
 
-    this.allAlerts.forEach(alert => {
+    // Si hay marcadores, ajustar la vista
+    if (this.markers.length > 0) {
+      setTimeout(() => {
+        this.showAllAlertsOnMap();
+      }, 100);
+    }
+  }
+
+  private addMarkers(alerts: Alert[]): void {
+    alerts.forEach(alert => {
       try {
         const marker = this.createMarker(alert);
         if (marker) {
@@ -139,13 +152,6 @@ export class AlertListComponent implements OnInit, AfterViewInit {
         console.error('Error creating marker for alert:', alert.id, error);
       }
     });
-
-    // Si hay marcadores, ajustar la vista
-    if (this.markers.length > 0) {
-      setTimeout(() => {
-        this.showAllAlertsOnMap();
-      }, 100);
-    }
   }
 
   private createMarker(alert: Alert): L.Marker | null {
@@ -257,27 +263,46 @@ export class AlertListComponent implements OnInit, AfterViewInit {
     });
   }
 
-  loadAllAlerts(): void {
-    this.alertService.getAlerts().subscribe({
-      next: (alerts) => {
-        this.allAlerts = alerts;
+  loadAllAlerts(more: boolean = false): void {
+    if (more && (!this.allAlertsNextPage || this.loadingMoreAlerts)) return;
+
+    this.loadingMoreAlerts = more;
+    this.alertService.getAlerts(more ? this.allAlertsNextPage : null).subscribe({
+      next: (page) => {
+        this.allAlerts = more ? this.allAlerts.concat(page.results) : page.results;
+        this.allAlertsNextPage = page.next;
+        this.loadingMoreAlerts = false;
         // Actualizar mapa si está en vista de mapa
         if (this.activeView === 'map' && this.mapInitialized) {
-          setTimeout(() => this.addMarkersToMap(), 100);
+          if (more) {
+            this.addMarkers(page.results);
+          } else {
+            setTimeout(() => this.addMarkersToMap(), 100);
+          }
         }
       },
       error: (error) => {
         console.error('Error loading all alerts', error);
+        this.loadingMoreAlerts = false;
       }
     });
   }
 
+  // Carga la siguiente página al acercarse al final de la lista
+  onAlertListScroll(event: Event): void {
+    const list = event.target as HTMLElement;
+    if (list.scrollTop + list.clientHeight >= list.scrollHeight - 100) {
+      this.loadAllAlerts(true);
+    }
+  }
+
   viewAlertDetail(alert: Alert): void {
     this.selectedAlert = alert;
     this.activeView = 'map';
     
     // Reset comments when switching alerts
     this.comments = [];
+    this.commentsNextPage = null;
     this.showComments = false;
     this.newCommentText = '';
     
@@ -543,13 +568,14 @@ export class AlertListComponent implements OnInit, AfterViewInit {
     }
   }
 
-  loadComments(alert: Alert): void {
+  loadComments(alert: Alert, more: boolean = false): void {
     if (!alert.id) return;
     
     this.loadingComments = true;
-    this.alertService.getAlertComments(alert.id).subscribe({
-      next: (comments) => {
-        this.comments = comments;
+    this.alertService.getAlertComments(alert.id, more ? this.commentsNextPage : null).subscribe({
+      next: (page) => {
+        this.comments = more ? this.comments.concat(page.results) : page.results;
+        this.commentsNextPage = page.next;
         this.loadingComments = false;
       },
       error: (error) => {
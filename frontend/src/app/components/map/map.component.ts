@@ -3,10 +3,11 @@ import { CommonModule, NgIf, DecimalPipe } from '@angular/common';
 import { HttpClient } from '@angular/common/http';
 import { Router } from '@angular/router';
 import * as L from 'leaflet';
-import { Subject } from 'rxjs';
+import { Subject, Subscription } from 'rxjs';
 import { debounceTime, distinctUntilChanged, switchMap } from 'rxjs/operators';
 import { AuthService } from '../../services/auth.service';
-import { AlertService, Alert } from '../../services/alert.service';
+import { AlertService, Alert, AlertChanges, AlertCluster } from '../../services/alert.service';
+import { WS_BASE_URL } from '../../config';
 
 @Component({
   selector: 'app-map',
@@ -44,11 +45,22 @@ export class MapComponent implements AfterViewInit, OnDestroy {
   selectedCategories: Set<string> = new Set();
   lastUpdateTime: Date | null = null;
   private refreshInterval: any;
+  private syncWatermark: string | null = null;
+  private liveSocket: WebSocket | null = null;
+  private liveReconnectTimer: any;
+  private destroyed = false;
   
   // Base coordinates 
   private readonly DEFAULT_LAT = 19.4326;
   private readonly DEFAULT_LNG = -99.1332;
   private readonly DEFAULT_ZOOM = 13;
+  // Below this zoom the map shows server-side clusters instead of one marker per alert
+  private readonly CLUSTER_MAX_ZOOM = 16;
+  // Live events only refetch clusters when they add, remove or move an alert, batched over this delay
+  private readonly CLUSTER_REFRESH_DELAY_MS = 2000;
+  private readonly CLUSTER_REFRESH_EVENTS = new Set(['alert.created', 'alert.closed', 'alert.expired', 'alert.deleted']);
+  private clusterRequest: Subscription | undefined;
+  private clusterRefreshTimer: any;
 
   private readonly NOMINATIM_API = 'https://nominatim.openstreetmap.org/search?format=json&limit=1';
 
@@ -78,9 +90,12 @@ export class MapComponent implements AfterViewInit, OnDestroy {
     this.loadAlerts();
     this.loadCategories();
     
-    // Set up auto-refresh every 30 seconds
+    // Live updates over WebSocket; polling is only a fallback while disconnected
+    this.connectLiveUpdates();
     this.refreshInterval = setInterval(() => {
-      this.loadAlerts();
+      if (!this.isLiveConnected()) {
+        this.loadAlerts();
+      }
     }, 30000);
   }
 
@@ -94,6 +109,13 @@ export class MapComponent implements AfterViewInit, OnDestroy {
       clearInterval(this.refreshInterval);
     }
     
+    // Close live updates socket
+    this.destroyed = true;
+    clearTimeout(this.liveReconnectTimer);
+    clearTimeout(this.clusterRefreshTimer);
+    this.liveSocket?.close();
+    this.clusterRequest?.unsubscribe();
+    
     // Cleanup search subject
     this.searchSubject.complete();
   }
@@ -123,6 +145,14 @@ export class MapComponent implements AfterViewInit, OnDestroy {
       attribution: '&copy; <a href="http://www.openstreetmap.org/copyright">OpenStreetMap</a>'
     }).addTo(this.map);
 
+    // Keep the live updates subscription and the markers in sync with the viewport
+    this.map.on('moveend', () => {
+      this.sendLiveViewport();
+      if (this.alertsVisible) {
+        this.displayAlertsOnMap();
+      }
+    });
+
     // Add click listener to select location for creating alerts
     this.map.on('click', (e: L.LeafletMouseEvent) => {
       // Only place marker for alert creation if not clicking on an existing alert marker
@@ -134,14 +164,16 @@ export class MapComponent implements AfterViewInit, OnDestroy {
   }
 
   /**
-   * Load and display alerts on the map
+   * Load and display alerts on the map.
+   * Only alerts changed since the last sync are downloaded and merged.
    */
   private loadAlerts(): void {
-    this.alertService.getAlerts().subscribe({
-      next: (alerts) => {
-        this.alerts = alerts;
+    this.alertService.getAlertChanges(this.syncWatermark).subscribe({
+      next: (changes) => {
+        const changed = this.applyAlertChanges(changes);
+        this.syncWatermark = changes.watermark;
         this.lastUpdateTime = new Date();
-        if (this.alertsVisible) {
+        if (changed && this.alertsVisible) {
           this.displayAlertsOnMap();
         }
       },
@@ -151,6 +183,114 @@ export class MapComponent implements AfterViewInit, OnDestroy {
     });
   }
   
+  /**
+   * Merge a changes response into the current alerts.
+   * Returns true when anything changed.
+   */
+  private applyAlertChanges(changes: AlertChanges): boolean {
+    if (changes.reset) {
+      this.alerts = changes.alerts;
+      return true;
+    }
+    if (changes.alerts.length === 0 && changes.deleted.length === 0) {
+      return false;
+    }
+
+    const byId = new Map(this.alerts.map(alert => [alert.id, alert]));
+    changes.deleted.forEach(id => byId.delete(id));
+    changes.alerts.forEach(alert => byId.set(alert.id, alert));
+    this.alerts = Array.from(byId.values());
+    return true;
+  }
+  
+  /**
+   * Open the WebSocket that pushes alert events for the current viewport.
+   * Reconnects after a delay and catches up through the changes endpoint.
+   */
+  private connectLiveUpdates(): void {
+    if (this.destroyed || typeof WebSocket === 'undefined') return;
+
+    const socket = new WebSocket(`${WS_BASE_URL}/ws/alerts/`);
+    this.liveSocket = socket;
+
+    socket.onopen = () => {
+      this.sendLiveViewport();
+      // Pick up anything missed while disconnected
+      this.loadAlerts();
+    };
+    socket.onmessage = (message) => {
+      this.applyLiveEvent(JSON.parse(message.data));
+    };
+    socket.onclose = () => {
+      if (this.liveSocket === socket) {
+        this.liveSocket = null;
+      }
+      if (!this.destroyed) {
+        this.liveReconnectTimer = setTimeout(() => this.connectLiveUpdates(), 15000);
+      }
+    };
+  }
+
+  private isLiveConnected(): boolean {
+    return this.liveSocket?.readyState === WebSocket.OPEN;
+  }
+
+  /**
+   * Subscribe to events inside the visible map area (padded to avoid gaps while panning)
+   */
+  private sendLiveViewport(): void {
+    if (!this.map || !this.isLiveConnected()) return;
+
+    const bounds = this.map.getBounds().pad(0.5);
+    this.liveSocket!.send(JSON.stringify({
+      bbox: [bounds.getSouth(), bounds.getWest(), bounds.getNorth(), bounds.getEast()]
+    }));
+  }
+
+  /**
+   * Apply a pushed alert event to the current alerts
+   */
+  private applyLiveEvent(event: { type: string; alert: Alert }): void {
+    if (!event.alert) return;
+
+    let moved = this.CLUSTER_REFRESH_EVENTS.has(event.type);
+    if (event.type === 'alert.deleted') {
+      this.alerts = this.alerts.filter(alert => alert.id !== event.alert.id);
+    } else {
+      const index = this.alerts.findIndex(alert => alert.id === event.alert.id);
+      if (index >= 0) {
+        const previous = this.alerts[index];
+        // An edit can also move the alert or change its category or status
+        moved = moved || previous.latitude !== event.alert.latitude || previous.longitude !== event.alert.longitude ||
+          previous.category !== event.alert.category || previous.status !== event.alert.status;
+        this.alerts[index] = { ...previous, ...event.alert };
+      } else {
+        this.alerts = [...this.alerts, event.alert];
+      }
+    }
+    this.lastUpdateTime = new Date();
+    if (!this.alertsVisible || !this.map) return;
+
+    if (this.map.getZoom() >= this.CLUSTER_MAX_ZOOM) {
+      this.displayAlertMarkers();
+    } else if (moved) {
+      this.scheduleClusterRefresh();
+    }
+  }
+
+  /**
+   * Refetch the clusters once for a burst of live events, at most every CLUSTER_REFRESH_DELAY_MS
+   */
+  private scheduleClusterRefresh(): void {
+    if (this.clusterRefreshTimer) return;
+    this.clusterRefreshTimer = setTimeout(() => {
+      this.clusterRefreshTimer = undefined;
+      if (this.alertsVisible && this.map && this.map.getZoom() < this.CLUSTER_MAX_ZOOM) {
+        this.displayClustersOnMap();
+      }
+    }, this.CLUSTER_REFRESH_DELAY_MS);
+  }
+  
   /**
    * Load available categories for filtering
    */
@@ -168,20 +308,75 @@ export class MapComponent implements AfterViewInit, OnDestroy {
   }
 
   /**
-   * Display alerts as markers on the map
+   * Display alerts on the map: clusters when zoomed out, markers when zoomed in
    */
   private displayAlertsOnMap(): void {
     if (!this.map) return;
 
-    // Clear existing alert markers
+    if (this.map.getZoom() < this.CLUSTER_MAX_ZOOM) {
+      this.displayClustersOnMap();
+    } else {
+      this.displayAlertMarkers();
+    }
+  }
+
+  private clearAlertMarkers(): void {
     this.alertMarkers.forEach(marker => {
       this.map!.removeLayer(marker);
     });
     this.alertMarkers = [];
+  }
 
-    // Filter alerts based on selected categories
+  /**
+   * Fetch clusters for the visible area and draw one marker per cluster
+   */
+  private displayClustersOnMap(): void {
+    // A pending live refresh is covered by this request
+    clearTimeout(this.clusterRefreshTimer);
+    this.clusterRefreshTimer = undefined;
+    const bounds = this.map!.getBounds();
+    const categories = this.availableCategories.length > 0 ? Array.from(this.selectedCategories) : undefined;
+
+    this.clusterRequest?.unsubscribe();
+    this.clusterRequest = this.alertService.getAlertClusters(
+      [bounds.getSouth(), bounds.getWest(), bounds.getNorth(), bounds.getEast()],
+      this.map!.getZoom(),
+      categories
+    ).subscribe({
+      next: (response) => {
+        if (!this.alertsVisible || !this.map || this.map.getZoom() >= this.CLUSTER_MAX_ZOOM) return;
+        this.clearAlertMarkers();
+        response.clusters.forEach(cluster => {
+          const marker = L.marker([cluster.latitude, cluster.longitude], {
+            icon: this.createClusterIcon(cluster),
+            title: `${cluster.count} alertas`
+          }).addTo(this.map!);
+          // Zoom into the cluster's cell on click
+          marker.on('click', () => {
+            const [south, west, north, east] = cluster.bounds;
+            this.map!.fitBounds([[south, west], [north, east]]);
+          });
+          this.alertMarkers.push(marker);
+        });
+      },
+      error: (error) => {
+        console.error('Error loading alert clusters:', error);
+      }
+    });
+  }
+
+  /**
+   * Draw one marker per alert inside the visible area
+   */
+  private displayAlertMarkers(): void {
+    this.clusterRequest?.unsubscribe();
+    this.clearAlertMarkers();
+
+    // Filter alerts based on selected categories and the visible area
+    const bounds = this.map!.getBounds().pad(0.2);
     const filteredAlerts = this.alerts.filter(alert => 
-      this.selectedCategories.has(alert.category)
+      this.selectedCategories.has(alert.category) &&
+      bounds.contains([alert.latitude, alert.longitude])
     );
 
     // Add markers for each filtered alert
@@ -252,6 +447,27 @@ export class MapComponent implements AfterViewInit, OnDestroy {
     });
   }
 
+  /**
+   * Icon for a cluster, colored after its most reported category
+   */
+  private createClusterIcon(cluster: AlertCluster): L.DivIcon {
+    const [topCategory] = Object.entries(cluster.categories).sort((a, b) => b[1] - a[1])[0] || [];
+    const color = this.availableCategories.find(cat => cat.key === topCategory)?.color || '#3B82F6';
+    const size = cluster.count < 10 ? 36 : cluster.count < 100 ? 44 : 52;
+
+    return L.divIcon({
+      html: `
+        <div class="rounded-full flex items-center justify-center shadow-lg border-2 border-white text-white font-bold text-sm"
+             style="background-color: ${color}; width: ${size}px; height: ${size}px;">
+          ${cluster.count}
+        </div>
+      `,
+      className: 'custom-alert-marker',
+      iconSize: [size, size],
+      iconAnchor: [size / 2, size / 2]
+    });
+  }
+
   /**
    * Create custom icon for alert markers
    */
@@ -537,11 +753,8 @@ export class MapComponent implements AfterViewInit, OnDestroy {
     if (this.alertsVisible) {
       this.displayAlertsOnMap();
     } else {
-      // Clear alert markers
-      this.alertMarkers.forEach(marker => {
-        this.map!.removeLayer(marker);
-      });
-      this.alertMarkers = [];
+      this.clusterRequest?.unsubscribe();
+      this.clearAlertMarkers();
     }
   }
   
@@ -1,3 +1,6 @@
 // This constant defines the base URL where your Django API is reachable.
 // It resolves to http://localhost:8000/api/login and http://localhost:8000/api/register
-export const API_BASE_URL = 'http://localhost:8000/api';
\ No newline at end of file
+export const API_BASE_URL = 'http://localhost:8000/api';
+
+// WebSocket endpoint for live alert updates (served by backend/asgi.py)
+export const WS_BASE_URL = 'ws://localhost:8000';
@@ -1,6 +1,6 @@
 import { Injectable } from '@angular/core';
-import { HttpClient, HttpHeaders, HttpErrorResponse } from '@angular/common/http';
-import { Observable, catchError, throwError } from 'rxjs';
+import { HttpClient, HttpHeaders, HttpErrorResponse, HttpParams } from '@angular/common/http';
+import { Observable, EMPTY, catchError, expand, reduce, throwError } from 'rxjs';
 import { AuthService } from './auth.service';
 import { API_BASE_URL } from '../config';
 
@@ -22,6 +22,7 @@ export interface Alert {
   latitude: number;
   longitude: number;
   image?: string;
+  image_thumbnails?: ImageThumbnails | null;
   status?: string;
   status_display?: string;
   user?: User;
@@ -35,6 +36,9 @@ export interface Alert {
   comments_count?: number;
 }
 
+// Generated thumbnails keyed by width ('160', '480', '960')
+export type ImageThumbnails = Record<string, { webp: string; jpeg: string }>;
+
 export interface AlertComment {
   id?: number;
   user: User;
@@ -43,6 +47,34 @@ export interface AlertComment {
   updated_at: string;
 }
 
+export interface CursorPage<T> {
+  next: string | null;
+  previous: string | null;
+  results: T[];
+}
+
+export interface AlertChanges {
+  watermark: string;
+  reset: boolean;
+  alerts: Alert[];
+  deleted: number[];
+  next: string | null;  // next page of a reset snapshot
+}
+
+export interface AlertCluster {
+  latitude: number;
+  longitude: number;
+  count: number;
+  categories: Record<string, number>;
+  bounds: [number, number, number, number];  // south, west, north, east
+}
+
+export interface AlertClusters {
+  zoom: number;
+  clusters: AlertCluster[];
+  alerts: Alert[];
+}
+
 export interface AlertCategory {
   key: string;  // Added key field
   name: string;
@@ -51,6 +83,15 @@ export interface AlertCategory {
   color: string;
 }
 
+// Alerts per page of the alert list
+const ALERT_PAGE_SIZE = 50;
+// Fields of the alert list, its map popups and the selected alert panel
+const ALERT_LIST_FIELDS = [
+  'id', 'title', 'description', 'category', 'category_detail', 'latitude', 'longitude',
+  'image', 'image_thumbnails', 'status', 'status_display', 'user', 'created_at',
+  'likes_count', 'dislikes_count', 'user_reaction', 'comments_count'
+];
+
 @Injectable({
   providedIn: 'root'
 })
@@ -70,12 +111,53 @@ export class AlertService {
     });
   }
 
-  getAlerts(): Observable<Alert[]> {
-    return this.http.get<Alert[]>(`${this.apiUrl}/alerts/`, { 
-      headers: this.getAuthHeaders() 
+  /**
+   * One cursor page of alerts, newest first, with only the fields the list
+   * and its map render; pass `pageUrl` (the previous page's `next`) to
+   * continue. Comments are loaded on demand with getAlertComments().
+   */
+  getAlerts(pageUrl?: string | null): Observable<CursorPage<Alert>> {
+    const params = pageUrl ? undefined : new HttpParams()
+      .set('fields', ALERT_LIST_FIELDS.join(','))
+      .set('expand', 'user')
+      .set('page_size', ALERT_PAGE_SIZE);
+    return this.http.get<CursorPage<Alert>>(pageUrl || `${this.apiUrl}/alerts/`, {
+      headers: this.getAuthHeaders(),
+      params
     });
   }
 
+  /**
+   * Incremental sync: alerts changed after `since` plus deleted ids.
+   * Without `since` the server returns a full snapshot (reset = true) in
+   * cursor pages, which are followed and merged under the first page's
+   * watermark.
+   */
+  getAlertChanges(since?: string | null): Observable<AlertChanges> {
+    const headers = this.getAuthHeaders();
+    let params = new HttpParams().set('expand', 'user');
+    if (since) {
+      params = params.set('since', since);
+    }
+    return this.http.get<AlertChanges>(`${this.apiUrl}/alerts/changes/`, { headers, params }).pipe(
+      expand(page => page.reset && page.next ? this.http.get<AlertChanges>(page.next, { headers }) : EMPTY),
+      reduce((changes, page) => ({ ...changes, alerts: changes.alerts.concat(page.alerts), next: null }))
+    );
+  }
+
+  /**
+   * Server-side clusters of active alerts for a viewport and zoom level
+   */
+  getAlertClusters(bbox: [number, number, number, number], zoom: number, categories?: string[]): Observable<AlertClusters> {
+    let params = new HttpParams()
+      .set('bbox', bbox.join(','))
+      .set('zoom', Math.round(zoom));
+    if (categories) {
+      params = params.set('categories', categories.join(','));
+    }
+    return this.http.get<AlertClusters>(`${this.apiUrl}/alerts/clusters/`, { params });
+  }
+
   getMyAlerts(): Observable<Alert[]> {
     return this.http.get<Alert[]>(`${this.apiUrl}/alerts/my_alerts/`, { 
       headers: this.getAuthHeaders() 
@@ -165,9 +247,13 @@ export class AlertService {
     );
   }
 
-  getAlertComments(alertId: number): Observable<AlertComment[]> {
-    return this.http.get<AlertComment[]>(
-      `${this.apiUrl}/alerts/${alertId}/comments/`,
+  /**
+   * One page of an alert's comments, newest first; pass `pageUrl` (the
+   * previous page's `next`) to continue
+   */
+  getAlertComments(alertId: number, pageUrl?: string | null): Observable<CursorPage<AlertComment>> {
+    return this.http.get<CursorPage<AlertComment>>(
+      pageUrl || `${this.apiUrl}/alerts/${alertId}/comments/`,
       { headers: this.getAuthHeaders() }
     ).pipe(
       catchError((error) => {